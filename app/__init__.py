@@ -2,55 +2,69 @@ from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
-from flask_migrate import Migrate
 from config import Config
 import os
-from sqlalchemy import text
-import logging
-from pythonjsonlogger import jsonlogger
-
-# Module-level guard to avoid configuring logging twice
-_LOGGING_CONFIGURED = False
 
 # Initialize extensions
 db = SQLAlchemy()
 jwt = JWTManager()
-migrate = Migrate()
 
-def create_main_app():
-    """Create the main application instance (Port 5000)"""
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+def init_migrations(app):
+    """Attach Flask-Migrate (imports Alembic, so only done for CLI and schema tooling)"""
+    from flask_migrate import Migrate
+    # Batch mode lets ALTERs run on SQLite during local development
+    Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
+
+def _base_app(service_name):
+    """Build the configuration, extensions and middleware shared by both apps.
+
+    Nothing here touches the database or imports AWS SDKs, so the app can be
+    created in a gunicorn master with preload_app and forked into workers.
+    Schema changes are applied by migrations (see init_db.py), not at boot.
+    """
     app = Flask(__name__)
     app.config.from_object(Config)
-    
-    # Configure JSON logging (once per process)
-    global _LOGGING_CONFIGURED
-    if not _LOGGING_CONFIGURED:
-        handler = logging.StreamHandler()
-        formatter = jsonlogger.JsonFormatter(
-            '%(asctime)s %(levelname)s %(name)s %(message)s'
-        )
-        handler.setFormatter(formatter)
-        root = logging.getLogger()
-        root.setLevel(logging.INFO)
-        root.handlers = [handler]
-        _LOGGING_CONFIGURED = True
-    
+
+    from app.utils import serialization
+    serialization.init_app(app)
+
+    # JSON logs go through a bounded queue to a listener thread (app/utils/logs.py)
+    from app.utils import logs
+    logs.configure_logging()
+
     # Optional AWS X-Ray instrumentation
     if os.environ.get('AWS_XRAY_ENABLED', 'false').lower() == 'true':
         try:
             from aws_xray_sdk.core import xray_recorder, patch_all
             from aws_xray_sdk.ext.flask.middleware import XRayMiddleware
-            xray_recorder.configure(service='FlagRush-Main')
+            xray_recorder.configure(service=service_name)
             patch_all()
             XRayMiddleware(app, xray_recorder)
         except Exception:
             # Do not fail app startup if X-Ray is misconfigured
             pass
-    
+
     # Initialize extensions
     db.init_app(app)
     jwt.init_app(app)
-    migrate.init_app(app, db)
+    # `flask db ...` runs the factory under the Flask CLI; skip Alembic and CLI commands otherwise
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        init_migrations(app)
+        from app import cli
+        cli.init_app(app)
+
+    # Prometheus-style /metrics endpoint and request instrumentation
+    from app.utils import metrics, query_audit, profiler, compression
+    # Registered first so its after_request runs last and times the whole response
+    logs.init_app(app)
+    metrics.init_app(app, service_name)
+    # after_request hooks run in reverse order: compress before metrics records latency
+    compression.init_app(app)
+    query_audit.init_app(app)
+    profiler.init_app(app)
+
     # CORS: allow all by default; restrict via CORS_ALLOW_ORIGINS (comma-separated) if provided
     origins = os.environ.get('CORS_ALLOW_ORIGINS')
     if origins:
@@ -58,16 +72,26 @@ def create_main_app():
         CORS(app, resources={r"/*": {"origins": origin_list}}, supports_credentials=True)
     else:
         CORS(app)
-    
+
+    # /livez, /readyz and /health answer from cached background checks
+    from app.utils import health
+    health.init_app(app)
+
+    return app
+
+def create_main_app():
+    """Create the main application instance (Port 5000)"""
+    app = _base_app('FlagRush-Main')
+
     # Register user-facing blueprints
     from app.routes.auth import auth_bp
     from app.routes.challenges import challenges_bp
     from app.routes.submissions import submissions_bp
-    
+
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(challenges_bp, url_prefix='/api/challenges')
     app.register_blueprint(submissions_bp, url_prefix='/api/submissions')
-    
+
     # Root routes
     @app.route('/')
     def index():
@@ -77,75 +101,32 @@ def create_main_app():
             'endpoints': {
                 'auth': '/api/auth',
                 'challenges': '/api/challenges',
-                'submissions': '/api/submissions'
+                'submissions': '/api/submissions',
+                'metrics': '/metrics'
             }
         })
-    
-    @app.route('/health')
-    def health_check():
-        """Health check with simple DB connectivity probe"""
-        db_status = 'unknown'
-        try:
-            with app.app_context():
-                db.session.execute(text('SELECT 1'))
-            db_status = 'connected'
-        except Exception as e:
-            db_status = f'error: {str(e)}'
-        return jsonify({'status': 'healthy', 'database': db_status})
-    
-    # Create database tables
-    with app.app_context():
-        db.create_all()
-    
+
     return app
 
 def create_admin_app():
     """Create the admin application instance (Port 5001)"""
-    app = Flask(__name__)
-    app.config.from_object(Config)
-    
-    # Configure JSON logging (once per process)
-    global _LOGGING_CONFIGURED
-    if not _LOGGING_CONFIGURED:
-        handler = logging.StreamHandler()
-        formatter = jsonlogger.JsonFormatter(
-            '%(asctime)s %(levelname)s %(name)s %(message)s'
-        )
-        handler.setFormatter(formatter)
-        root = logging.getLogger()
-        root.setLevel(logging.INFO)
-        root.handlers = [handler]
-        _LOGGING_CONFIGURED = True
-    
-    # Optional AWS X-Ray instrumentation
-    if os.environ.get('AWS_XRAY_ENABLED', 'false').lower() == 'true':
-        try:
-            from aws_xray_sdk.core import xray_recorder, patch_all
-            from aws_xray_sdk.ext.flask.middleware import XRayMiddleware
-            xray_recorder.configure(service='FlagRush-Admin')
-            patch_all()
-            XRayMiddleware(app, xray_recorder)
-        except Exception:
-            pass
-    
-    # Initialize extensions
-    db.init_app(app)
-    jwt.init_app(app)
-    migrate.init_app(app, db)
-    origins = os.environ.get('CORS_ALLOW_ORIGINS')
-    if origins:
-        origin_list = [o.strip() for o in origins.split(',') if o.strip()]
-        CORS(app, resources={r"/*": {"origins": origin_list}}, supports_credentials=True)
-    else:
-        CORS(app)
-    
+    app = _base_app('FlagRush-Admin')
+
     # Register admin blueprints
     from app.routes.auth import auth_bp  # Admin still needs auth
     from app.routes.admin_challenges import admin_challenges_bp
-    
+    from app.routes.admin_profiling import admin_profiling_bp
+    from app.routes.admin_scoreboard import admin_scoreboard_bp
+    from app.routes.admin_flag_sharing import admin_flag_sharing_bp
+    from app.routes.admin_archive import admin_archive_bp
+
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(admin_challenges_bp, url_prefix='/api/admin')
-    
+    app.register_blueprint(admin_profiling_bp, url_prefix='/api/admin/profiling')
+    app.register_blueprint(admin_scoreboard_bp, url_prefix='/api/admin/scoreboard')
+    app.register_blueprint(admin_flag_sharing_bp, url_prefix='/api/admin/flag-sharing')
+    app.register_blueprint(admin_archive_bp, url_prefix='/api/admin/archive')
+
     # Root routes (admin)
     @app.route('/')
     def index():
@@ -154,26 +135,11 @@ def create_admin_app():
             'version': '1.0.0',
             'endpoints': {
                 'auth': '/api/auth',
-                'admin': '/api/admin'
+                'admin': '/api/admin',
+                'metrics': '/metrics'
             }
         })
-    
-    @app.route('/health')
-    def health_check():
-        """Health check with simple DB connectivity probe"""
-        db_status = 'unknown'
-        try:
-            with app.app_context():
-                db.session.execute(text('SELECT 1'))
-            db_status = 'connected'
-        except Exception as e:
-            db_status = f'error: {str(e)}'
-        return jsonify({'status': 'healthy', 'database': db_status})
-    
-    # Share the same database
-    with app.app_context():
-        db.create_all()
-    
+
     return app
 
 # For backwards compatibility
@@ -0,0 +1,181 @@
+"""Operational ``flask`` commands (registered only under the Flask CLI).
+
+    FLASK_APP=wsgi_admin flask scoreboard freeze --export
+    FLASK_APP=wsgi_admin flask scoreboard export --directory /srv/flagrush/scoreboard
+    FLASK_APP=wsgi_admin flask scoreboard rebuild-history
+    FLASK_APP=wsgi_admin flask flag-sharing detect
+    FLASK_APP=wsgi_admin flask archive submissions --older-than-days 30
+    FLASK_APP=wsgi_admin flask challenges purge
+    FLASK_APP=wsgi_admin flask challenges export --output challenges.ndjson
+"""
+import json
+
+import click
+from flask.cli import AppGroup
+
+from app import db
+
+scoreboard_cli = AppGroup("scoreboard", help="Freeze the scoreboard, export static snapshots and rebuild score history.")
+flag_sharing_cli = AppGroup("flag-sharing", help="Detect players sharing flags.")
+archive_cli = AppGroup("archive", help="Move old incorrect submissions to compressed archive files.")
+challenges_cli = AppGroup("challenges", help="Import, export and purge challenges.")
+
+
+def _echo(data):
+    click.echo(json.dumps(data, indent=2, default=str))
+
+
+@scoreboard_cli.command("status")
+def scoreboard_status():
+    """Show the freeze state."""
+    from app.utils import scoreboard
+
+    _echo(scoreboard.freeze_state())
+
+
+@scoreboard_cli.command("freeze")
+@click.option("--export", "export_", is_flag=True, help="Also write the static snapshot files.")
+def scoreboard_freeze(export_):
+    """Freeze the public leaderboard at the current standings."""
+    from app.utils import scoreboard
+
+    state = scoreboard.freeze()
+    db.session.commit()
+    if export_:
+        state["export"] = scoreboard.export_snapshot(scoreboard.export_dir())
+    _echo(state)
+
+
+@scoreboard_cli.command("unfreeze")
+def scoreboard_unfreeze():
+    """Serve the live leaderboard again."""
+    from app.utils import scoreboard
+
+    state = scoreboard.unfreeze()
+    db.session.commit()
+    _echo(state)
+
+
+@scoreboard_cli.command("export")
+@click.option("--directory", help="Output directory (default: SCOREBOARD_EXPORT_DIR or frontend/scoreboard).")
+def scoreboard_export(directory):
+    """Write the scoreboard as static JSON files."""
+    from app.utils import scoreboard
+
+    _echo(scoreboard.export_snapshot(directory or scoreboard.export_dir()))
+
+
+@scoreboard_cli.command("rebuild-history")
+def scoreboard_rebuild_history():
+    """Backfill score-over-time buckets from submissions."""
+    from app.utils import score_history
+
+    buckets = score_history.rebuild()
+    db.session.commit()
+    _echo({"resolution": score_history.resolution(), "buckets": buckets})
+
+
+@flag_sharing_cli.command("detect")
+@click.option("--max-batches", type=int, help="Stop after this many batches (default: until caught up).")
+@click.option("--batch-size", type=int, help="Submissions per batch (default: FLAG_SHARING_BATCH).")
+def flag_sharing_detect(max_batches, batch_size):
+    """Process submissions since the last checkpoint."""
+    from app.utils import flag_sharing
+
+    _echo(flag_sharing.run(max_batches=max_batches, batch_size=batch_size))
+
+
+@flag_sharing_cli.command("status")
+def flag_sharing_status():
+    """Show the detector checkpoint."""
+    from app.utils import flag_sharing
+
+    _echo(flag_sharing.checkpoint())
+
+
+@archive_cli.command("submissions")
+@click.option("--before", type=click.DateTime(), help="Archive incorrect submissions older than this (UTC).")
+@click.option("--older-than-days", type=float, help="Archive incorrect submissions older than this many days.")
+@click.option("--challenge-id", "challenge_ids", type=int, multiple=True,
+              help="Archive every incorrect submission of a closed challenge (repeatable).")
+@click.option("--max-files", type=int, help="Stop after this many files.")
+@click.option("--dry-run", is_flag=True, help="Only count the rows that would be archived.")
+def archive_submissions(before, older_than_days, challenge_ids, max_files, dry_run):
+    """Write matching submissions to the archive, then delete them in small batches."""
+    from datetime import datetime, timedelta
+
+    from app.utils import archive
+
+    if older_than_days is not None:
+        before = datetime.utcnow() - timedelta(days=older_than_days)
+    if before is None and not challenge_ids:
+        raise click.UsageError("Give --before, --older-than-days or --challenge-id.")
+    if dry_run:
+        _echo({"candidates": archive.count_candidates(before, challenge_ids)})
+        return
+    _echo(archive.archive_submissions(before=before, challenge_ids=challenge_ids, max_files=max_files))
+
+
+@archive_cli.command("status")
+def archive_status():
+    """Summarize the archive manifest."""
+    from app.utils import archive
+
+    _echo(archive.summary())
+
+
+@challenges_cli.command("purge")
+@click.option("--max-batches", type=int, help="Stop after this many batches (default: until done).")
+@click.option("--batch-size", type=int, help="Submissions deleted per transaction (default: CHALLENGE_PURGE_BATCH).")
+def challenges_purge(max_batches, batch_size):
+    """Delete the submissions and rows of deleted challenges."""
+    from app.utils import challenge_purge
+
+    _echo(challenge_purge.run(max_batches=max_batches, batch_size=batch_size))
+
+
+@challenges_cli.command("pending")
+def challenges_pending():
+    """List deleted challenges waiting for the purge."""
+    from app.utils import challenge_purge
+
+    _echo(challenge_purge.pending())
+
+
+@challenges_cli.command("export")
+@click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True), required=True,
+              help="File to write.")
+@click.option("--package", is_flag=True, help="Write a .tar.gz package with local attachments instead of NDJSON.")
+def challenges_export(output, package):
+    """Export all challenges with flags, hints and attachment references."""
+    from app.utils import challenge_io
+
+    chunks = challenge_io.export_package() if package else challenge_io.export_ndjson()
+    with open(output, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    click.echo(f"Wrote {output}")
+
+
+@challenges_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--dry-run", is_flag=True, help="Validate only.")
+def challenges_import(path, dry_run):
+    """Create or update challenges by slug from an NDJSON file or package."""
+    from app.utils import challenge_io
+
+    with open(path, "rb") as f:
+        try:
+            report = challenge_io.import_challenges(f, dry_run=dry_run)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    _echo(report)
+    if report["errors"]:
+        raise click.ClickException(f"Import rejected: {report['errors']} invalid rows")
+
+
+def init_app(app):
+    app.cli.add_command(scoreboard_cli)
+    app.cli.add_command(flag_sharing_cli)
+    app.cli.add_command(archive_cli)
+    app.cli.add_command(challenges_cli)
@@ -2,5 +2,9 @@
 from .user import User
 from .challenge import Challenge
 from .submission import Submission
+from .setting import AppSetting
+from .score_bucket import ScoreBucket
+from .flag_share import FlagShareFinding
+from .idempotency import IdempotencyKey
 
-__all__ = ['User', 'Challenge', 'Submission']
+__all__ = ['User', 'Challenge', 'Submission', 'AppSetting', 'ScoreBucket', 'FlagShareFinding', 'IdempotencyKey']
@@ -1,18 +1,38 @@
 from app import db
 from datetime import datetime
+import json
 
 class Challenge(db.Model):
     """Challenge model for CTF challenges"""
     __tablename__ = 'challenges'
+    __table_args__ = (
+        # Stable key for import/export (app.utils.challenge_io); a deleted challenge frees its slug
+        db.Index('uq_challenges_slug_live', 'slug', unique=True,
+                 postgresql_where=db.text('deleted_at IS NULL'), sqlite_where=db.text('deleted_at IS NULL')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
+    slug = db.Column(db.String(100), nullable=False)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     category = db.Column(db.String(50), nullable=False)  # web, crypto, pwn, reverse, etc.
+    # Current value of a solve; derived from the fields below unless scoring is static
     points = db.Column(db.Integer, nullable=False)
+    scoring = db.Column(db.String(20), nullable=False, default='static', server_default='static')
+    initial_points = db.Column(db.Integer)
+    minimum_points = db.Column(db.Integer)
+    decay = db.Column(db.Integer)
+    # Distinct solvers, maintained by app.utils.scoring
+    solve_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     flag = db.Column(db.String(500), nullable=False)
+    # Additional accepted flags: JSON list of {type, flag, case_insensitive} (app.utils.flags)
+    flags = db.Column(db.Text)
+    # Bumped whenever flag or flags change; invalidates cached matchers in every worker
+    flag_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     author = db.Column(db.String(100))
     is_active = db.Column(db.Boolean, default=True)
+    # Set by DELETE; app.utils.challenge_purge removes the row and its submissions later
+    deleted_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -27,26 +47,36 @@ class Challenge(db.Model):
     # Relationships
     submissions = db.relationship('Submission', backref='challenge')
     
+    def get_flags(self):
+        """Additional accepted flags (besides flag)"""
+        return json.loads(self.flags) if self.flags else []
+    
+    def set_flags(self, entries):
+        """Store validated flag entries (see app.utils.flags.validate_flags)"""
+        self.flags = json.dumps(entries) if entries else None
+    
     def check_flag(self, submitted_flag):
-        """Check if submitted flag is correct"""
-        return self.flag.strip() == submitted_flag.strip()
+        """Check if submitted flag is correct (constant-time, cached per flag_version)"""
+        from app.utils.flags import matchers
+        return matchers.get(self).matches(submitted_flag)
     
     def get_solve_count(self):
         """Get number of users that solved this challenge"""
-        from app.models.submission import Submission
-        return Submission.query.filter_by(
-            challenge_id=self.id, 
-            is_correct=True
-        ).distinct(Submission.user_id).count()
+        return self.solve_count or 0
     
     def to_dict(self, include_flag=False):
         """Convert challenge to dictionary"""
         data = {
             'id': self.id,
+            'slug': self.slug,
             'title': self.title,
             'description': self.description,
             'category': self.category,
             'points': self.points,
+            'scoring': self.scoring,
+            'initial_points': self.initial_points,
+            'minimum_points': self.minimum_points,
+            'decay': self.decay,
             'author': self.author,
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -59,6 +89,7 @@ class Challenge(db.Model):
         
         if include_flag:
             data['flag'] = self.flag
+            data['flags'] = self.get_flags()
             
         return data
     
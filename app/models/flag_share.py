@@ -0,0 +1,52 @@
+from app import db
+from datetime import datetime
+import json
+
+class FlagShareFinding(db.Model):
+    """Identical incorrect flags submitted by several players within a time window"""
+    __tablename__ = 'flag_share_findings'
+    __table_args__ = (
+        # Open findings for a batch's hashes (app.utils.flag_sharing)
+        db.Index('ix_flag_share_findings_hash_last_seen', 'flag_hash', 'last_seen'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    challenge_id = db.Column(db.Integer, db.ForeignKey('challenges.id'), nullable=False)
+    flag_hash = db.Column(db.String(64), nullable=False)
+    submitted_flag = db.Column(db.String(500), nullable=False)
+    # JSON list of player ids, in order of first submission; not extended once common
+    user_ids = db.Column(db.Text, nullable=False, default='[]')
+    user_count = db.Column(db.Integer, nullable=False, default=0)
+    submission_count = db.Column(db.Integer, nullable=False, default=0)
+    first_submission_id = db.Column(db.Integer, nullable=False)
+    last_submission_id = db.Column(db.Integer, nullable=False)
+    first_seen = db.Column(db.DateTime, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)
+    # Shared by more than FLAG_SHARING_MAX_USERS players: a common guess, not a leak
+    common = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def get_user_ids(self):
+        return json.loads(self.user_ids or '[]')
+    
+    def to_dict(self, usernames=None):
+        """Convert finding to dictionary; usernames maps user ids to names"""
+        user_ids = self.get_user_ids()
+        return {
+            'id': self.id,
+            'challenge_id': self.challenge_id,
+            'flag_hash': self.flag_hash,
+            'submitted_flag': self.submitted_flag,
+            'users': [{'id': u, 'username': (usernames or {}).get(u)} for u in user_ids],
+            'user_count': self.user_count,
+            'submission_count': self.submission_count,
+            'first_submission_id': self.first_submission_id,
+            'last_submission_id': self.last_submission_id,
+            'first_seen': self.first_seen.isoformat() if self.first_seen else None,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None,
+            'common': self.common,
+        }
+    
+    def __repr__(self):
+        return f'<FlagShareFinding {self.id} challenge={self.challenge_id} users={self.user_count}>'
@@ -0,0 +1,20 @@
+from app import db
+from datetime import datetime
+
+class IdempotencyKey(db.Model):
+    """Stored response for an Idempotency-Key (IDEMPOTENCY_STORE=database)"""
+    __tablename__ = 'idempotency_keys'
+    
+    # Hex digest of scope, user id and client key
+    key_hash = db.Column(db.String(64), primary_key=True)
+    # Hex digest of the request body
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # NULL while the first attempt is still running
+    status_code = db.Column(db.Integer)
+    mimetype = db.Column(db.String(100))
+    body = db.Column(db.LargeBinary)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key_hash}>'
@@ -0,0 +1,14 @@
+from app import db
+
+class ScoreBucket(db.Model):
+    """Points and solves a player gained in one time bucket (score-over-time charts)"""
+    __tablename__ = 'score_buckets'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    # Bucket start in Unix seconds, a multiple of SCORE_HISTORY_RESOLUTION
+    bucket = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    solves = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<ScoreBucket {self.user_id}@{self.bucket} +{self.points}>'
@@ -0,0 +1,31 @@
+from app import db
+from datetime import datetime
+import json
+
+class AppSetting(db.Model):
+    """Runtime settings shared by every process (e.g. the scoreboard freeze)"""
+    __tablename__ = 'app_settings'
+    
+    key = db.Column(db.String(100), primary_key=True)
+    # JSON document
+    value = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def get_json(cls, key, default=None):
+        """Decoded value of a setting, or default if unset"""
+        row = db.session.execute(db.select(cls.value).where(cls.key == key)).first()
+        return json.loads(row[0]) if row else default
+    
+    @classmethod
+    def set_json(cls, key, value):
+        """Store a setting in the current transaction"""
+        setting = cls.query.get(key)
+        if setting is None:
+            setting = cls(key=key)
+            db.session.add(setting)
+        setting.value = json.dumps(value, separators=(',', ':'))
+        return setting
+    
+    def __repr__(self):
+        return f'<AppSetting {self.key}>'
@@ -1,19 +1,48 @@
 from app import db
 from datetime import datetime
+import hashlib
 
 class Submission(db.Model):
     """Submission model for flag submissions"""
     __tablename__ = 'submissions'
+    __table_args__ = (
+        # Solvers of a challenge (score updates, duplicate-solve check)
+        db.Index('ix_submissions_challenge_correct_user', 'challenge_id', 'is_correct', 'user_id'),
+        # A player's submissions and solves (stats, history, score rebuilds)
+        db.Index('ix_submissions_user_correct_challenge', 'user_id', 'is_correct', 'challenge_id'),
+        # Identical guesses across players (app.utils.flag_sharing)
+        db.Index('ix_submissions_flag_hash_submitted', 'flag_hash', 'submitted_at'),
+        # At most one solve per player and challenge, even for concurrent correct submissions
+        db.Index('uq_submissions_user_challenge_solved', 'user_id', 'challenge_id', unique=True,
+                 postgresql_where=db.text('is_correct'), sqlite_where=db.text('is_correct')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     challenge_id = db.Column(db.Integer, db.ForeignKey('challenges.id'), nullable=False)
     submitted_flag = db.Column(db.String(500), nullable=False)
+    # SHA-256 of the normalized flag (see hash_flag)
+    flag_hash = db.Column(db.String(64))
     is_correct = db.Column(db.Boolean, nullable=False)
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships are defined in other models via backref
     
+    @staticmethod
+    def normalize_flag(flag):
+        """Form of a submitted flag that is compared and hashed (as in Challenge.check_flag)"""
+        return (flag or '').strip()
+    
+    @staticmethod
+    def hash_flag(flag):
+        """Hex SHA-256 of the normalized flag"""
+        return hashlib.sha256(Submission.normalize_flag(flag).encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def dict_columns(cls):
+        """Columns matching to_dict keys, for column queries that skip ORM hydration"""
+        return [cls.id, cls.user_id, cls.challenge_id, cls.submitted_flag, cls.is_correct, cls.submitted_at]
+    
     def to_dict(self):
         """Convert submission to dictionary"""
         return {
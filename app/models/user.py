@@ -13,6 +13,11 @@ class User(db.Model):
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
+    # Denormalized from correct submissions by app.utils.scoring
+    score = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+    solve_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Incorrect submissions moved to the archive by app.utils.archive
+    archived_submissions = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     submissions = db.relationship('Submission', backref='user')
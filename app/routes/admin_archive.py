@@ -0,0 +1,72 @@
+from datetime import datetime
+from itertools import islice
+from flask import Blueprint, Response, request, stream_with_context
+from app import db
+from app.utils.helpers import success_response, error_response
+from app.utils.decorators import admin_required
+from app.middleware import route_middleware
+from app.utils.serialization import dumps
+from app.utils import archive
+
+admin_archive_bp = Blueprint('admin_archive', __name__)
+
+def _parse_time(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+@admin_archive_bp.route('', methods=['GET'])
+@admin_required
+@route_middleware()
+def get_archive_summary():
+    """Summarize the submission archive and how many rows the next run would move (admin only)
+    Query: ?before=<ISO time> and/or ?challenge_id=<id> (repeatable) to count candidates
+    """
+    try:
+        data = archive.summary()
+        before = _parse_time('before')
+        challenge_ids = request.args.getlist('challenge_id', type=int)
+        if before or challenge_ids:
+            data['candidates'] = archive.count_candidates(before, challenge_ids)
+        return success_response(data=data)
+    except ValueError as e:
+        return error_response(f"Invalid query: {str(e)}", 400)
+    except Exception as e:
+        return error_response(f"Failed to get archive summary: {str(e)}", 500)
+
+@admin_archive_bp.route('/submissions', methods=['GET'])
+@admin_required
+@route_middleware()
+def get_archived_submissions():
+    """Read archived submissions in id order (admin only, read-only)
+    Query: ?user_id, ?challenge_id, ?since / ?until (ISO time), ?after_id=<id> for the next page,
+           ?limit=100 (max 1000); ?format=ndjson streams every match instead of one page
+    """
+    try:
+        filters = {
+            'user_id': request.args.get('user_id', type=int),
+            'challenge_id': request.args.get('challenge_id', type=int),
+            'since': _parse_time('since'),
+            'until': _parse_time('until'),
+            'after_id': request.args.get('after_id', 0, type=int),
+        }
+        if request.args.get('format') == 'ndjson':
+            # Release the session before the (possibly long) stream starts
+            db.session.remove()
+            rows = archive.scan_submissions(**filters)
+            return Response(stream_with_context(dumps(row) + b'\n' for row in rows),
+                            mimetype='application/x-ndjson')
+
+        limit = request.args.get('limit', 100, type=int)
+        if not 1 <= limit <= 1000:
+            return error_response("limit must be between 1 and 1000", 400)
+        rows = list(islice(archive.scan_submissions(**filters), limit))
+        return success_response(data={
+            'submissions': rows,
+            'next_after_id': rows[-1]['id'] if len(rows) == limit else None
+        })
+    except ValueError as e:
+        return error_response(f"Invalid query: {str(e)}", 400)
+    except Exception as e:
+        return error_response(f"Failed to read archived submissions: {str(e)}", 500)
@@ -1,13 +1,22 @@
-from flask import Blueprint, request
+from flask import Blueprint, Response, request, stream_with_context
 from app import db
 from app.models.challenge import Challenge
 from app.utils.helpers import success_response, error_response, validate_required_fields
 from app.utils.decorators import admin_required
 from app.middleware import route_middleware
-from app.utils.aws import s3_presigned_put_url
+from app.utils.aws import (
+    s3_presigned_put_url, choose_part_size, s3_create_multipart_upload, s3_presigned_part_urls,
+    s3_list_parts, s3_complete_multipart_upload, s3_abort_multipart_upload, MULTIPART_MAX_PARTS,
+    MULTIPART_MAX_OBJECT_SIZE,
+)
+from app.utils import storage, scoring, challenge_purge, challenge_io
+from app.utils.flags import validate_flags
+from datetime import datetime
 import os
 import uuid
 
+BULK_MAX_CHALLENGES = 1000
+
 admin_challenges_bp = Blueprint('admin_challenges', __name__)
 
 @admin_challenges_bp.route('/challenges', methods=['POST'])
@@ -24,8 +33,16 @@ def create_challenge():
         if validation_error:
             return validation_error
         
+        slug = data.get('slug') or challenge_io.unique_slug(data['title'])
+        slug_error = challenge_io.validate_slug(slug)
+        if slug_error:
+            return error_response(slug_error, 400)
+        if challenge_io.slug_taken(slug):
+            return error_response("Slug already exists", 409)
+        
         # Create new challenge
         challenge = Challenge(
+            slug=slug,
             title=data['title'],
             description=data['description'],
             category=data['category'],
@@ -35,8 +52,24 @@ def create_challenge():
             file_url=data.get('file_url'),
             hint_1=data.get('hint_1'),
             hint_2=data.get('hint_2'),
-            hint_3=data.get('hint_3')
+            hint_3=data.get('hint_3'),
+            scoring=data.get('scoring', 'static'),
+            minimum_points=data.get('minimum_points'),
+            decay=data.get('decay')
         )
+        flags, flags_error = validate_flags(data.get('flags'))
+        if flags_error:
+            return error_response(flags_error, 400)
+        challenge.set_flags(flags)
+        challenge.flag_version = 1
+        
+        # For dynamic scoring, points is the starting value
+        challenge.initial_points = data.get('initial_points', challenge.points)
+        challenge.solve_count = 0
+        scoring_error = scoring.validate_scoring(challenge)
+        if scoring_error:
+            return error_response(scoring_error, 400)
+        challenge.points = scoring.current_value(challenge)
         
         db.session.add(challenge)
         db.session.commit()
@@ -62,6 +95,8 @@ def presign_upload():
     """
     try:
         bucket = os.environ.get('S3_BUCKET')
+        if storage.backend() == 'local':
+            return error_response("Attachments use local storage; upload with PUT /api/admin/storage/upload", 400)
         if not bucket:
             return error_response("S3_BUCKET is not configured on the server", 500)
 
@@ -89,6 +124,187 @@ def presign_upload():
     except Exception as e:
         return error_response(f"Failed to create presigned URL: {str(e)}", 500)
 
+@admin_challenges_bp.route('/storage/upload', methods=['PUT', 'POST'])
+@admin_required
+@route_middleware()
+def upload_attachment():
+    """Upload a challenge attachment to local storage (ATTACHMENT_BACKEND=local).
+    Body: raw file bytes. Query: ?filename=file.zip
+    The body is streamed to disk and hashed in chunks; store the returned
+    file_url (local://<sha256>/<filename>) in Challenge.file_url.
+    """
+    try:
+        if storage.backend() != 'local':
+            return error_response("Local attachment storage is disabled; use /api/admin/storage/presign-upload", 400)
+
+        filename = request.args.get('filename') or request.headers.get('X-Filename')
+        if not filename:
+            return error_response("filename is required", 400)
+
+        digest, size = storage.save_stream(request.stream)
+        return success_response({
+            'file_url': storage.local_url(digest, filename),
+            'sha256': digest,
+            'size': size
+        }, message="Attachment stored", status_code=201)
+    except storage.StorageError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        return error_response(f"Failed to store attachment: {str(e)}", 500)
+
+def _multipart_target(data):
+    """(bucket, key, upload_id) from a multipart request body or query string, or an error response"""
+    bucket = os.environ.get('S3_BUCKET')
+    if not bucket:
+        return None, error_response("S3_BUCKET is not configured on the server", 500)
+    key = data.get('key')
+    upload_id = data.get('upload_id')
+    if not key or not upload_id:
+        return None, error_response("key and upload_id are required", 400)
+    return (bucket, key, upload_id), None
+
+@admin_challenges_bp.route('/storage/multipart', methods=['POST'])
+@admin_required
+@route_middleware()
+def initiate_multipart_upload():
+    """Start a multipart S3 upload for a large attachment.
+    Body: { "filename": "disk.img", "size": 12884901888, "content_type": "...", "prefix": "optional/subfolder" }
+    Returns the upload_id, key and the part size/count to split the file into.
+    """
+    try:
+        bucket = os.environ.get('S3_BUCKET')
+        if not bucket:
+            return error_response("S3_BUCKET is not configured on the server", 500)
+
+        data = request.get_json() or {}
+        filename = data.get('filename')
+        content_type = data.get('content_type', 'application/octet-stream')
+        prefix = data.get('prefix', 'challenges')
+        size = data.get('size')
+
+        if not filename:
+            return error_response("filename is required", 400)
+        if size is not None and (not isinstance(size, int) or size <= 0):
+            return error_response("size must be a positive integer", 400)
+
+        if size and size > MULTIPART_MAX_OBJECT_SIZE:
+            return error_response("File exceeds the 5 TiB S3 object limit", 400)
+
+        part_size = choose_part_size(size)
+        part_count = -(-size // part_size) if size else None
+
+        key = f"{prefix.rstrip('/')}/{uuid.uuid4()}_{filename}"
+        upload_id = s3_create_multipart_upload(bucket, key, content_type)
+
+        return success_response({
+            'upload_id': upload_id,
+            'key': key,
+            's3_url': f"s3://{bucket}/{key}",
+            'part_size': part_size,
+            'part_count': part_count
+        }, message="Multipart upload started", status_code=201)
+    except Exception as e:
+        return error_response(f"Failed to start multipart upload: {str(e)}", 500)
+
+@admin_challenges_bp.route('/storage/multipart/parts', methods=['POST'])
+@admin_required
+@route_middleware()
+def presign_multipart_parts():
+    """Presigned PUT URLs for parts of a multipart upload; upload them in parallel.
+    Body: { "key": "...", "upload_id": "...", "part_numbers": [1, 2, 3] }
+    or { "key": "...", "upload_id": "...", "first_part": 1, "count": 16 }
+    Each PUT returns an ETag header that complete needs (or let complete list the parts).
+    """
+    try:
+        data = request.get_json() or {}
+        target, error = _multipart_target(data)
+        if error:
+            return error
+        bucket, key, upload_id = target
+
+        part_numbers = data.get('part_numbers')
+        if part_numbers is None:
+            first = int(data.get('first_part', 1))
+            part_numbers = list(range(first, first + int(data.get('count', 1))))
+        max_batch = int(os.environ.get('S3_MULTIPART_PRESIGN_BATCH', 1000))
+        if not part_numbers or len(part_numbers) > max_batch:
+            return error_response(f"Request between 1 and {max_batch} parts at a time", 400)
+        if any(not isinstance(n, int) or n < 1 or n > MULTIPART_MAX_PARTS for n in part_numbers):
+            return error_response(f"Part numbers must be between 1 and {MULTIPART_MAX_PARTS}", 400)
+
+        expires_in = int(os.environ.get('S3_MULTIPART_URL_EXPIRES', 3600))
+        urls = s3_presigned_part_urls(bucket, key, upload_id, part_numbers, expires_in=expires_in)
+        return success_response({
+            'parts': [{'part_number': n, 'upload_url': url} for n, url in urls.items()],
+            'expires_in': expires_in
+        })
+    except Exception as e:
+        return error_response(f"Failed to presign parts: {str(e)}", 500)
+
+@admin_challenges_bp.route('/storage/multipart/parts', methods=['GET'])
+@admin_required
+@route_middleware()
+def list_multipart_parts():
+    """Parts already received for an upload (resume: only send the missing ones).
+    Query: ?key=...&upload_id=...
+    """
+    try:
+        target, error = _multipart_target(request.args)
+        if error:
+            return error
+        parts = s3_list_parts(*target)
+        return success_response({
+            'parts': parts,
+            'uploaded_bytes': sum(p['size'] for p in parts)
+        })
+    except Exception as e:
+        return error_response(f"Failed to list parts: {str(e)}", 500)
+
+@admin_challenges_bp.route('/storage/multipart/complete', methods=['POST'])
+@admin_required
+@route_middleware()
+def complete_multipart_upload():
+    """Assemble the uploaded parts into the final object.
+    Body: { "key": "...", "upload_id": "...", "parts": [{"part_number": 1, "etag": "..."}] }
+    Without "parts", every part S3 has received is used.
+    """
+    try:
+        data = request.get_json() or {}
+        target, error = _multipart_target(data)
+        if error:
+            return error
+        bucket, key, upload_id = target
+
+        parts = data.get('parts') or s3_list_parts(bucket, key, upload_id)
+        if not parts:
+            return error_response("No parts have been uploaded", 400)
+        if any('part_number' not in p or not p.get('etag') for p in parts):
+            return error_response("Each part needs part_number and etag", 400)
+
+        s3_complete_multipart_upload(bucket, key, upload_id, parts)
+        return success_response({
+            's3_url': f"s3://{bucket}/{key}",
+            'part_count': len(parts)
+        }, message="Multipart upload completed")
+    except Exception as e:
+        return error_response(f"Failed to complete multipart upload: {str(e)}", 500)
+
+@admin_challenges_bp.route('/storage/multipart', methods=['DELETE'])
+@admin_required
+@route_middleware()
+def abort_multipart_upload():
+    """Abort a multipart upload and discard its parts.
+    Body or query: key, upload_id
+    """
+    try:
+        target, error = _multipart_target(request.get_json(silent=True) or request.args)
+        if error:
+            return error
+        s3_abort_multipart_upload(*target)
+        return success_response(message="Multipart upload aborted")
+    except Exception as e:
+        return error_response(f"Failed to abort multipart upload: {str(e)}", 500)
+
 @admin_challenges_bp.route('/challenges/<int:challenge_id>', methods=['PUT'])
 @admin_required
 @route_middleware()
@@ -97,21 +313,48 @@ def update_challenge(challenge_id):
     try:
         challenge = Challenge.query.get(challenge_id)
         
-        if not challenge:
+        if not challenge or challenge.deleted_at:
             return error_response("Challenge not found", 404)
         
         data = request.get_json()
         
+        if 'slug' in data:
+            slug_error = challenge_io.validate_slug(data['slug'])
+            if slug_error:
+                return error_response(slug_error, 400)
+            if challenge_io.slug_taken(data['slug'], exclude_id=challenge.id):
+                return error_response("Slug already exists", 409)
+        
         # Update fields
         updatable_fields = [
-            'title', 'description', 'category', 'points', 'flag', 
-            'author', 'file_url', 'hint_1', 'hint_2', 'hint_3', 'is_active'
+            'slug', 'title', 'description', 'category', 'points', 'flag', 
+            'author', 'file_url', 'hint_1', 'hint_2', 'hint_3', 'is_active',
+            'scoring', 'initial_points', 'minimum_points', 'decay'
         ]
         
+        previous_points = challenge.points
         for field in updatable_fields:
             if field in data:
                 setattr(challenge, field, data[field])
+        if 'flags' in data:
+            flags, flags_error = validate_flags(data['flags'])
+            if flags_error:
+                db.session.rollback()
+                return error_response(flags_error, 400)
+            challenge.set_flags(flags)
+        if 'flag' in data or 'flags' in data:
+            # Workers rebuild their cached matcher on the next submission
+            challenge.flag_version = (challenge.flag_version or 0) + 1
+        # As on create, points sets the starting value of a dynamic challenge
+        if 'points' in data and 'initial_points' not in data:
+            challenge.initial_points = data['points']
         
+        scoring_error = scoring.validate_scoring(challenge)
+        if scoring_error:
+            db.session.rollback()
+            return error_response(scoring_error, 400)
+        # Applies a changed value to existing solvers in one UPDATE
+        scoring.revalue_challenge(challenge, previous_points)
         db.session.commit()
         
         return success_response(
@@ -127,14 +370,19 @@ def update_challenge(challenge_id):
 @admin_required
 @route_middleware()
 def delete_challenge(challenge_id):
-    """Delete a challenge (admin only)"""
+    """Delete a challenge (admin only)
+    Takes its points back and hides it at once; its submissions are removed in batches by
+    app.utils.challenge_purge (`flask challenges purge` or POST /api/admin/challenges/purge).
+    """
     try:
         challenge = Challenge.query.get(challenge_id)
         
-        if not challenge:
+        if not challenge or challenge.deleted_at:
             return error_response("Challenge not found", 404)
         
-        db.session.delete(challenge)
+        scoring.remove_challenge(challenge)
+        challenge.is_active = False
+        challenge.deleted_at = datetime.utcnow()
         db.session.commit()
         
         return success_response(message="Challenge deleted successfully")
@@ -143,13 +391,162 @@ def delete_challenge(challenge_id):
         db.session.rollback()
         return error_response(f"Failed to delete challenge: {str(e)}", 500)
 
+@admin_challenges_bp.route('/challenges/bulk', methods=['POST'])
+@admin_required
+@route_middleware()
+def bulk_update_challenges():
+    """Apply the same status, category or points change to many challenges (admin only)
+    Body: { "challenge_ids": [1, 2, 3], "is_active": false, "category": "web", "points": 200 }
+    One transaction with set-based UPDATEs; score changes reach solvers in one UPDATE per table.
+    As in PUT, points sets the starting value of dynamic challenges.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        ids = data.get('challenge_ids')
+        if (not isinstance(ids, list) or not ids or len(ids) > BULK_MAX_CHALLENGES
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            return error_response(f"challenge_ids must be a list of 1 to {BULK_MAX_CHALLENGES} integer ids", 400)
+        ids = sorted(set(ids))
+
+        changes = {}
+        if 'is_active' in data:
+            if not isinstance(data['is_active'], bool):
+                return error_response("is_active must be true or false", 400)
+            changes['is_active'] = data['is_active']
+        if 'category' in data:
+            category = data['category']
+            if not isinstance(category, str) or not category.strip() or len(category.strip()) > 50:
+                return error_response("category must be a non-empty string of at most 50 characters", 400)
+            changes['category'] = category.strip()
+        points = data.get('points')
+        if 'points' in data and (not isinstance(points, int) or isinstance(points, bool) or points < 0):
+            return error_response("points must be a non-negative integer", 400)
+        if not changes and 'points' not in data:
+            return error_response("Nothing to change: give is_active, category or points", 400)
+
+        rows = db.session.execute(
+            db.select(Challenge.id, Challenge.points, Challenge.scoring, Challenge.minimum_points)
+            .where(Challenge.id.in_(ids), Challenge.deleted_at.is_(None))
+            .with_for_update()
+        ).all()
+        missing = sorted(set(ids) - {row.id for row in rows})
+        if missing:
+            db.session.rollback()
+            return error_response(f"Challenges not found: {', '.join(map(str, missing))}", 404)
+
+        result = {'updated': len(ids), 'challenges_revalued': 0}
+        if 'points' in data:
+            too_low = [row.id for row in rows if row.scoring != 'static' and (row.minimum_points or 0) > points]
+            if too_low:
+                db.session.rollback()
+                return error_response(
+                    f"points is below minimum_points of dynamic challenges: {', '.join(map(str, too_low))}", 400)
+            changes['initial_points'] = points
+            changes['points'] = db.case((Challenge.scoring == 'static', points), else_=Challenge.points)
+        changes['updated_at'] = datetime.utcnow()
+        db.session.execute(
+            db.update(Challenge).where(Challenge.id.in_(ids)).values(**changes),
+            execution_options={'synchronize_session': False}
+        )
+        if 'points' in data:
+            result.update(scoring.revalue_challenges({row.id: row.points for row in rows}))
+        db.session.commit()
+
+        return success_response(data=result, message="Challenges updated successfully")
+
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"Failed to update challenges: {str(e)}", 500)
+
+@admin_challenges_bp.route('/challenges/purge', methods=['GET'])
+@admin_required
+@route_middleware()
+def get_pending_purges():
+    """List deleted challenges whose submissions have not been purged yet (admin only)"""
+    try:
+        return success_response(data=challenge_purge.pending())
+    except Exception as e:
+        return error_response(f"Failed to list pending purges: {str(e)}", 500)
+
+@admin_challenges_bp.route('/challenges/purge', methods=['POST'])
+@admin_required
+@route_middleware()
+def purge_deleted_challenges():
+    """Purge deleted challenges now (admin only)
+    Body: { "max_batches": 10 }; the scheduled `flask challenges purge` handles large backlogs.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        max_batches = data.get('max_batches', 10)
+        if not isinstance(max_batches, int) or isinstance(max_batches, bool) or not 1 <= max_batches <= 100:
+            return error_response("max_batches must be an integer between 1 and 100", 400)
+        return success_response(data=challenge_purge.run(max_batches=max_batches), message="Purge run complete")
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"Failed to purge challenges: {str(e)}", 500)
+
+@admin_challenges_bp.route('/challenges/export', methods=['GET'])
+@admin_required
+@route_middleware()
+def export_challenges():
+    """Export all challenges with flags, hints and attachment references (admin only)
+    Query: ?format=ndjson (default, one challenge per line) or ?format=package (.tar.gz with local attachments)
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'package'):
+            return error_response("format must be ndjson or package", 400)
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        if export_format == 'package':
+            body, mimetype, filename = challenge_io.export_package(), 'application/gzip', f'challenges-{stamp}.tar.gz'
+        else:
+            body, mimetype, filename = challenge_io.export_ndjson(), 'application/x-ndjson', f'challenges-{stamp}.ndjson'
+        return Response(stream_with_context(body), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    except Exception as e:
+        return error_response(f"Failed to export challenges: {str(e)}", 500)
+
+@admin_challenges_bp.route('/challenges/import', methods=['POST'])
+@admin_required
+@route_middleware()
+def import_challenges():
+    """Create or update challenges by slug from an NDJSON file or package (admin only)
+    Body: the raw file (as written by GET /api/admin/challenges/export). Query: ?dry_run=true only validates.
+    All rows are validated first; nothing is written unless every row is valid.
+    """
+    try:
+        dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+        report = challenge_io.import_challenges(request.stream, dry_run=dry_run)
+        if report['errors']:
+            return error_response(f"Import rejected: {report['errors']} invalid rows", 400, details=report)
+        return success_response(data=report, message="Import validated" if dry_run else "Import complete")
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"Failed to import challenges: {str(e)}", 500)
+
+@admin_challenges_bp.route('/challenges/rescore', methods=['POST'])
+@admin_required
+@route_middleware()
+def rescore_challenges():
+    """Rebuild solve counts, dynamic values, player scores and score history from submissions (admin only)"""
+    try:
+        result = scoring.recalculate_scores()
+        db.session.commit()
+        return success_response(data=result, message="Scores recalculated")
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"Failed to recalculate scores: {str(e)}", 500)
+
 @admin_challenges_bp.route('/challenges', methods=['GET'])
 @admin_required
 @route_middleware()
 def get_all_challenges():
     """Get all challenges including inactive ones (admin only)"""
     try:
-        challenges = Challenge.query.all()
+        challenges = Challenge.query.filter(Challenge.deleted_at.is_(None)).all()
         challenges_data = [challenge.to_dict(include_flag=True) for challenge in challenges]
         
         return success_response(data=challenges_data)
@@ -165,7 +562,7 @@ def get_challenge(challenge_id):
     try:
         challenge = Challenge.query.get(challenge_id)
         
-        if not challenge:
+        if not challenge or challenge.deleted_at:
             return error_response("Challenge not found", 404)
         
         return success_response(data=challenge.to_dict(include_flag=True))
@@ -181,7 +578,7 @@ def toggle_challenge_status(challenge_id):
     try:
         challenge = Challenge.query.get(challenge_id)
         
-        if not challenge:
+        if not challenge or challenge.deleted_at:
             return error_response("Challenge not found", 404)
         
         data = request.get_json()
@@ -210,7 +607,7 @@ def get_challenge_stats(challenge_id):
     try:
         challenge = Challenge.query.get(challenge_id)
         
-        if not challenge:
+        if not challenge or challenge.deleted_at:
             return error_response("Challenge not found", 404)
         
         from app.models.submission import Submission
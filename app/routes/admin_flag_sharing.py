@@ -0,0 +1,79 @@
+from flask import Blueprint, request
+from app import db
+from app.models.flag_share import FlagShareFinding
+from app.models.submission import Submission
+from app.models.user import User
+from app.utils.helpers import success_response, error_response
+from app.utils.decorators import admin_required
+from app.middleware import route_middleware
+from app.utils import flag_sharing
+
+admin_flag_sharing_bp = Blueprint('admin_flag_sharing', __name__)
+
+@admin_flag_sharing_bp.route('', methods=['GET'])
+@admin_required
+@route_middleware()
+def get_flag_sharing_findings():
+    """List flag-sharing findings, newest first (admin only)
+    Query: ?limit=50 (max 500), ?before_id=<id> for the next page, ?challenge_id=<id>,
+           ?include_common=true to include guesses shared by many players
+    """
+    try:
+        limit = request.args.get('limit', 50, type=int)
+        if not 1 <= limit <= 500:
+            return error_response("limit must be between 1 and 500", 400)
+        query = FlagShareFinding.query
+        before_id = request.args.get('before_id', type=int)
+        if before_id:
+            query = query.filter(FlagShareFinding.id < before_id)
+        challenge_id = request.args.get('challenge_id', type=int)
+        if challenge_id:
+            query = query.filter(FlagShareFinding.challenge_id == challenge_id)
+        if request.args.get('include_common', 'false').lower() != 'true':
+            query = query.filter(FlagShareFinding.common.is_(False))
+        findings = query.order_by(FlagShareFinding.id.desc()).limit(limit).all()
+
+        # One query for every username on the page
+        user_ids = {u for finding in findings for u in finding.get_user_ids()}
+        usernames = dict(db.session.execute(
+            db.select(User.id, User.username).where(User.id.in_(user_ids))
+        ).all()) if user_ids else {}
+        return success_response(data={
+            'findings': [finding.to_dict(usernames) for finding in findings],
+            'next_before_id': findings[-1].id if len(findings) == limit else None
+        })
+    except Exception as e:
+        return error_response(f"Failed to get flag-sharing findings: {str(e)}", 500)
+
+@admin_flag_sharing_bp.route('/status', methods=['GET'])
+@admin_required
+@route_middleware()
+def get_flag_sharing_status():
+    """Get the detector checkpoint and how far it is behind (admin only)"""
+    try:
+        state = flag_sharing.checkpoint()
+        latest = db.session.execute(db.select(db.func.max(Submission.id))).scalar() or 0
+        return success_response(data={
+            **state,
+            'latest_submission_id': latest,
+            'behind': max(latest - state.get('last_submission_id', 0), 0)
+        })
+    except Exception as e:
+        return error_response(f"Failed to get detector status: {str(e)}", 500)
+
+@admin_flag_sharing_bp.route('/run', methods=['POST'])
+@admin_required
+@route_middleware()
+def run_flag_sharing_detector():
+    """Run the detector over new submissions now (admin only)
+    Body: { "max_batches": 10 }; the scheduled `flask flag-sharing detect` handles backlogs.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        max_batches = data.get('max_batches', 10)
+        if not isinstance(max_batches, int) or isinstance(max_batches, bool) or not 1 <= max_batches <= 100:
+            return error_response("max_batches must be an integer between 1 and 100", 400)
+        return success_response(data=flag_sharing.run(max_batches=max_batches), message="Detector run complete")
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"Failed to run flag-sharing detector: {str(e)}", 500)
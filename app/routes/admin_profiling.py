@@ -0,0 +1,132 @@
+from flask import Blueprint, request, send_from_directory
+from app.utils.helpers import success_response, error_response
+from app.utils.decorators import admin_required
+from app.middleware import route_middleware
+from app.utils import profiler
+import os
+
+admin_profiling_bp = Blueprint('admin_profiling', __name__)
+
+def _session_status(control):
+    """Summarize a profiling session for API responses"""
+    return {
+        **control,
+        'samples': profiler.count_samples(control['id']),
+        'active': profiler.session_active(control)
+    }
+
+@admin_profiling_bp.route('', methods=['GET'])
+@admin_required
+@route_middleware()
+def get_profiling_status():
+    """Get the current profiling session (admin only)"""
+    try:
+        control = profiler.read_control(max_age=0)
+        if not control:
+            return success_response(data={'active': False})
+        return success_response(data=_session_status(control))
+    except Exception as e:
+        return error_response(f"Failed to get profiling status: {str(e)}", 500)
+
+@admin_profiling_bp.route('', methods=['POST'])
+@admin_required
+@route_middleware()
+def start_profiling():
+    """Start profiling a sampled fraction of requests (admin only)
+    Body: { "endpoints": ["submissions.get_leaderboard"], "sample_rate": 0.1,
+            "max_samples": 50, "duration_seconds": 300, "mode": "cprofile" | "sample" }
+    An empty endpoints list profiles every endpoint.
+    """
+    try:
+        data = request.get_json() or {}
+        mode = data.get('mode', 'cprofile')
+        if mode not in profiler.MODES:
+            return error_response(f"mode must be one of {', '.join(profiler.MODES)}", 400)
+
+        try:
+            sample_rate = float(data.get('sample_rate', 0.1))
+            max_samples = int(data.get('max_samples', 50))
+            duration = float(data.get('duration_seconds', 300))
+        except (TypeError, ValueError):
+            return error_response("sample_rate, max_samples and duration_seconds must be numbers", 400)
+
+        if not 0 < sample_rate <= 1:
+            return error_response("sample_rate must be in (0, 1]", 400)
+        if max_samples < 1 or duration <= 0:
+            return error_response("max_samples and duration_seconds must be positive", 400)
+
+        endpoints = data.get('endpoints') or []
+        if not isinstance(endpoints, list):
+            return error_response("endpoints must be a list", 400)
+
+        control = profiler.start_session(endpoints, sample_rate, max_samples, duration, mode)
+        return success_response(data=_session_status(control), message="Profiling started", status_code=201)
+    except Exception as e:
+        return error_response(f"Failed to start profiling: {str(e)}", 500)
+
+@admin_profiling_bp.route('', methods=['DELETE'])
+@admin_required
+@route_middleware()
+def stop_profiling():
+    """Stop the current profiling session (admin only)"""
+    try:
+        profiler.stop_session()
+        return success_response(message="Profiling stopped")
+    except Exception as e:
+        return error_response(f"Failed to stop profiling: {str(e)}", 500)
+
+@admin_profiling_bp.route('/token', methods=['POST'])
+@admin_required
+@route_middleware()
+def create_profile_token():
+    """Mint a signed, single-use X-Profile-Request header value for profiling one request (admin only)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        ttl = min(int(data.get('ttl', 300)), 3600)
+        return success_response({
+            'header': 'X-Profile-Request',
+            'value': profiler.sign_request_token(ttl),
+            'expires_in': ttl
+        })
+    except Exception as e:
+        return error_response(f"Failed to create profile token: {str(e)}", 500)
+
+@admin_profiling_bp.route('/results', methods=['GET'])
+@admin_required
+@route_middleware()
+def list_profile_results():
+    """List collected profiles, newest first (admin only)"""
+    try:
+        base = profiler.profile_dir()
+        results = []
+        if os.path.isdir(base):
+            for session_id in os.listdir(base):
+                directory = os.path.join(base, session_id)
+                if session_id.startswith('.') or not os.path.isdir(directory):
+                    continue
+                for name in os.listdir(directory):
+                    if name.endswith('.tmp'):
+                        continue
+                    stat = os.stat(os.path.join(directory, name))
+                    results.append({
+                        'session': session_id,
+                        'name': name,
+                        'size': stat.st_size,
+                        'created_at': stat.st_mtime,
+                        'download_url': f"{request.script_root}/api/admin/profiling/results/{session_id}/{name}"
+                    })
+        results.sort(key=lambda r: r['created_at'], reverse=True)
+        return success_response(data=results)
+    except Exception as e:
+        return error_response(f"Failed to list profiles: {str(e)}", 500)
+
+@admin_profiling_bp.route('/results/<session_id>/<name>', methods=['GET'])
+@admin_required
+@route_middleware()
+def download_profile_result(session_id, name):
+    """Download a .pstats or .collapsed profile (admin only)"""
+    try:
+        # send_from_directory rejects paths that escape the profile directory
+        return send_from_directory(profiler.profile_dir(), f"{session_id}/{name}", as_attachment=True)
+    except Exception as e:
+        return error_response(f"Profile not found: {str(e)}", 404)
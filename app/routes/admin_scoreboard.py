@@ -0,0 +1,62 @@
+from flask import Blueprint, request
+from app import db
+from app.utils.helpers import success_response, error_response
+from app.utils.decorators import admin_required
+from app.middleware import route_middleware
+from app.utils import scoreboard
+
+admin_scoreboard_bp = Blueprint('admin_scoreboard', __name__)
+
+@admin_scoreboard_bp.route('', methods=['GET'])
+@admin_required
+@route_middleware()
+def get_scoreboard_status():
+    """Get the scoreboard freeze state (admin only)"""
+    try:
+        return success_response(data=scoreboard.freeze_state())
+    except Exception as e:
+        return error_response(f"Failed to get scoreboard status: {str(e)}", 500)
+
+@admin_scoreboard_bp.route('/freeze', methods=['POST'])
+@admin_required
+@route_middleware()
+def freeze_scoreboard():
+    """Freeze the public leaderboard at its current standings (admin only)
+    Body: { "export": true } also writes the static snapshot files.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        state = scoreboard.freeze()
+        db.session.commit()
+        if data.get('export'):
+            state = {**state, 'export': scoreboard.export_snapshot(scoreboard.export_dir())}
+        return success_response(data=state, message="Scoreboard frozen")
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"Failed to freeze scoreboard: {str(e)}", 500)
+
+@admin_scoreboard_bp.route('/unfreeze', methods=['POST'])
+@admin_required
+@route_middleware()
+def unfreeze_scoreboard():
+    """Serve the live leaderboard again (admin only)"""
+    try:
+        state = scoreboard.unfreeze()
+        db.session.commit()
+        return success_response(data=state, message="Scoreboard unfrozen")
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"Failed to unfreeze scoreboard: {str(e)}", 500)
+
+@admin_scoreboard_bp.route('/export', methods=['POST'])
+@admin_required
+@route_middleware()
+def export_scoreboard():
+    """Write the scoreboard as static JSON files for the frontend host (admin only)
+    Exports the frozen snapshot when frozen, the live standings otherwise.
+    """
+    try:
+        return success_response(data=scoreboard.export_snapshot(scoreboard.export_dir()),
+                                message="Scoreboard exported")
+    except Exception as e:
+        return error_response(f"Failed to export scoreboard: {str(e)}", 500)
@@ -1,9 +1,10 @@
-from flask import Blueprint
+from flask import Blueprint, request
 from flask_jwt_extended import jwt_required
 from app import db
 from app.models.challenge import Challenge
 from app.utils.helpers import success_response, error_response
-from app.utils.aws import parse_s3_url, s3_presigned_get_url
+from app.utils.aws import parse_s3_url, cached_presigned_get_url
+from app.utils import storage
 import os
 
 challenges_bp = Blueprint('challenges', __name__)
@@ -53,10 +54,19 @@ def get_challenge_attachment(challenge_id):
         s3_ref = parse_s3_url(challenge.file_url)
         if s3_ref:
             bucket, key = s3_ref
-            url = s3_presigned_get_url(bucket, key, expires_in=600)
-            if not url:
+            # Shared across requests until shortly before expiry (S3_PRESIGN_REUSE_MARGIN)
+            presigned = cached_presigned_get_url(bucket, key, expires_in=600)
+            if not presigned:
                 return error_response("Unable to generate download URL", 500)
-            return success_response({'download_url': url, 'expires_in': 600})
+            url, expires_in = presigned
+            return success_response({'download_url': url, 'expires_in': expires_in})
+
+        # local://<sha256>/<name>: signed link to the download endpoint below
+        local_ref = storage.parse_local_url(challenge.file_url)
+        if local_ref:
+            digest, filename = local_ref
+            path, expires_in = storage.signed_download_path(digest, filename, ttl=600)
+            return success_response({'download_url': request.host_url.rstrip('/') + path, 'expires_in': expires_in})
 
         if challenge.file_url.startswith('http://') or challenge.file_url.startswith('https://'):
             return success_response({'download_url': challenge.file_url})
@@ -65,12 +75,25 @@ def get_challenge_attachment(challenge_id):
     except Exception as e:
         return error_response(f"Failed to get attachment: {str(e)}", 500)
 
+@challenges_bp.route('/attachments/<digest>/<filename>', methods=['GET'])
+def download_attachment(digest, filename):
+    """Serve a locally stored attachment (signed URL from get_challenge_attachment)."""
+    try:
+        if not storage.verify_download(digest, filename, request.args.get('expires'), request.args.get('sig')):
+            return error_response("Invalid or expired download link", 403)
+        response = storage.send_object(digest, filename)
+        if response is None:
+            return error_response("Attachment not found", 404)
+        return response
+    except Exception as e:
+        return error_response(f"Failed to download attachment: {str(e)}", 500)
+
 @challenges_bp.route('/categories', methods=['GET'])
 @jwt_required()
 def get_categories():
     """Get all challenge categories"""
     try:
-        categories = db.session.query(Challenge.category).distinct().all()
+        categories = db.session.query(Challenge.category).filter(Challenge.deleted_at.is_(None)).distinct().all()
         categories_list = [cat[0] for cat in categories]
         
         return success_response(data=categories_list)
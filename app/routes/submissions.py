@@ -1,19 +1,62 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import IntegrityError, OperationalError
 from app import db
 from app.models.submission import Submission
 from app.models.challenge import Challenge
 from app.models.user import User
 from app.utils.helpers import success_response, error_response, validate_required_fields
+from app.utils.serialization import rows_to_dicts
 from app.utils.decorators import admin_required
 from app.utils.aws import send_sqs_message
+from app.utils import metrics, scoring, score_history
+from app.utils.scoreboard import TIMELINE_PLAYERS, frozen_cache
+from app.utils.idempotency import idempotent
+from app.utils.logs import log_event
 import os, json
-import hashlib
+import logging
+import random
+import time
 
 submissions_bp = Blueprint('submissions', __name__)
+logger = logging.getLogger(__name__)
+
+# Transactions that lost a deadlock or serialization check (PostgreSQL) or
+# found the database locked (SQLite) are rolled back and run again
+SUBMIT_RETRIES = 3
+_TRANSIENT_PGCODES = ('40P01', '40001')
+
+def _transient(error):
+    """Whether an OperationalError is worth retrying the transaction for"""
+    return (getattr(error.orig, 'pgcode', None) in _TRANSIENT_PGCODES
+            or 'database is locked' in str(error.orig))
+
+def _already_solved(user, challenge):
+    """Reject a repeat solve, with an audit event"""
+    # Audit: duplicate solve attempt blocked
+    audit_queue = os.environ.get('SQS_AUDIT_QUEUE_URL') or os.environ.get('SQS_QUEUE_URL')
+    if audit_queue:
+        try:
+            client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
+            user_agent = request.headers.get('User-Agent')
+            payload = {
+                'event': 'flag_submission_blocked',
+                'reason': 'already_solved',
+                'user_id': user.id,
+                'username': user.username,
+                'challenge_id': challenge.id,
+                'challenge_title': challenge.title,
+                'client_ip': client_ip,
+                'user_agent': user_agent,
+            }
+            send_sqs_message(audit_queue, payload)
+        except Exception:
+            pass
+    return error_response("Challenge already solved", 400)
 
 @submissions_bp.route('/', methods=['POST'])
 @jwt_required()
+@idempotent('submissions.submit')
 def submit_flag():
     """Submit a flag for a challenge"""
     try:
@@ -59,48 +102,55 @@ def submit_flag():
         ).first()
         
         if existing_correct_submission:
-            # Audit: duplicate solve attempt blocked
-            audit_queue = os.environ.get('SQS_AUDIT_QUEUE_URL') or os.environ.get('SQS_QUEUE_URL')
-            if audit_queue:
-                try:
-                    client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-                    user_agent = request.headers.get('User-Agent')
-                    payload = {
-                        'event': 'flag_submission_blocked',
-                        'reason': 'already_solved',
-                        'user_id': user.id,
-                        'username': user.username,
-                        'challenge_id': challenge.id,
-                        'challenge_title': challenge.title,
-                        'client_ip': client_ip,
-                        'user_agent': user_agent,
-                    }
-                    send_sqs_message(audit_queue, payload)
-                except Exception:
-                    pass
-            return error_response("Challenge already solved", 400)
+            return _already_solved(user, challenge)
         
         # Check if flag is correct
         is_correct = challenge.check_flag(data['flag'])
         
-        # Create submission record
-        submission = Submission(
-            user_id=user.id,
-            challenge_id=challenge.id,
-            submitted_flag=data['flag'],
-            is_correct=is_correct
+        for attempt in range(SUBMIT_RETRIES + 1):
+            # Create submission record
+            submission = Submission(
+                user_id=user.id,
+                challenge_id=challenge.id,
+                submitted_flag=data['flag'],
+                flag_hash=Submission.hash_flag(data['flag']),
+                is_correct=is_correct
+            )
+            
+            db.session.add(submission)
+            points_earned = 0
+            try:
+                if is_correct:
+                    try:
+                        db.session.flush()
+                    except IntegrityError:
+                        # A concurrent submission solved it first (uq_submissions_user_challenge_solved)
+                        db.session.rollback()
+                        return _already_solved(user, challenge)
+                    # Updates the solver's score and, if the value decayed, earlier solvers'
+                    points_earned = scoring.record_solve(challenge.id, user.id, submission.submitted_at)
+                db.session.commit()
+                break
+            except OperationalError as e:
+                db.session.rollback()
+                if attempt == SUBMIT_RETRIES or not _transient(e):
+                    raise
+                logger.warning("Retrying submission after %s", type(e.orig).__name__,
+                               extra={'user_id': user.id, 'challenge_id': challenge.id, 'attempt': attempt + 1})
+                time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+        metrics.inc(metrics.PREFIX + 'submissions_total', result='correct' if is_correct else 'incorrect')
+        # Incorrect attempts are sampled (LOG_SAMPLE_RATES); solves are always logged
+        log_event(
+            logger, 'submission.correct' if is_correct else 'submission.incorrect', 'Flag submission',
+            submission_id=submission.id, user_id=user.id, challenge_id=challenge.id,
         )
         
-        db.session.add(submission)
-        db.session.commit()
-        
         message = "Correct flag! Well done!" if is_correct else "Incorrect flag. Try again!"
         
         # Optionally emit SQS audit event for every submission (no flag content)
         audit_queue = os.environ.get('SQS_AUDIT_QUEUE_URL') or os.environ.get('SQS_QUEUE_URL')
         if audit_queue:
             try:
-                flag_hash = hashlib.sha256((data.get('flag') or '').encode('utf-8')).hexdigest()
                 client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
                 user_agent = request.headers.get('User-Agent')
                 audit_payload = {
@@ -111,8 +161,9 @@ def submit_flag():
                     'challenge_id': challenge.id,
                     'challenge_title': challenge.title,
                     'is_correct': is_correct,
-                    'points_awarded': challenge.points if is_correct else 0,
-                    'flag_sha256': flag_hash,
+                    'points_awarded': points_earned,
+                    # The stored hash of the normalized flag, as the flag-sharing findings use
+                    'flag_sha256': submission.flag_hash,
                     'submitted_at': submission.submitted_at.isoformat() if submission.submitted_at else None,
                     'client_ip': client_ip,
                     'user_agent': user_agent,
@@ -133,7 +184,7 @@ def submit_flag():
                         'username': user.username,
                         'challenge_id': challenge.id,
                         'challenge_title': challenge.title if challenge else None,
-                        'points': challenge.points,
+                        'points': points_earned,
                         'submitted_at': submission.submitted_at.isoformat() if submission.submitted_at else None
                     }
                     # Optional: include plaintext flag in solved events (for secure S3 logging only)
@@ -148,7 +199,7 @@ def submit_flag():
             data={
                 'submission': submission.to_dict(),
                 'is_correct': is_correct,
-                'points_earned': challenge.points if is_correct else 0
+                'points_earned': points_earned
             },
             message=message
         )
@@ -165,19 +216,19 @@ def get_user_submissions():
         current_user_id = int(get_jwt_identity())
         user = User.query.get(current_user_id)
         
-        submissions = Submission.query.filter_by(user_id=user.id).all()
-        submissions_data = []
-        
-        for submission in submissions:
-            submission_dict = submission.to_dict()
-            # Add challenge info
-            challenge = Challenge.query.get(submission.challenge_id)
-            if challenge:
-                submission_dict['challenge_title'] = challenge.title
-                submission_dict['challenge_points'] = challenge.points
-            submissions_data.append(submission_dict)
+        # One joined column query instead of a challenge lookup per submission
+        result = db.session.execute(
+            db.select(
+                *Submission.dict_columns(),
+                Challenge.title.label('challenge_title'),
+                Challenge.points.label('challenge_points')
+            )
+            .outerjoin(Challenge, Challenge.id == Submission.challenge_id)
+            .where(Submission.user_id == user.id)
+            .order_by(Submission.id)
+        )
         
-        return success_response(data=submissions_data)
+        return success_response(data=rows_to_dicts(result.keys(), result))
         
     except Exception as e:
         return error_response(f"Failed to get user submissions: {str(e)}", 500)
@@ -190,14 +241,13 @@ def get_challenge_submissions(challenge_id):
         current_user_id = int(get_jwt_identity())
         user = User.query.get(current_user_id)
         
-        submissions = Submission.query.filter_by(
-            user_id=user.id,
-            challenge_id=challenge_id
-        ).all()
-        
-        submissions_data = [submission.to_dict() for submission in submissions]
+        result = db.session.execute(
+            db.select(*Submission.dict_columns())
+            .where(Submission.user_id == user.id, Submission.challenge_id == challenge_id)
+            .order_by(Submission.id)
+        )
         
-        return success_response(data=submissions_data)
+        return success_response(data=rows_to_dicts(result.keys(), result))
         
     except Exception as e:
         return error_response(f"Failed to get challenge submissions: {str(e)}", 500)
@@ -207,24 +257,20 @@ def get_challenge_submissions(challenge_id):
 def get_all_submissions():
     """Get all submissions (admin only)"""
     try:
-        submissions = Submission.query.all()
-        submissions_data = []
-        
-        for submission in submissions:
-            submission_dict = submission.to_dict()
-            # Add user and challenge info
-            user = User.query.get(submission.user_id)
-            challenge = Challenge.query.get(submission.challenge_id)
-            
-            if user:
-                submission_dict['username'] = user.username
-            if challenge:
-                submission_dict['challenge_title'] = challenge.title
-                submission_dict['challenge_points'] = challenge.points
-                
-            submissions_data.append(submission_dict)
+        # Single joined column query; rows go straight to the encoder
+        result = db.session.execute(
+            db.select(
+                *Submission.dict_columns(),
+                User.username,
+                Challenge.title.label('challenge_title'),
+                Challenge.points.label('challenge_points')
+            )
+            .outerjoin(User, User.id == Submission.user_id)
+            .outerjoin(Challenge, Challenge.id == Submission.challenge_id)
+            .order_by(Submission.id)
+        )
         
-        return success_response(data=submissions_data)
+        return success_response(data=rows_to_dicts(result.keys(), result))
         
     except Exception as e:
         return error_response(f"Failed to get all submissions: {str(e)}", 500)
@@ -237,24 +283,16 @@ def get_submission_stats():
         current_user_id = int(get_jwt_identity())
         user = User.query.get(current_user_id)
         
-        # User stats
-        total_submissions = Submission.query.filter_by(user_id=user.id).count()
-        correct_submissions = Submission.query.filter_by(
-            user_id=user.id, 
-            is_correct=True
-        ).count()
-        
-        # Calculate user score
-        user_score = 0
-        correct_submission_records = Submission.query.filter_by(
-            user_id=user.id, 
-            is_correct=True
-        ).all()
-        
-        for submission in correct_submission_records:
-            challenge = Challenge.query.get(submission.challenge_id)
-            if challenge:
-                user_score += challenge.points
+        total_submissions, correct_submissions = db.session.execute(
+            db.select(
+                db.func.count(Submission.id),
+                db.func.coalesce(db.func.sum(db.case((Submission.is_correct.is_(True), 1), else_=0)), 0)
+            ).where(Submission.user_id == user.id)
+        ).one()
+        # Archived submissions are all incorrect (app.utils.archive)
+        total_submissions += user.archived_submissions or 0
+        # Maintained on every solve by app.utils.scoring
+        user_score = user.score
         
         stats = {
             'total_submissions': total_submissions,
@@ -274,34 +312,68 @@ def get_submission_stats():
 def get_leaderboard():
     """Get user leaderboard"""
     try:
-        # Get all users with their scores
-        users = User.query.filter_by(is_admin=False).all()
-        leaderboard = []
-        
-        for user in users:
-            # Calculate user score
-            user_score = 0
-            correct_submissions = Submission.query.filter_by(
-                user_id=user.id, 
-                is_correct=True
-            ).all()
-            
-            for submission in correct_submissions:
-                challenge = Challenge.query.get(submission.challenge_id)
-                if challenge:
-                    user_score += challenge.points
-            
-            leaderboard.append({
-                'id': user.id,
-                'username': user.username,
-                'score': user_score,
-                'solved_challenges': len(correct_submissions)
-            })
-        
-        # Sort by score (descending)
-        leaderboard.sort(key=lambda x: x['score'], reverse=True)
+        # While frozen every process serves the same pre-encoded snapshot
+        frozen = frozen_cache.leaderboard()
+        if frozen is not None:
+            return success_response(data=frozen, message="Scoreboard frozen")
+
+        # Scores are denormalized onto users (app.utils.scoring): one indexed read
+        result = db.session.execute(
+            db.select(
+                User.id,
+                User.username,
+                User.score.label('score'),
+                User.solve_count.label('solved_challenges')
+            )
+            .where(User.is_admin.is_(False))
+            .order_by(User.score.desc(), User.id)
+        )
+        leaderboard = rows_to_dicts(result.keys(), result)
         
         return success_response(data=leaderboard)
         
     except Exception as e:
         return error_response(f"Failed to get leaderboard: {str(e)}", 500)
+
+@submissions_bp.route('/timeline', methods=['GET'])
+@jwt_required()
+def get_score_timeline():
+    """Get score-over-time for the top players, or for one player with ?user_id=
+    Query: ?top=10 (at most 25)
+    """
+    try:
+        top = request.args.get('top', 10, type=int)
+        user_id = request.args.get('user_id', type=int)
+        if not 1 <= top <= TIMELINE_PLAYERS:
+            return error_response(f"top must be between 1 and {TIMELINE_PLAYERS}", 400)
+
+        # While frozen, charts stop where the frozen leaderboard does
+        frozen = frozen_cache.timeline()
+        if frozen is not None:
+            players = frozen['players']
+            if user_id:
+                players = [p for p in players if p['id'] == user_id]
+                if not players:
+                    # Live buckets would reveal solves (and decay) since the freeze
+                    return error_response(
+                        f"Scoreboard frozen: history is only available for the top {len(frozen['players'])} players",
+                        409)
+            else:
+                players = players[:top]
+            return success_response(data={'resolution': frozen['resolution'], 'players': players},
+                                    message="Scoreboard frozen")
+
+        if user_id:
+            user_ids = [user_id]
+        else:
+            user_ids = db.session.execute(
+                db.select(User.id).where(User.is_admin.is_(False))
+                .order_by(User.score.desc(), User.id).limit(top)
+            ).scalars().all()
+        return success_response(data={
+            'resolution': score_history.resolution(),
+            'players': score_history.timelines(user_ids)
+        })
+        
+    except Exception as e:
+        return error_response(f"Failed to get score timeline: {str(e)}", 500)
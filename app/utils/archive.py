@@ -0,0 +1,403 @@
+"""Archival of old incorrect submissions to gzipped NDJSON files.
+
+``archive_submissions`` moves incorrect submissions that are older than a
+cutoff, or that belong to given (closed) challenges, out of the
+``submissions`` table. The steps are:
+
+1. Read the matching rows in primary-key pages of ARCHIVE_PAGE_ROWS.
+2. Write them to ``submissions-<first id>-<last id>.ndjson.gz``, at most
+   ARCHIVE_FILE_ROWS rows per file.
+3. Record the file in ``manifest.json``, with its row count, id and time
+   range, challenge ids and SHA-256.
+4. Delete the rows in transactions of ARCHIVE_DELETE_BATCH ids, each
+   followed by an optional ARCHIVE_DELETE_PAUSE, so writers are never
+   blocked for long.
+
+A manifest entry stays ``"deleted": false`` until its rows are gone. The next
+run finishes any such entry first, so an interrupted run never archives a
+row twice.
+
+Correct submissions are kept. Scores, first bloods, the "already solved"
+check and score history are derived from them, and there is at most one per
+player and challenge. Rows the flag-sharing detector has not processed yet
+are kept too. Each player's archived count is added to
+``users.archived_submissions`` in the same transaction as the delete, so
+``/api/submissions/stats`` totals do not change.
+
+Files go to ARCHIVE_DIR (default ``archive/`` in the repository), or to
+``s3://ARCHIVE_BUCKET/ARCHIVE_PREFIX`` when ARCHIVE_BUCKET is set.
+``scan_submissions`` reads them back one line at a time, skipping files whose
+manifest entry cannot match the filters.
+"""
+import gzip
+import hashlib
+import heapq
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import IO, Iterable, Iterator, List, Optional
+
+from app import db
+from app.models.setting import AppSetting
+from app.models.submission import Submission
+from app.models.user import User
+from app.utils.logs import log_event
+from app.utils.serialization import dumps, loads
+
+MANIFEST = "manifest.json"
+COLUMNS = ("id", "user_id", "challenge_id", "submitted_flag", "flag_hash", "is_correct", "submitted_at")
+
+logger = logging.getLogger(__name__)
+
+
+def _config() -> dict:
+    return {
+        "file_rows": int(os.environ.get("ARCHIVE_FILE_ROWS", "100000")),
+        "page_rows": int(os.environ.get("ARCHIVE_PAGE_ROWS", "5000")),
+        "delete_batch": int(os.environ.get("ARCHIVE_DELETE_BATCH", "1000")),
+        "delete_pause": float(os.environ.get("ARCHIVE_DELETE_PAUSE", "0")),
+        "compresslevel": int(os.environ.get("ARCHIVE_COMPRESSLEVEL", "6")),
+    }
+
+
+class LocalArchive:
+    """Archive files in a local directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @property
+    def location(self) -> str:
+        return self.root
+
+    def temp_dir(self) -> str:
+        path = os.path.join(self.root, "tmp")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def read_manifest(self) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.root, MANIFEST), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write_manifest(self, body: bytes):
+        fd, tmp = tempfile.mkstemp(dir=self.temp_dir(), suffix=".json")
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, os.path.join(self.root, MANIFEST))
+
+    def put(self, name: str, path: str):
+        """Move a finished temporary file into the archive."""
+        os.chmod(path, 0o644)
+        os.replace(path, os.path.join(self.root, name))
+
+    def open(self, name: str) -> IO[bytes]:
+        return open(os.path.join(self.root, name), "rb")
+
+
+class S3Archive:
+    """Archive objects under an S3 prefix."""
+
+    def __init__(self, bucket: str, prefix: str):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    @property
+    def location(self) -> str:
+        return f"s3://{self.bucket}/{self.prefix}"
+
+    def temp_dir(self) -> str:
+        return tempfile.gettempdir()
+
+    def read_manifest(self) -> Optional[bytes]:
+        from app.utils.aws import get_s3_client, s3_error_code
+
+        try:
+            return get_s3_client().get_object(Bucket=self.bucket, Key=self.prefix + MANIFEST)["Body"].read()
+        except Exception as e:
+            if s3_error_code(e) in ("NoSuchKey", "404"):
+                return None
+            raise
+
+    def write_manifest(self, body: bytes):
+        from app.utils.aws import get_s3_client
+
+        get_s3_client().put_object(Bucket=self.bucket, Key=self.prefix + MANIFEST, Body=body,
+                                   ContentType="application/json")
+
+    def put(self, name: str, path: str):
+        from app.utils.aws import get_s3_client
+
+        # upload_file switches to multipart for large files
+        get_s3_client().upload_file(path, self.bucket, self.prefix + name,
+                                    ExtraArgs={"ContentType": "application/x-ndjson", "ContentEncoding": "gzip"})
+        os.unlink(path)
+
+    def open(self, name: str) -> IO[bytes]:
+        from app.utils.aws import get_s3_client
+
+        return get_s3_client().get_object(Bucket=self.bucket, Key=self.prefix + name)["Body"]
+
+
+def get_store():
+    bucket = os.environ.get("ARCHIVE_BUCKET")
+    if bucket:
+        prefix = os.environ.get("ARCHIVE_PREFIX", "archive/submissions/")
+        return S3Archive(bucket, prefix if not prefix or prefix.endswith("/") else prefix + "/")
+    default = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "archive")
+    root = os.environ.get("ARCHIVE_DIR") or default
+    os.makedirs(root, exist_ok=True)
+    return LocalArchive(root)
+
+
+def read_manifest(store=None) -> dict:
+    body = (store or get_store()).read_manifest()
+    if body is None:
+        return {"version": 1, "table": "submissions", "columns": list(COLUMNS), "files": []}
+    return loads(body)
+
+
+def _write_manifest(store, manifest: dict):
+    manifest["updated_at"] = datetime.utcnow().isoformat()
+    store.write_manifest(dumps(manifest))
+
+
+def summary(store=None) -> dict:
+    store = store or get_store()
+    files = read_manifest(store)["files"]
+    return {
+        "location": store.location,
+        "files": len(files),
+        "rows": sum(entry["rows"] for entry in files),
+        "bytes": sum(entry["bytes"] for entry in files),
+        "pending_deletes": sum(1 for entry in files if not entry["deleted"]),
+        "first_submitted_at": min((e["first_submitted_at"] for e in files if e["first_submitted_at"]), default=None),
+        "last_submitted_at": max((e["last_submitted_at"] for e in files if e["last_submitted_at"]), default=None),
+    }
+
+
+# Archiving
+
+def _conditions(before: Optional[datetime], challenge_ids: Optional[Iterable[int]]) -> list:
+    scope = []
+    if before is not None:
+        scope.append(Submission.submitted_at < before)
+    if challenge_ids:
+        scope.append(Submission.challenge_id.in_(list(challenge_ids)))
+    if not scope:
+        raise ValueError("Give a cutoff or challenge ids to archive")
+    conditions = [Submission.is_correct.is_(False), db.or_(*scope)]
+    # Leave rows the flag-sharing detector has not seen yet (if it is in use)
+    from app.utils.flag_sharing import CHECKPOINT_KEY
+
+    checkpoint = AppSetting.get_json(CHECKPOINT_KEY)
+    if checkpoint is not None:
+        conditions.append(Submission.id <= checkpoint.get("last_submission_id", 0))
+    return conditions
+
+
+def count_candidates(before: Optional[datetime] = None, challenge_ids: Optional[Iterable[int]] = None) -> int:
+    return db.session.execute(
+        db.select(db.func.count()).select_from(Submission).where(*_conditions(before, challenge_ids))
+    ).scalar()
+
+
+def _delete(ids: List[int], cfg: dict) -> int:
+    """Delete archived rows in short transactions, keeping per-player counts."""
+    deleted = 0
+    for start in range(0, len(ids), cfg["delete_batch"]):
+        chunk = ids[start:start + cfg["delete_batch"]]
+        where = (Submission.id.in_(chunk), Submission.is_correct.is_(False))
+        counts = db.session.execute(
+            db.select(Submission.user_id, db.func.count()).where(*where).group_by(Submission.user_id)
+        ).all()
+        if counts:
+            db.session.execute(
+                db.delete(Submission).where(*where).execution_options(synchronize_session=False)
+            )
+            db.session.execute(
+                db.update(User.__table__)
+                .where(User.__table__.c.id == db.bindparam("_user_id"))
+                .values(archived_submissions=User.__table__.c.archived_submissions + db.bindparam("_count")),
+                [{"_user_id": user_id, "_count": count} for user_id, count in counts],
+            )
+        db.session.commit()
+        deleted += sum(count for _, count in counts)
+        if cfg["delete_pause"]:
+            time.sleep(cfg["delete_pause"])
+    return deleted
+
+
+def _file_ids(store, name: str) -> List[int]:
+    with store.open(name) as raw, gzip.GzipFile(fileobj=raw) as lines:
+        return [loads(line)["id"] for line in lines]
+
+
+def _finish_pending(store, manifest: dict, cfg: dict) -> int:
+    """Delete the rows of files left pending by an interrupted run."""
+    deleted = 0
+    for entry in manifest["files"]:
+        if not entry["deleted"]:
+            deleted += _delete(_file_ids(store, entry["name"]), cfg)
+            entry["deleted"] = True
+            _write_manifest(store, manifest)
+    return deleted
+
+
+def _write_file(store, rows_pages: Iterator[list], cfg: dict) -> Optional[dict]:
+    """Write pages of rows to one archive file. Returns its manifest entry and ids."""
+    fd, tmp = tempfile.mkstemp(dir=store.temp_dir(), suffix=".ndjson.gz")
+    ids, challenge_ids = [], set()
+    first_at = last_at = None
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=cfg["compresslevel"], mtime=0) as out:
+                for page in rows_pages:
+                    for row in page:
+                        out.write(dumps(dict(zip(COLUMNS, row))) + b"\n")
+                        ids.append(row.id)
+                        challenge_ids.add(row.challenge_id)
+                        if row.submitted_at is not None:
+                            first_at = row.submitted_at if first_at is None else min(first_at, row.submitted_at)
+                            last_at = row.submitted_at if last_at is None else max(last_at, row.submitted_at)
+            raw.flush()
+            os.fsync(raw.fileno())
+        if not ids:
+            os.unlink(tmp)
+            return None
+        sha = hashlib.sha256()
+        with open(tmp, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        entry = {
+            "name": f"submissions-{ids[0]:010d}-{ids[-1]:010d}.ndjson.gz",
+            "rows": len(ids),
+            "bytes": os.path.getsize(tmp),
+            "sha256": sha.hexdigest(),
+            "min_id": ids[0],
+            "max_id": ids[-1],
+            "first_submitted_at": first_at.isoformat() if first_at else None,
+            "last_submitted_at": last_at.isoformat() if last_at else None,
+            "challenge_ids": sorted(challenge_ids),
+            "archived_at": datetime.utcnow().isoformat(),
+            "deleted": False,
+        }
+        store.put(entry["name"], tmp)
+        return {"entry": entry, "ids": ids}
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def archive_submissions(before: Optional[datetime] = None, challenge_ids: Optional[Iterable[int]] = None,
+                        max_files: Optional[int] = None, store=None) -> dict:
+    """Archive and delete matching incorrect submissions. Returns run statistics."""
+    cfg = _config()
+    store = store or get_store()
+    conditions = _conditions(before, challenge_ids)
+    manifest = read_manifest(store)
+    stats = {"location": store.location, "files": 0, "rows": 0, "bytes": 0,
+             "resumed_deletes": _finish_pending(store, manifest, cfg), "deleted": 0}
+    started = time.perf_counter()
+    last_id = 0
+
+    def pages():
+        nonlocal last_id
+        remaining = cfg["file_rows"]
+        while remaining > 0:
+            page = db.session.execute(
+                db.select(*(getattr(Submission, column) for column in COLUMNS))
+                .where(Submission.id > last_id, *conditions)
+                .order_by(Submission.id)
+                .limit(min(cfg["page_rows"], remaining))
+            ).all()
+            # Release the read snapshot between pages
+            db.session.rollback()
+            if not page:
+                return
+            last_id = page[-1].id
+            remaining -= len(page)
+            yield page
+
+    while max_files is None or stats["files"] < max_files:
+        written = _write_file(store, pages(), cfg)
+        if written is None:
+            break
+        entry = written["entry"]
+        manifest["files"].append(entry)
+        _write_manifest(store, manifest)
+        stats["deleted"] += _delete(written["ids"], cfg)
+        entry["deleted"] = True
+        _write_manifest(store, manifest)
+        stats["files"] += 1
+        stats["rows"] += entry["rows"]
+        stats["bytes"] += entry["bytes"]
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    if stats["files"] or stats["resumed_deletes"]:
+        log_event(logger, "archive.submissions", "Archived submissions", files=stats["files"],
+                  rows=stats["rows"], archive_bytes=stats["bytes"], deleted=stats["deleted"],
+                  location=store.location)
+    return stats
+
+
+# Reading
+
+def _rows(store, entry: dict) -> Iterator[dict]:
+    with store.open(entry["name"]) as raw, gzip.GzipFile(fileobj=raw) as lines:
+        for line in lines:
+            yield loads(line)
+
+
+def _overlapping(entries: List[dict]) -> Iterator[List[dict]]:
+    """Group files whose id ranges overlap (e.g. a challenge run after a cutoff run)."""
+    group, high = [], 0
+    for entry in sorted(entries, key=lambda e: e["min_id"]):
+        if group and entry["min_id"] > high:
+            yield group
+            group = []
+        group.append(entry)
+        high = max(high, entry["max_id"])
+    if group:
+        yield group
+
+
+def scan_submissions(user_id: Optional[int] = None, challenge_id: Optional[int] = None,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     after_id: int = 0, store=None) -> Iterator[dict]:
+    """Yield archived submissions in id order, streaming each file."""
+    store = store or get_store()
+    since_iso = since.isoformat() if since else None
+    until_iso = until.isoformat() if until else None
+    entries = [
+        entry for entry in read_manifest(store)["files"]
+        if entry["max_id"] > after_id
+        and (challenge_id is None or challenge_id in entry["challenge_ids"])
+        and not (since_iso and (entry["last_submitted_at"] or "") < since_iso)
+        and not (until_iso and (entry["first_submitted_at"] or "") >= until_iso)
+    ]
+    for group in _overlapping(entries):
+        if len(group) == 1:
+            rows = _rows(store, group[0])
+        else:
+            rows = heapq.merge(*(_rows(store, entry) for entry in group), key=lambda r: r["id"])
+        for row in rows:
+            if row["id"] <= after_id:
+                continue
+            if user_id is not None and row["user_id"] != user_id:
+                continue
+            if challenge_id is not None and row["challenge_id"] != challenge_id:
+                continue
+            # ISO 8601 strings of one format compare like the datetimes
+            if since_iso and (row["submitted_at"] or "") < since_iso:
+                continue
+            if until_iso and (row["submitted_at"] or "") >= until_iso:
+                continue
+            yield row
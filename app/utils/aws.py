@@ -1,20 +1,83 @@
 import os
 import json
+import threading
+import time
 import urllib.parse
-from typing import Optional, Tuple
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 
-import boto3
-from botocore.config import Config as BotoConfig
-from botocore.exceptions import BotoCoreError, ClientError
+from app.utils import metrics
 
-_BOTO_CONFIG = BotoConfig(retries={"max_attempts": 3, "mode": "standard"})
+# boto3/botocore are imported on first use: most requests never talk to AWS,
+# and the SDK adds ~70 ms and several MB to every worker boot.
+
+metrics.registry.describe(metrics.PREFIX + "s3_presign_total", "counter", "Presigned S3 GET URLs by cache outcome")
+
+
+def _boto_config(service: str):
+    from botocore.config import Config as BotoConfig
+
+    options = {}
+    if service == "s3" and os.environ.get("S3_ADDRESSING_STYLE"):
+        # Local S3 stand-ins (MinIO, moto server) usually need path-style URLs
+        options["s3"] = {"addressing_style": os.environ["S3_ADDRESSING_STYLE"]}
+    # Under gevent many greenlets share one client, so allow more pooled HTTP connections
+    return BotoConfig(
+        retries={"max_attempts": 3, "mode": "standard"},
+        max_pool_connections=int(os.environ.get(
+            "AWS_MAX_POOL_CONNECTIONS", 50 if os.environ.get("WORKER_MODE", "").lower() == "gevent" else 10
+        )),
+        **options,
+    )
+
+
+def aws_errors():
+    """Exception types raised by boto3 calls (botocore is imported lazily)."""
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    return (BotoCoreError, ClientError)
+
+
+# One client per service per process. Building a client costs tens of
+# milliseconds of CPU; built clients are thread-safe and reuse their HTTP
+# connection pool. Clients are not shared across fork.
+_clients_lock = threading.Lock()
+_clients: Dict[str, object] = {}
+_clients_pid: Optional[int] = None
 
 
 def _client(service: str):
-    region = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION")
-    if region:
-        return boto3.client(service, region_name=region, config=_BOTO_CONFIG)
-    return boto3.client(service, config=_BOTO_CONFIG)
+    global _clients_pid
+    client = _clients.get(service)
+    if client is not None and _clients_pid == os.getpid():
+        return client
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(service)
+        if client is None:
+            import boto3
+
+            kwargs = {"config": _boto_config(service)}
+            region = os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION")
+            if region:
+                kwargs["region_name"] = region
+            # S3_ENDPOINT_URL / SQS_ENDPOINT_URL point a service at a local stand-in
+            endpoint = os.environ.get(f"{service.upper()}_ENDPOINT_URL")
+            if endpoint:
+                kwargs["endpoint_url"] = endpoint
+            # boto3.client() uses a shared default session, which is not thread-safe
+            client = boto3.session.Session().client(service, **kwargs)
+            _clients[service] = client
+        return client
+
+
+def reset_clients():
+    """Drop cached clients and presigned URLs (after changing AWS settings)."""
+    with _clients_lock:
+        _clients.clear()
+    presigned_get_cache.clear()
 
 
 def get_s3_client():
@@ -38,6 +101,7 @@ def parse_s3_url(url: str) -> Optional[Tuple[str, str]]:
 
 def s3_presigned_put_url(bucket: str, key: str, content_type: str = "application/octet-stream", expires_in: int = 300) -> Optional[str]:
     """Generate a presigned PUT URL for direct upload to S3."""
+    errors = aws_errors()
     try:
         s3 = get_s3_client()
         return s3.generate_presigned_url(
@@ -45,12 +109,13 @@ def s3_presigned_put_url(bucket: str, key: str, content_type: str = "application
             Params={"Bucket": bucket, "Key": key, "ContentType": content_type},
             ExpiresIn=expires_in,
         )
-    except (BotoCoreError, ClientError):
+    except errors:
         return None
 
 
 def s3_presigned_get_url(bucket: str, key: str, expires_in: int = 300) -> Optional[str]:
     """Generate a presigned GET URL for temporary download access."""
+    errors = aws_errors()
     try:
         s3 = get_s3_client()
         return s3.generate_presigned_url(
@@ -58,14 +123,210 @@ def s3_presigned_get_url(bucket: str, key: str, expires_in: int = 300) -> Option
             Params={"Bucket": bucket, "Key": key},
             ExpiresIn=expires_in,
         )
-    except (BotoCoreError, ClientError):
+    except errors:
         return None
 
 
+# Multipart uploads (large attachments)
+
+MIB = 1024 * 1024
+MULTIPART_MIN_PART_SIZE = 5 * MIB
+MULTIPART_MAX_PART_SIZE = 5 * 1024 * MIB
+MULTIPART_MAX_PARTS = 10000
+MULTIPART_MAX_OBJECT_SIZE = 5 * 1024 * 1024 * MIB
+
+
+def choose_part_size(total_size: Optional[int]) -> int:
+    """Part size for an upload of ``total_size`` bytes.
+
+    Starts from S3_MULTIPART_PART_SIZE (default 64 MiB): large enough that
+    per-request overhead is small, small enough that a retry resends little.
+    Grows in whole MiB when the file would need more than 10,000 parts.
+    """
+    target = int(os.environ.get("S3_MULTIPART_PART_SIZE", 64 * MIB))
+    part_size = min(max(target, MULTIPART_MIN_PART_SIZE), MULTIPART_MAX_PART_SIZE)
+    if total_size:
+        needed = -(-total_size // MULTIPART_MAX_PARTS)
+        if needed > part_size:
+            part_size = -(-needed // MIB) * MIB
+    return part_size
+
+
+def s3_create_multipart_upload(bucket: str, key: str, content_type: str = "application/octet-stream") -> str:
+    """Start a multipart upload and return its UploadId."""
+    s3 = get_s3_client()
+    response = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)
+    return response["UploadId"]
+
+
+def s3_presigned_part_urls(bucket: str, key: str, upload_id: str, part_numbers, expires_in: int = 3600) -> Dict[int, str]:
+    """Presigned PUT URL for each part number (1-10000)."""
+    s3 = get_s3_client()
+    return {
+        n: s3.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": bucket, "Key": key, "UploadId": upload_id, "PartNumber": n},
+            ExpiresIn=expires_in,
+        )
+        for n in part_numbers
+    }
+
+
+def s3_list_parts(bucket: str, key: str, upload_id: str) -> list:
+    """Parts already uploaded, as [{"part_number", "etag", "size"}] (follows pagination)."""
+    s3 = get_s3_client()
+    parts = []
+    marker = 0
+    while True:
+        response = s3.list_parts(Bucket=bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker)
+        parts.extend(
+            {"part_number": p["PartNumber"], "etag": p["ETag"], "size": p["Size"]}
+            for p in response.get("Parts", [])
+        )
+        if not response.get("IsTruncated"):
+            return parts
+        marker = response["NextPartNumberMarker"]
+
+
+def s3_complete_multipart_upload(bucket: str, key: str, upload_id: str, parts: list) -> None:
+    """Assemble the object from ``parts`` ([{"part_number", "etag"}])."""
+    s3 = get_s3_client()
+    s3.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": [
+            {"PartNumber": int(p["part_number"]), "ETag": p["etag"]}
+            for p in sorted(parts, key=lambda p: int(p["part_number"]))
+        ]},
+    )
+
+
+def s3_abort_multipart_upload(bucket: str, key: str, upload_id: str) -> None:
+    s3 = get_s3_client()
+    s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+
+
+class PresignedUrlCache:
+    """LRU of presigned GET URLs keyed by (bucket, key, expires_in).
+
+    A URL is handed out again until ``margin`` seconds before it expires, so
+    every client still gets at least ``margin`` seconds to start the download.
+    Misses are signed under the lock: a burst of requests for the same object
+    costs one signing operation.
+    """
+
+    def __init__(self, max_entries: int, margin: int):
+        self.max_entries = max_entries
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[str, float]]" = OrderedDict()
+
+    def get(self, bucket: str, key: str, expires_in: int, sign) -> Optional[Tuple[str, int]]:
+        cache_key = (bucket, key, expires_in)
+        with self._lock:
+            now = time.time()
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[1] - self.margin > now:
+                self._entries.move_to_end(cache_key)
+                metrics.inc(metrics.PREFIX + "s3_presign_total", cache="hit")
+                return entry[0], int(entry[1] - now)
+            url = sign()
+            metrics.inc(metrics.PREFIX + "s3_presign_total", cache="miss")
+            if url is None:
+                return None
+            expires_at = now + expires_in
+            if expires_in > self.margin and self.max_entries > 0:
+                self._entries[cache_key] = (url, expires_at)
+                self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return url, expires_in
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+presigned_get_cache = PresignedUrlCache(
+    max_entries=int(os.environ.get("S3_PRESIGN_CACHE_SIZE", 1024)),
+    margin=int(os.environ.get("S3_PRESIGN_REUSE_MARGIN", 120)),
+)
+
+
+def cached_presigned_get_url(bucket: str, key: str, expires_in: int = 600) -> Optional[Tuple[str, int]]:
+    """Presigned GET URL shared by concurrent callers, with its remaining lifetime in seconds."""
+    return presigned_get_cache.get(bucket, key, expires_in, lambda: s3_presigned_get_url(bucket, key, expires_in))
+
+
+# Outcome of recent publishes in this process, reported by the readiness probe
+# instead of calling SQS from the health checker.
+_sqs_lock = threading.Lock()
+_sqs_status = {"last_success": None, "last_failure": None, "last_error": None, "consecutive_failures": 0}
+
+
+def _record_sqs_outcome(error: Optional[str]):
+    with _sqs_lock:
+        if error is None:
+            _sqs_status["last_success"] = time.time()
+            _sqs_status["consecutive_failures"] = 0
+        else:
+            _sqs_status["last_failure"] = time.time()
+            _sqs_status["last_error"] = error
+            _sqs_status["consecutive_failures"] += 1
+
+
+def sqs_publisher_status() -> dict:
+    """Snapshot of recent SendMessage outcomes in this process."""
+    with _sqs_lock:
+        return dict(_sqs_status)
+
+
 def send_sqs_message(queue_url: str, payload: dict) -> bool:
+    errors = aws_errors()
+    start = time.perf_counter()
     try:
         sqs = get_sqs_client()
         sqs.send_message(QueueUrl=queue_url, MessageBody=json.dumps(payload))
+        metrics.observe(metrics.PREFIX + "sqs_publish_duration_seconds", time.perf_counter() - start, outcome="ok")
+        _record_sqs_outcome(None)
         return True
-    except (BotoCoreError, ClientError):
+    except errors as e:
+        metrics.observe(metrics.PREFIX + "sqs_publish_duration_seconds", time.perf_counter() - start, outcome="error")
+        _record_sqs_outcome(str(e))
         return False
+
+
+# Conditional PutObject headers for the calling thread, added at signing time
+# (boto3 1.34 has no IfNoneMatch/IfMatch parameters)
+_conditional = threading.local()
+
+
+def _add_conditional_headers(request, **kwargs):
+    for name, value in getattr(_conditional, "headers", {}).items():
+        request.headers[name] = value
+
+
+def s3_error_code(e) -> str:
+    response = getattr(e, "response", None) or {}
+    return str(response.get("Error", {}).get("Code") or response.get("ResponseMetadata", {}).get("HTTPStatusCode"))
+
+
+def s3_put_object_if(bucket: str, key: str, body: bytes, headers: Dict[str, str], **kwargs) -> bool:
+    """PutObject with If-None-Match / If-Match headers. False if the precondition failed (412).
+
+    Other errors (including 409 ConditionalRequestConflict) are raised.
+    """
+    s3 = get_s3_client()
+    s3.meta.events.register("before-sign.s3.PutObject", _add_conditional_headers,
+                            unique_id="flagrush-conditional-put")
+    _conditional.headers = headers
+    try:
+        s3.put_object(Bucket=bucket, Key=key, Body=body, **kwargs)
+        return True
+    except aws_errors() as e:
+        if s3_error_code(e) in ("PreconditionFailed", "412"):
+            return False
+        raise
+    finally:
+        _conditional.headers = {}
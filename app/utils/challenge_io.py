@@ -0,0 +1,407 @@
+"""Challenge import and export.
+
+A challenge set is NDJSON, one challenge per line, with the fields of
+``POST /api/admin/challenges`` plus ``slug`` (``EXPORT_FIELDS``). Hints and
+``file_url`` travel with each challenge. A package (``.tar.gz``) adds
+``manifest.json`` and, under ``files/<sha256>``, the attachments held in local
+storage (``local://`` URLs). Other URLs (S3, external) are exported as
+references only.
+
+Export streams rows in id order, so it never holds the whole set in memory.
+
+Import reads the whole file first and validates every row before writing
+anything. Nothing is written if any row fails, and the report lists each
+row's error. Rows are keyed by ``slug``, which is unique among live
+challenges and does not change with the title:
+
+- unknown slugs are inserted in one executemany INSERT;
+- known slugs whose fields differ are updated in one executemany UPDATE by
+  id, and their score changes reach solvers through one
+  ``scoring.revalue_challenges`` call;
+- identical rows are left alone.
+
+Everything commits in one transaction. A deleted challenge's slug counts as
+free, so importing it again creates a new challenge. ``points`` sets the
+value of a static challenge. For dynamic challenges it is the starting value
+when ``initial_points`` is absent, as on create.
+"""
+import io
+import json
+import logging
+import os
+import re
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import IO, Iterator, List, Optional, Tuple
+
+from app import db
+from app.models.challenge import Challenge
+from app.utils import scoring, storage
+from app.utils.flags import validate_flags
+from app.utils.logs import log_event
+from app.utils.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_FORMAT = "flagrush-challenges"
+PACKAGE_VERSION = 1
+PACKAGE_ROWS = "challenges.ndjson"
+
+SLUG_MAX_LENGTH = 100
+_SLUG_RE = re.compile(r"^[a-z0-9]+(?:-[a-z0-9]+)*$")
+
+EXPORT_FIELDS = (
+    "slug", "title", "description", "category", "author", "scoring", "points", "initial_points",
+    "minimum_points", "decay", "flag", "flags", "is_active", "file_url", "hint_1", "hint_2", "hint_3",
+)
+REQUIRED_FIELDS = ("title", "description", "category", "points", "flag")
+# Column lengths; description and hints are TEXT
+_TEXT_LIMITS = {"title": 200, "category": 50, "flag": 500, "author": 100, "file_url": 500,
+                "description": None, "hint_1": None, "hint_2": None, "hint_3": None}
+# Columns written by an import (points is handled separately)
+_COLUMNS = ("slug", "title", "description", "category", "author", "scoring", "initial_points",
+            "minimum_points", "decay", "flag", "flags", "is_active", "file_url", "hint_1", "hint_2", "hint_3")
+_SLUG_LOOKUP_CHUNK = 500
+
+
+def slugify(title: str) -> str:
+    """Lowercase ASCII words of ``title`` joined by dashes (``"SQL Injection 101"`` -> ``sql-injection-101``)."""
+    return re.sub(r"[^a-z0-9]+", "-", (title or "").lower()).strip("-")[:80].strip("-") or "challenge"
+
+
+def validate_slug(slug) -> Optional[str]:
+    if not isinstance(slug, str) or len(slug) > SLUG_MAX_LENGTH or not _SLUG_RE.match(slug):
+        return (f"slug must be at most {SLUG_MAX_LENGTH} lowercase letters, digits and single dashes "
+                "(e.g. sql-injection-101)")
+    return None
+
+
+def slug_taken(slug: str, exclude_id: Optional[int] = None) -> bool:
+    query = db.select(Challenge.id).where(Challenge.slug == slug, Challenge.deleted_at.is_(None))
+    if exclude_id is not None:
+        query = query.where(Challenge.id != exclude_id)
+    return db.session.execute(query.limit(1)).first() is not None
+
+
+def unique_slug(title: str) -> str:
+    """A free slug for a new challenge: ``slugify(title)``, with ``-2``, ``-3``... if needed."""
+    base = slugify(title)
+    taken = set(db.session.execute(
+        db.select(Challenge.slug).where(db.or_(Challenge.slug == base, Challenge.slug.like(f"{base}-%")),
+                                        Challenge.deleted_at.is_(None))
+    ).scalars())
+    slug, n = base, 1
+    while slug in taken:
+        n += 1
+        slug = f"{base}-{n}"
+    return slug
+
+
+# Export
+
+def export_rows() -> Iterator[dict]:
+    """Live challenges in id order, as import rows."""
+    columns = [getattr(Challenge, field) for field in EXPORT_FIELDS]
+    result = db.session.execute(
+        db.select(*columns).where(Challenge.deleted_at.is_(None)).order_by(Challenge.id)
+        .execution_options(yield_per=500)
+    )
+    for row in result:
+        data = dict(row._mapping)
+        data["flags"] = json.loads(data["flags"]) if data["flags"] else []
+        if data["scoring"] == "static":
+            # Only meaningful for dynamic challenges
+            data["initial_points"] = None
+        yield data
+
+
+def export_ndjson() -> Iterator[bytes]:
+    for row in export_rows():
+        yield dumps(row) + b"\n"
+
+
+class _Chunks:
+    """Write target for tarfile's stream mode; the export drains it after each member."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def export_package() -> Iterator[bytes]:
+    """The ``.tar.gz`` package: manifest, rows and local attachments, streamed."""
+    digests, count, size = {}, 0, 0
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as rows:
+        for row in export_rows():
+            line = dumps(row) + b"\n"
+            rows.write(line)
+            count += 1
+            size += len(line)
+            local = storage.parse_local_url(row["file_url"])
+            if local and local[0] not in digests and os.path.isfile(storage.object_path(local[0])):
+                digests[local[0]] = os.path.getsize(storage.object_path(local[0]))
+        rows.seek(0)
+
+        now = int(time.time())
+        manifest = dumps({
+            "format": PACKAGE_FORMAT, "version": PACKAGE_VERSION,
+            "exported_at": datetime.utcnow().isoformat(), "challenges": count,
+            "files": [{"sha256": digest, "size": length} for digest, length in sorted(digests.items())],
+        })
+        sink = _Chunks()
+        with tarfile.open(fileobj=sink, mode="w|gz") as tar:
+            def add(name, fileobj, length):
+                info = tarfile.TarInfo(name)
+                info.size, info.mtime, info.mode = length, now, 0o644
+                tar.addfile(info, fileobj)
+
+            add("manifest.json", io.BytesIO(manifest), len(manifest))
+            add(PACKAGE_ROWS, rows, size)
+            yield sink.drain()
+            for digest, length in sorted(digests.items()):
+                with open(storage.object_path(digest), "rb") as f:
+                    add(f"files/{digest}", f, length)
+                yield sink.drain()
+        yield sink.drain()
+
+
+# Import
+
+def _spool(stream: IO[bytes]) -> IO[bytes]:
+    max_bytes = int(os.environ.get("CHALLENGE_IMPORT_MAX_BYTES", 1024 * 1024 * 1024))
+    spooled = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    size = 0
+    while True:
+        chunk = stream.read(1024 * 1024)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            spooled.close()
+            raise ValueError(f"Import exceeds {max_bytes} bytes")
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def _parse(lines) -> List[Tuple[int, Optional[dict], Optional[str]]]:
+    max_rows = int(os.environ.get("CHALLENGE_IMPORT_MAX_ROWS", 10000))
+    parsed = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        if len(parsed) >= max_rows:
+            raise ValueError(f"At most {max_rows} challenges can be imported at once")
+        try:
+            data = loads(line)
+        except ValueError as e:
+            parsed.append((number, None, f"Invalid JSON: {e}"))
+            continue
+        if not isinstance(data, dict):
+            parsed.append((number, None, "Each line must be a JSON object"))
+            continue
+        parsed.append((number, data, None))
+    return parsed
+
+
+def _validate(data: dict, packaged: set) -> Tuple[Optional[dict], Optional[str]]:
+    """Column values for one import row, or an error message."""
+    missing = [field for field in REQUIRED_FIELDS if data.get(field) in (None, "")]
+    if missing:
+        return None, f"Missing required fields: {', '.join(missing)}"
+    row = {}
+    for field, limit in _TEXT_LIMITS.items():
+        value = data.get(field)
+        if value is not None and not isinstance(value, str):
+            return None, f"{field} must be a string"
+        if value is not None and limit and len(value) > limit:
+            return None, f"{field} must be at most {limit} characters"
+        row[field] = value
+    slug = data.get("slug") or slugify(row["title"])
+    slug_error = validate_slug(slug)
+    if slug_error:
+        return None, slug_error
+    row["slug"] = slug
+    for field in ("points", "initial_points", "minimum_points", "decay"):
+        value = data.get(field)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            return None, f"{field} must be a non-negative integer"
+    is_active = data.get("is_active", True)
+    if not isinstance(is_active, bool):
+        return None, "is_active must be true or false"
+    flags, flags_error = validate_flags(data.get("flags"))
+    if flags_error:
+        return None, flags_error
+
+    row.update(
+        scoring=data.get("scoring") or "static",
+        points=data["points"],
+        initial_points=data.get("initial_points", data["points"]),
+        minimum_points=data.get("minimum_points"),
+        decay=data.get("decay"),
+        flags=json.dumps(flags) if flags else None,
+        is_active=is_active,
+    )
+    scoring_error = scoring.validate_scoring(SimpleNamespace(**row))
+    if scoring_error:
+        return None, scoring_error
+    if row["scoring"] == "static":
+        row["initial_points"] = row["points"]
+
+    local = storage.parse_local_url(row["file_url"])
+    if row["file_url"] and row["file_url"].startswith(storage.LOCAL_SCHEME):
+        if not local:
+            return None, "file_url is not a valid local:// attachment URL"
+        if local[0] not in packaged and not os.path.isfile(storage.object_path(local[0])):
+            return None, f"Attachment {local[0]} is neither in the package nor in local storage"
+    return row, None
+
+
+def _existing(slugs: List[str]) -> dict:
+    columns = [Challenge.id, Challenge.points, Challenge.flag_version] + [getattr(Challenge, c) for c in _COLUMNS]
+    found = {}
+    for start in range(0, len(slugs), _SLUG_LOOKUP_CHUNK):
+        for row in db.session.execute(
+            db.select(*columns).where(Challenge.slug.in_(slugs[start:start + _SLUG_LOOKUP_CHUNK]),
+                                      Challenge.deleted_at.is_(None))
+        ):
+            found[row.slug] = row
+    return found
+
+
+def _open_package(source: IO[bytes]):
+    """(tar, rows member, {sha256: member}) for a package, or None for plain NDJSON."""
+    if source.read(2) != b"\x1f\x8b":
+        source.seek(0)
+        return None
+    source.seek(0)
+    rows, files = None, {}
+    try:
+        tar = tarfile.open(fileobj=source, mode="r:gz")
+        for member in tar:
+            if member.isfile() and member.name == PACKAGE_ROWS:
+                rows = member
+            elif member.isfile() and member.name.startswith("files/"):
+                files[member.name[len("files/"):]] = member
+    except (tarfile.TarError, EOFError, OSError) as e:
+        raise ValueError(f"Not a challenge package: {e}")
+    if rows is None:
+        raise ValueError(f"Not a challenge package: {PACKAGE_ROWS} is missing")
+    return tar, rows, files
+
+
+def import_challenges(stream: IO[bytes], dry_run: bool = False) -> dict:
+    """Validate and upsert an NDJSON file or package. Commits unless ``dry_run`` or a row is invalid.
+
+    Raises ValueError when the input as a whole is unusable (too large, not a package).
+    """
+    start = time.perf_counter()
+    source = _spool(stream)
+    try:
+        package = _open_package(source)
+        if package:
+            tar, rows_member, files = package
+            parsed = _parse(tar.extractfile(rows_member))
+        else:
+            files = {}
+            parsed = _parse(source)
+
+        packaged = set(files)
+        results, valid, seen = [], [], {}
+        for number, data, error in parsed:
+            row = None
+            if data is not None:
+                row, error = _validate(data, packaged)
+            if row and row["slug"] in seen:
+                row, error = None, f"Duplicate slug {row['slug']!r} (line {seen[row['slug']]})"
+            result = {"line": number, "slug": (row or data or {}).get("slug")}
+            if error:
+                result.update(result="error", error=error)
+            else:
+                result["result"] = "valid"
+                seen[row["slug"]] = number
+                valid.append((result, row))
+            results.append(result)
+
+        errors = sum(1 for r in results if r.get("error"))
+        report = {"rows": len(results), "errors": errors, "dry_run": dry_run}
+        if errors:
+            report["results"] = results
+            return report
+
+        existing = _existing([row["slug"] for _, row in valid])
+        inserts, updates, previous = [], [], {}
+        for result, row in valid:
+            current = existing.get(row["slug"])
+            if current is None:
+                result["result"] = "created"
+                inserts.append(dict(
+                    {c: row[c] for c in _COLUMNS}, solve_count=0, flag_version=1,
+                    points=scoring.challenge_value(row["scoring"], row["initial_points"], row["minimum_points"] or 0,
+                                                   row["decay"], 0),
+                ))
+                continue
+            result["id"] = current.id
+            points = row["points"] if row["scoring"] == "static" else current.points
+            if points == current.points and all(getattr(current, c) == row[c] for c in _COLUMNS):
+                result["result"] = "unchanged"
+                continue
+            result["result"] = "updated"
+            flag_changed = current.flag != row["flag"] or current.flags != row["flags"]
+            updates.append(dict({f"_{c}": row[c] for c in _COLUMNS}, _id=current.id, _points=points,
+                                _flag_version=current.flag_version + 1 if flag_changed else current.flag_version))
+            previous[current.id] = current.points
+
+        for kind in ("created", "updated", "unchanged"):
+            report[kind] = sum(1 for r in results if r["result"] == kind)
+        report["results"] = results
+        if dry_run:
+            db.session.rollback()
+            return report
+
+        # Attachments first: they are content-addressed, so a failed import leaves only unused objects
+        needed = {local[0] for local in (storage.parse_local_url(row["file_url"]) for _, row in valid) if local}
+        for digest in sorted(needed & packaged):
+            stored, _ = storage.save_stream(tar.extractfile(files[digest]))
+            if stored != digest:
+                raise ValueError(f"Attachment files/{digest} does not match its SHA-256")
+
+        table = Challenge.__table__
+        if inserts:
+            db.session.execute(table.insert(), inserts)
+        if updates:
+            db.session.execute(
+                table.update().where(table.c.id == db.bindparam("_id"))
+                .values(points=db.bindparam("_points"), flag_version=db.bindparam("_flag_version"),
+                        **{c: db.bindparam(f"_{c}") for c in _COLUMNS}),
+                updates,
+            )
+            # Dynamic values and solver scores, for all updated challenges at once
+            scoring.revalue_challenges(previous)
+        if inserts:
+            created = _existing([r["slug"] for r in results if r["result"] == "created"])
+            for result in results:
+                if result["result"] == "created":
+                    result["id"] = created[result["slug"]].id
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        source.close()
+
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    log_event(logger, "challenges.import", "Imported challenges", rows=report["rows"],
+              inserted=report["created"], updated=report["updated"], unchanged=report["unchanged"],
+              seconds=report["seconds"])
+    return report
@@ -0,0 +1,86 @@
+"""Background purge of deleted challenges.
+
+``DELETE /api/admin/challenges/<id>`` only marks the challenge: it sets
+``deleted_at``, deactivates it and takes its points back from its solvers in
+one short transaction. This module removes the rest later. It deletes the
+challenge's submissions CHALLENGE_PURGE_BATCH rows at a time, each batch in
+its own transaction, then its flag-sharing findings, then the row itself.
+Nothing is loaded into the ORM, so a challenge with a million attempts costs
+the same memory as one with ten.
+
+Runs from ``flask challenges purge`` (ops/systemd/flagrush-challenge-purge.timer)
+or ``POST /api/admin/challenges/purge``. Every batch commits on its own, so
+an interrupted purge continues where it stopped on the next run.
+"""
+import logging
+import os
+from typing import Optional
+
+from app import db
+from app.models.challenge import Challenge
+from app.models.flag_share import FlagShareFinding
+from app.models.submission import Submission
+from app.utils.logs import log_event
+
+logger = logging.getLogger(__name__)
+
+_NO_SYNC = {"synchronize_session": False}
+
+
+def pending() -> list:
+    """Deleted challenges still waiting for the purge, oldest first."""
+    return [
+        {"id": row.id, "title": row.title, "deleted_at": row.deleted_at.isoformat()}
+        for row in db.session.execute(
+            db.select(Challenge.id, Challenge.title, Challenge.deleted_at)
+            .where(Challenge.deleted_at.isnot(None))
+            .order_by(Challenge.deleted_at, Challenge.id)
+        )
+    ]
+
+
+def purge_batch(batch_size: Optional[int] = None) -> Optional[dict]:
+    """Delete one batch for the oldest deleted challenge and commit. None when nothing is left."""
+    batch_size = batch_size or int(os.environ.get("CHALLENGE_PURGE_BATCH", "2000"))
+    challenge_id = db.session.execute(
+        db.select(Challenge.id).where(Challenge.deleted_at.isnot(None))
+        .order_by(Challenge.deleted_at, Challenge.id).limit(1)
+    ).scalar()
+    if challenge_id is None:
+        db.session.rollback()
+        return None
+
+    ids = db.session.execute(
+        db.select(Submission.id).where(Submission.challenge_id == challenge_id)
+        .order_by(Submission.id).limit(batch_size)
+    ).scalars().all()
+    if ids:
+        db.session.execute(db.delete(Submission).where(Submission.id.in_(ids)), execution_options=_NO_SYNC)
+        db.session.commit()
+        return {"challenge_id": challenge_id, "submissions": len(ids), "purged": False}
+
+    db.session.execute(db.delete(FlagShareFinding).where(FlagShareFinding.challenge_id == challenge_id),
+                       execution_options=_NO_SYNC)
+    db.session.execute(db.delete(Challenge).where(Challenge.id == challenge_id, Challenge.deleted_at.isnot(None)),
+                       execution_options=_NO_SYNC)
+    db.session.commit()
+    return {"challenge_id": challenge_id, "submissions": 0, "purged": True}
+
+
+def run(max_batches: Optional[int] = None, batch_size: Optional[int] = None) -> dict:
+    """Purge batches until no deleted challenge is left (or ``max_batches``)."""
+    totals = {"batches": 0, "submissions": 0, "challenges": []}
+    while max_batches is None or totals["batches"] < max_batches:
+        stats = purge_batch(batch_size)
+        if stats is None:
+            break
+        totals["batches"] += 1
+        totals["submissions"] += stats["submissions"]
+        if stats["purged"]:
+            totals["challenges"].append(stats["challenge_id"])
+    totals["remaining"] = len(pending())
+    if totals["batches"]:
+        log_event(logger, "challenges.purge", "Purged deleted challenges", batches=totals["batches"],
+                  submissions=totals["submissions"], challenges=totals["challenges"],
+                  remaining=totals["remaining"])
+    return totals
@@ -0,0 +1,170 @@
+"""Negotiated gzip/brotli response compression.
+
+JSON and NDJSON responses of at least COMPRESS_MIN_SIZE bytes are compressed
+with the best encoding the client accepts. Brotli is used only when the
+optional ``brotli`` package is installed. Streamed NDJSON responses are
+compressed incrementally and flushed every COMPRESS_STREAM_FLUSH_BYTES of
+input, so clients still receive rows while they are produced.
+
+Compressed bodies of at least COMPRESS_CACHE_MIN_SIZE bytes are kept in a
+per-worker LRU keyed by a digest of the uncompressed body. Cached payloads,
+such as a frozen scoreboard or a hot leaderboard, are compressed once and
+then served from memory. The LRU holds at most COMPRESS_CACHE_BYTES bytes.
+"""
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+
+from flask import request
+
+from app.utils import metrics
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/plain", "text/csv"}
+
+metrics.registry.describe(metrics.PREFIX + "compression_total", "counter",
+                          "Compressed responses by encoding and cache result")
+metrics.registry.describe(metrics.PREFIX + "compression_bytes_saved_total", "counter",
+                          "Bytes saved by response compression")
+
+
+class _CompressedCache:
+    """Byte-bounded LRU of compressed bodies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._size = 0
+
+    def get(self, key) -> Optional[bytes]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value: bytes, budget: int):
+        if len(value) > budget:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = value
+            self._size += len(value)
+            while self._size > budget and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+cache = _CompressedCache()
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body: bytes, encoding: str, config) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=config.get("COMPRESS_BR_QUALITY", 5))
+    return gzip.compress(body, compresslevel=config.get("COMPRESS_GZIP_LEVEL", 6), mtime=0)
+
+
+def _stream(chunks: Iterable[bytes], encoding: str, config) -> Iterator[bytes]:
+    """Compress an iterable of chunks, flushing every COMPRESS_STREAM_FLUSH_BYTES of input."""
+    flush_every = config.get("COMPRESS_STREAM_FLUSH_BYTES", 16384)
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=config.get("COMPRESS_BR_QUALITY", 5))
+        feed, flush = compressor.process, compressor.flush
+    else:
+        compressor = zlib.compressobj(config.get("COMPRESS_GZIP_LEVEL", 6), zlib.DEFLATED, 31)
+        feed, flush = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+    pending = 0
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        data = feed(chunk)
+        pending += len(chunk)
+        if pending >= flush_every:
+            data += flush()
+            pending = 0
+        if data:
+            yield data
+    yield compressor.finish() if encoding == "br" else compressor.flush()
+
+
+def _add_vary(response):
+    vary = response.headers.get("Vary")
+    if not vary:
+        response.headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        response.headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+def init_app(app):
+    """Register the compression hook. Disable with COMPRESS_ENABLED=false."""
+    if not app.config.get("COMPRESS_ENABLED", True):
+        return
+
+    @app.after_request
+    def _compress_response(response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        _add_vary(response)
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or "Content-Encoding" in response.headers or request.method == "HEAD"):
+            return response
+
+        encoding = request.accept_encodings.best_match(available_encodings())
+        if not encoding:
+            return response
+        config = app.config
+
+        if response.is_streamed:
+            if response.mimetype != "application/x-ndjson":
+                return response
+            response.response = _stream(response.response, encoding, config)
+            response.direct_passthrough = False
+            response.headers.pop("Content-Length", None)
+            response.headers["Content-Encoding"] = encoding
+            metrics.inc(metrics.PREFIX + "compression_total", encoding=encoding, cache="stream")
+            return response
+
+        body = response.get_data()
+        if len(body) < config.get("COMPRESS_MIN_SIZE", 1024):
+            return response
+
+        compressed = None
+        key = None
+        if len(body) >= config.get("COMPRESS_CACHE_MIN_SIZE", 16384):
+            key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+            compressed = cache.get(key)
+        if compressed is None:
+            compressed = compress(body, encoding, config)
+            if key is not None:
+                cache.put(key, compressed, config.get("COMPRESS_CACHE_BYTES", 32 * 1024 * 1024))
+            metrics.inc(metrics.PREFIX + "compression_total", encoding=encoding, cache="miss" if key else "none")
+        else:
+            metrics.inc(metrics.PREFIX + "compression_total", encoding=encoding, cache="hit")
+        if len(compressed) >= len(body):
+            return response
+
+        metrics.inc(metrics.PREFIX + "compression_bytes_saved_total", len(body) - len(compressed))
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        etag = response.headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            response.headers["ETag"] = f"W/{etag}"
+        return response
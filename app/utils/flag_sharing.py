@@ -0,0 +1,185 @@
+"""Flag-sharing detection over submission hashes.
+
+Every submission stores ``flag_hash``, the SHA-256 of the normalized flag.
+The detector reads submissions after its checkpoint (the last submission id
+it processed, kept in ``app_settings``) in primary-key order, FLAG_SHARING_BATCH
+rows at a time. For the incorrect flags in a batch it runs two indexed
+lookups: earlier submissions of the same hashes within FLAG_SHARING_WINDOW
+seconds (``ix_submissions_flag_hash_submitted``), and findings still open for
+them. It never scans the whole table, and each batch commits its findings
+together with the new checkpoint.
+
+A finding is opened when a second player submits the same wrong flag for the
+same challenge within the window of an earlier submission. It is extended
+while further copies arrive within the window of the last one. Guesses
+shorter than FLAG_SHARING_MIN_LENGTH are ignored. A finding shared by more
+than FLAG_SHARING_MAX_USERS players is marked ``common`` (e.g.
+``flag{test}``) and stops recording player ids.
+
+Submissions newer than FLAG_SHARING_SETTLE seconds are left for the next
+run, so rows whose ids were allocated before a slow commit are not skipped.
+"""
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app import db
+from app.models.flag_share import FlagShareFinding
+from app.models.setting import AppSetting
+from app.models.submission import Submission
+from app.utils.logs import log_event
+
+CHECKPOINT_KEY = "flag_sharing.checkpoint"
+
+logger = logging.getLogger(__name__)
+
+
+def _config() -> dict:
+    return {
+        "batch_size": int(os.environ.get("FLAG_SHARING_BATCH", "2000")),
+        "window": timedelta(seconds=float(os.environ.get("FLAG_SHARING_WINDOW", "1800"))),
+        "min_length": int(os.environ.get("FLAG_SHARING_MIN_LENGTH", "6")),
+        "max_users": int(os.environ.get("FLAG_SHARING_MAX_USERS", "10")),
+        "settle": timedelta(seconds=float(os.environ.get("FLAG_SHARING_SETTLE", "30"))),
+    }
+
+
+def checkpoint() -> dict:
+    return AppSetting.get_json(CHECKPOINT_KEY, {"last_submission_id": 0})
+
+
+def _lock_checkpoint() -> AppSetting:
+    # Row lock (PostgreSQL) so concurrent runs process each batch once
+    setting = db.session.get(AppSetting, CHECKPOINT_KEY, with_for_update=True)
+    if setting is None:
+        setting = AppSetting.set_json(CHECKPOINT_KEY, {"last_submission_id": 0})
+        db.session.flush()
+    return setting
+
+
+def _extend(finding: FlagShareFinding, event, max_users: int):
+    finding.submission_count += 1
+    if finding.first_submission_id is None or event.id < finding.first_submission_id:
+        finding.first_submission_id, finding.first_seen = event.id, event.submitted_at
+    if finding.last_submission_id is None or event.id > finding.last_submission_id:
+        finding.last_submission_id, finding.last_seen = event.id, event.submitted_at
+    if finding.common:
+        return
+    user_ids = finding.get_user_ids()
+    if event.user_id in user_ids:
+        return
+    if len(user_ids) >= max_users:
+        finding.common = True
+        finding.user_count = len(user_ids) + 1
+        return
+    user_ids.append(event.user_id)
+    finding.user_ids = json.dumps(user_ids)
+    finding.user_count = len(user_ids)
+
+
+def _apply(events: list, finding: Optional[FlagShareFinding], last_id: int, cfg: dict, stats: dict):
+    """Open or extend findings for one (challenge, flag hash) from its events in time order."""
+    window, cluster = cfg["window"], []
+    for event in sorted(events, key=lambda e: (e.submitted_at, e.id)):
+        new = event.id > last_id
+        if finding is not None:
+            if event.submitted_at - finding.last_seen <= window:
+                # Events at or before the checkpoint were counted when they were processed
+                if new:
+                    _extend(finding, event, cfg["max_users"])
+                    stats["updated"] += 1
+                continue
+            finding = None
+        if cluster and event.submitted_at - cluster[-1].submitted_at > window:
+            cluster = []
+        cluster.append(event)
+        if new and len({e.user_id for e in cluster}) > 1:
+            finding = FlagShareFinding(
+                challenge_id=event.challenge_id, flag_hash=event.flag_hash,
+                submitted_flag=Submission.normalize_flag(cluster[0].submitted_flag),
+                user_ids="[]", user_count=0, submission_count=0, common=False,
+            )
+            for member in cluster:
+                _extend(finding, member, cfg["max_users"])
+            db.session.add(finding)
+            stats["created"] += 1
+            cluster = []
+
+
+def detect_batch(batch_size: Optional[int] = None) -> Optional[dict]:
+    """Process the next batch after the checkpoint and commit. None when caught up."""
+    cfg = _config()
+    setting = _lock_checkpoint()
+    state = json.loads(setting.value)
+    last_id = state.get("last_submission_id", 0)
+    rows = db.session.execute(
+        db.select(Submission.id, Submission.user_id, Submission.challenge_id, Submission.flag_hash,
+                  Submission.submitted_flag, Submission.submitted_at, Submission.is_correct)
+        .where(Submission.id > last_id)
+        .order_by(Submission.id)
+        .limit(batch_size or cfg["batch_size"])
+    ).all()
+    cutoff = datetime.utcnow() - cfg["settle"]
+    ready = []
+    for row in rows:
+        if row.submitted_at is not None and row.submitted_at > cutoff:
+            break
+        ready.append(row)
+    if not ready:
+        db.session.rollback()
+        return None
+
+    events = [
+        row for row in ready
+        if not row.is_correct and row.flag_hash and row.submitted_at is not None
+        and len(Submission.normalize_flag(row.submitted_flag)) >= cfg["min_length"]
+    ]
+    stats = {"scanned": len(ready), "incorrect": len(events), "created": 0, "updated": 0}
+    if events:
+        since = min(e.submitted_at for e in events) - cfg["window"]
+        hashes = {e.flag_hash for e in events}
+        earlier = db.session.execute(
+            db.select(Submission.id, Submission.user_id, Submission.challenge_id, Submission.flag_hash,
+                      Submission.submitted_flag, Submission.submitted_at)
+            .where(Submission.flag_hash.in_(hashes), Submission.submitted_at >= since,
+                   Submission.id <= last_id, Submission.is_correct.is_(False))
+        ).all()
+        open_findings = {}
+        for finding in FlagShareFinding.query.filter(
+            FlagShareFinding.flag_hash.in_(hashes), FlagShareFinding.last_seen >= since
+        ).order_by(FlagShareFinding.last_seen):
+            # Latest finding per key wins
+            open_findings[(finding.challenge_id, finding.flag_hash)] = finding
+        groups = {}
+        for event in events + earlier:
+            groups.setdefault((event.challenge_id, event.flag_hash), []).append(event)
+        for key, group in groups.items():
+            if any(e.id > last_id for e in group):
+                _apply(group, open_findings.get(key), last_id, cfg, stats)
+
+    state = {"last_submission_id": ready[-1].id, "updated_at": datetime.utcnow().isoformat()}
+    AppSetting.set_json(CHECKPOINT_KEY, state)
+    db.session.commit()
+    stats["last_submission_id"] = state["last_submission_id"]
+    return stats
+
+
+def run(max_batches: Optional[int] = None, batch_size: Optional[int] = None) -> dict:
+    """Process batches until caught up (or ``max_batches``)."""
+    totals = {"batches": 0, "scanned": 0, "incorrect": 0, "created": 0, "updated": 0}
+    while max_batches is None or totals["batches"] < max_batches:
+        stats = detect_batch(batch_size)
+        if stats is None:
+            break
+        totals["batches"] += 1
+        for key in ("scanned", "incorrect", "created", "updated"):
+            totals[key] += stats[key]
+        totals["last_submission_id"] = stats["last_submission_id"]
+    if totals["batches"]:
+        # "created" is a reserved LogRecord attribute
+        log_event(logger, "flag_sharing.run", "Flag-sharing detector run", batches=totals["batches"],
+                  scanned=totals["scanned"], findings_created=totals["created"],
+                  findings_updated=totals["updated"], last_submission_id=totals["last_submission_id"])
+    return totals
@@ -0,0 +1,150 @@
+"""Flag matching: several accepted flags, case-insensitive variants and patterns.
+
+A challenge accepts its primary ``flag`` plus the entries in ``flags``, a
+JSON list of ``{"type": "static" | "regex", "flag": ..., "case_insensitive":
+bool}``. Submissions and flags are compared after ``.strip()``, as before.
+
+``FlagMatcher`` is built once per challenge and ``flag_version``. It holds
+SHA-256 digests of the static flags (and of their casefolded forms for
+case-insensitive ones). It also holds all patterns compiled into a single
+alternation that must match the whole submission. A check hashes the
+submission and compares it with every digest using ``hmac.compare_digest``,
+without stopping early, so timing does not depend on how much of a flag was
+guessed. At most one regex search follows.
+
+Matchers live in a per-worker dict keyed by challenge id. The submission path
+already loads the challenge row, and admin edits to ``flag`` or ``flags`` bump
+``flag_version``. Every worker therefore rebuilds a stale matcher on its
+next check, with no extra query.
+"""
+import hashlib
+import hmac
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from app.utils import metrics
+
+FLAG_TYPES = ("static", "regex")
+MAX_FLAGS = 100
+MAX_FLAG_LENGTH = 500
+
+metrics.registry.describe(metrics.PREFIX + "flag_matcher_builds_total", "counter",
+                          "Flag matchers compiled (first use or new flag_version)")
+
+
+def _digest(value: str) -> bytes:
+    return hashlib.sha256(value.encode("utf-8")).digest()
+
+
+def validate_flags(flags) -> Tuple[Optional[List[dict]], Optional[str]]:
+    """Normalize a ``flags`` list from the admin API. Returns (entries, error)."""
+    if flags is None:
+        return [], None
+    if not isinstance(flags, list):
+        return None, "flags must be a list"
+    if len(flags) > MAX_FLAGS:
+        return None, f"At most {MAX_FLAGS} additional flags are allowed"
+    entries = []
+    for item in flags:
+        # A plain string is an exact, case-sensitive flag
+        if isinstance(item, str):
+            item = {"type": "static", "flag": item}
+        if not isinstance(item, dict):
+            return None, "Each flag must be a string or an object with type and flag"
+        kind = item.get("type", "static")
+        value = item.get("flag")
+        if kind not in FLAG_TYPES:
+            return None, f"Flag type must be one of: {', '.join(FLAG_TYPES)}"
+        if not isinstance(value, str) or not value.strip() or len(value) > MAX_FLAG_LENGTH:
+            return None, f"Each flag must be a non-empty string of at most {MAX_FLAG_LENGTH} characters"
+        case_insensitive = bool(item.get("case_insensitive", False))
+        if kind == "regex":
+            try:
+                re.compile(value.strip(), re.IGNORECASE if case_insensitive else 0)
+            except re.error as e:
+                return None, f"Invalid flag pattern {value!r}: {e}"
+        entries.append({"type": kind, "flag": value.strip(), "case_insensitive": case_insensitive})
+    return entries, None
+
+
+class FlagMatcher:
+    """Compiled form of a challenge's accepted flags."""
+
+    __slots__ = ("exact", "folded", "patterns")
+
+    def __init__(self, primary: str, entries: List[dict]):
+        exact, folded, patterns = [], [], []
+        for entry in [{"type": "static", "flag": primary or ""}] + list(entries or []):
+            value = (entry.get("flag") or "").strip()
+            if entry.get("type", "static") == "regex":
+                patterns.append((value, bool(entry.get("case_insensitive"))))
+            elif entry.get("case_insensitive"):
+                folded.append(_digest(value.casefold()))
+            else:
+                exact.append(_digest(value))
+        self.exact = tuple(exact)
+        self.folded = tuple(folded)
+        self.patterns = self._compile(patterns)
+
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return ()
+        combined = "|".join(f"(?i:{p})" if ci else f"(?:{p})" for p, ci in patterns)
+        try:
+            return (re.compile(combined),)
+        except re.error:
+            # e.g. numbered backreferences, which shift in a combined pattern
+            return tuple(re.compile(p, re.IGNORECASE if ci else 0) for p, ci in patterns)
+
+    def matches(self, submitted: str) -> bool:
+        value = (submitted or "").strip()
+        digest = _digest(value)
+        matched = False
+        for candidate in self.exact:
+            matched |= hmac.compare_digest(candidate, digest)
+        if self.folded:
+            digest = _digest(value.casefold())
+            for candidate in self.folded:
+                matched |= hmac.compare_digest(candidate, digest)
+        if not matched:
+            for pattern in self.patterns:
+                if pattern.fullmatch(value):
+                    return True
+        return matched
+
+
+class MatcherCache:
+    """Per-worker matchers keyed by challenge id, valid for one flag_version.
+
+    ``created_at`` is part of the check because SQLite may hand a deleted
+    challenge's id to a new one, whose flag_version starts over.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, challenge) -> FlagMatcher:
+        version = (challenge.flag_version or 0, challenge.created_at)
+        entry = self._entries.get(challenge.id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        matcher = FlagMatcher(challenge.flag, challenge.get_flags())
+        metrics.inc(metrics.PREFIX + "flag_matcher_builds_total")
+        if challenge.id is not None:
+            with self._lock:
+                self._entries[challenge.id] = (version, matcher)
+        return matcher
+
+    def discard(self, challenge_id: int):
+        with self._lock:
+            self._entries.pop(challenge_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+matchers = MatcherCache()
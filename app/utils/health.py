@@ -0,0 +1,231 @@
+"""Liveness and readiness probes backed by a background dependency checker.
+
+Probe endpoints never touch a dependency themselves. A daemon thread per
+worker process runs the checks every HEALTH_CHECK_INTERVAL seconds and caches
+the results. The endpoints only read that cache:
+
+- ``/livez``: the process is up and serving requests. Always 200.
+- ``/readyz``: 200 while every critical check (HEALTH_CRITICAL_CHECKS) has
+  failed fewer than HEALTH_FAILURE_THRESHOLD times in a row and the cached
+  results are younger than HEALTH_MAX_AGE; 503 otherwise, including before
+  the first round of checks has finished. A check that hangs, such as a
+  database that stops answering, makes the results stale.
+- ``/health``: the cached results in the legacy ``status``/``database``
+  shape used by the frontend. Always 200.
+
+Checks:
+
+- ``database``: ``SELECT 1`` on a pooled connection, with its latency.
+- ``pool``: checked-out connections against pool size plus overflow.
+  Saturation is reported but is load, not failure.
+- ``sqs``: outcome of this process's recent SendMessage calls (see
+  ``app.utils.aws.sqs_publisher_status``). No extra SQS requests are made.
+- ``disk``: free space under the directories the app writes to.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from flask import jsonify
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class HealthMonitor:
+    """Caches dependency check results for one app, refreshed by a background thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = _env_float("HEALTH_CHECK_INTERVAL", 5.0)
+        self.max_age = _env_float("HEALTH_MAX_AGE", self.interval * 3)
+        self.failure_threshold = int(_env_float("HEALTH_FAILURE_THRESHOLD", 3))
+        self.critical = {
+            c.strip() for c in os.environ.get("HEALTH_CRITICAL_CHECKS", "database,disk").split(",") if c.strip()
+        }
+        self.checks: Dict[str, Callable[[], dict]] = {
+            "database": self._check_database,
+            "pool": self._check_pool,
+            "sqs": self._check_sqs,
+            "disk": self._check_disk,
+        }
+        self._lock = threading.Lock()
+        self._results: Dict[str, dict] = {}
+        self._failures: Dict[str, int] = {}
+        self._checked_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    # Background checker
+
+    def ensure_started(self):
+        """Start the checker in this process if it is not running.
+
+        Called lazily from requests, so nothing runs in a preloading gunicorn
+        master, and each forked worker starts its own thread.
+        """
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    # Results inherited from the master describe another process
+                    self._results, self._failures, self._checked_at = {}, {}, None
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="flagrush-health", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self.run_checks()
+            time.sleep(self.interval)
+
+    def run_checks(self):
+        results = {}
+        for name, check in self.checks.items():
+            start = time.perf_counter()
+            try:
+                result = check()
+            except Exception as e:
+                result = {"ok": False, "error": str(e)}
+            result["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            results[name] = result
+        with self._lock:
+            for name, result in results.items():
+                self._failures[name] = 0 if result["ok"] else self._failures.get(name, 0) + 1
+                result["consecutive_failures"] = self._failures[name]
+            self._results = results
+            self._checked_at = time.time()
+        for name, result in results.items():
+            if not result["ok"] and self._failures[name] == self.failure_threshold:
+                logger.warning("Health check failing", extra={"check": name, "error": result.get("error")})
+
+    def _check_database(self) -> dict:
+        from app import db
+        with self.app.app_context():
+            with db.get_engine(self.app).connect() as conn:
+                conn.execute(text("SELECT 1"))
+        return {"ok": True}
+
+    def _check_pool(self) -> dict:
+        from app import db
+        with self.app.app_context():
+            pool = db.get_engine(self.app).pool
+        stats = {}
+        for attr in ("size", "checkedout", "overflow"):
+            fn = getattr(pool, attr, None)
+            if callable(fn):
+                stats[attr] = fn()
+        max_overflow = getattr(pool, "_max_overflow", 0) or 0
+        if "size" in stats and "checkedout" in stats:
+            stats["saturated"] = stats["checkedout"] >= stats["size"] + max(max_overflow, 0)
+        return {"ok": True, **stats}
+
+    def _check_sqs(self) -> dict:
+        if not (os.environ.get("SQS_QUEUE_URL") or os.environ.get("SQS_AUDIT_QUEUE_URL")):
+            return {"ok": True, "enabled": False}
+        from app.utils.aws import sqs_publisher_status
+        status = sqs_publisher_status()
+        status["enabled"] = True
+        status["ok"] = status["consecutive_failures"] == 0
+        if not status["ok"]:
+            status["error"] = status["last_error"]
+        return status
+
+    def _check_disk(self) -> dict:
+        min_free = _env_float("HEALTH_DISK_MIN_FREE_MB", 100) * 1024 * 1024
+        paths = {}
+        ok = True
+        for path in _disk_paths():
+            usage = shutil.disk_usage(path)
+            paths[path] = round(usage.free / (1024 * 1024), 1)
+            ok = ok and usage.free >= min_free
+        result = {"ok": ok, "free_mb": paths}
+        if not ok:
+            result["error"] = "low disk space"
+        return result
+
+    # Probe views
+
+    def snapshot(self) -> dict:
+        """Cached results plus the readiness verdict; never blocks on a dependency."""
+        with self._lock:
+            results = self._results
+            checked_at = self._checked_at
+        age = None if checked_at is None else time.time() - checked_at
+        reasons: List[str] = []
+        if checked_at is None:
+            reasons.append("starting")
+        elif age > self.max_age:
+            reasons.append("stale")
+        for name in sorted(self.critical):
+            result = results.get(name)
+            if result is not None and result["consecutive_failures"] >= self.failure_threshold:
+                reasons.append(name)
+        return {
+            "ready": not reasons,
+            "reasons": reasons,
+            "age_seconds": None if age is None else round(age, 3),
+            "checks": results,
+        }
+
+
+def _disk_paths() -> List[str]:
+    candidates = os.environ.get("HEALTH_DISK_PATHS")
+    if candidates:
+        paths = [p.strip() for p in candidates.split(",") if p.strip()]
+    else:
+        paths = [os.environ.get("METRICS_MULTIPROC_DIR") or "", tempfile.gettempdir()]
+    return [p for p in dict.fromkeys(paths) if p and os.path.isdir(p)]
+
+
+def init_app(app):
+    """Register /livez, /readyz and /health on an app."""
+    monitor = HealthMonitor(app)
+    app.extensions["health"] = monitor
+
+    @app.before_request
+    def _health_start():
+        monitor.ensure_started()
+
+    def livez():
+        """Liveness: the worker is serving requests"""
+        return jsonify({"status": "alive"})
+
+    def readyz():
+        """Readiness from cached dependency checks"""
+        snap = monitor.snapshot()
+        snap["status"] = "ready" if snap["ready"] else "not ready"
+        return jsonify(snap), 200 if snap["ready"] else 503
+
+    def health_check():
+        """Cached health summary (does not query the database)"""
+        snap = monitor.snapshot()
+        database = snap["checks"].get("database")
+        if database is None:
+            db_status = "unknown"
+        elif database["ok"]:
+            db_status = "connected"
+        else:
+            db_status = f"error: {database.get('error')}"
+        return jsonify({
+            "status": "healthy" if snap["ready"] else "unhealthy",
+            "database": db_status,
+            "reasons": snap["reasons"],
+            "age_seconds": snap["age_seconds"],
+        })
+
+    app.add_url_rule("/livez", "livez", livez)
+    app.add_url_rule("/readyz", "readyz", readyz)
+    app.add_url_rule("/health", "health_check", health_check)
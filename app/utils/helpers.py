@@ -1,7 +1,13 @@
-from flask import jsonify
+from flask import jsonify, current_app
+from app.utils.serialization import PreEncoded, encode_envelope
 
 def success_response(data=None, message="Success", status_code=200):
     """Create a standardized success response"""
+    if isinstance(data, PreEncoded):
+        # Cached payloads are spliced into the envelope without re-encoding
+        body = encode_envelope(True, message, data)
+        return current_app.response_class(body, mimetype='application/json'), status_code
+    
     response = {
         'success': True,
         'message': message
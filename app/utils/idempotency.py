@@ -0,0 +1,265 @@
+"""Idempotency keys for retried POSTs (``Idempotency-Key`` header).
+
+A client that may retry a request sends the same ``Idempotency-Key`` with
+every attempt. The first attempt runs the view. Its response (status,
+mimetype and body) is stored for IDEMPOTENCY_TTL seconds (default 600) under
+a digest of the scope, the user and the key. Repeats within that time get the
+stored response back, marked ``Idempotent-Replayed: true``. They never reach
+the view, so no rows are written and no events are published. Other outcomes:
+
+- a repeat with a different body gets 422;
+- a repeat while the first attempt is still running gets 409;
+- a 5xx response, or an exception, is not stored, so the client can retry.
+
+IDEMPOTENCY_STORE picks where keys live:
+
+- ``memory`` (default): a per-worker ordered dict of compact tuples. Entries
+  expire in insertion order, and the dict never holds more than
+  IDEMPOTENCY_MAX_KEYS keys. Retries that land on another worker are not
+  recognised.
+- ``database``: the ``idempotency_keys`` table, which every worker shares. The
+  first attempt claims the key with an INSERT on its primary key. Completed
+  responses are also kept in the worker's memory store, so repeated retries
+  on one worker skip the database. Expired rows are purged at most every
+  IDEMPOTENCY_PURGE_INTERVAL seconds per worker.
+- ``off``: the header is ignored.
+
+Outcomes are counted in ``flagrush_idempotency_requests_total{result}``.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Optional, Tuple
+
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from app.utils import metrics
+from app.utils.helpers import error_response
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+MISS, REPLAY, IN_PROGRESS, MISMATCH = "miss", "hit", "in_progress", "mismatch"
+
+metrics.registry.describe(metrics.PREFIX + "idempotency_requests_total", "counter",
+                          "Requests with an Idempotency-Key by result (hit = replayed response)")
+metrics.registry.describe(metrics.PREFIX + "idempotency_keys", "gauge",
+                          "Idempotency keys held in this worker's memory store")
+
+# (expires_at, fingerprint, status, mimetype, body); status is None while the first attempt runs
+Entry = Tuple[float, bytes, Optional[int], Optional[str], Optional[bytes]]
+
+
+def _ttl() -> float:
+    return float(os.environ.get("IDEMPOTENCY_TTL", "600"))
+
+
+def _pending_ttl() -> float:
+    return float(os.environ.get("IDEMPOTENCY_PENDING_TTL", "30"))
+
+
+class MemoryStore:
+    """Per-worker keys in insertion order, evicted by TTL and size."""
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.max_keys = max_keys or int(os.environ.get("IDEMPOTENCY_MAX_KEYS", "100000"))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[bytes, Entry]" = OrderedDict()
+
+    def _evict(self, now: float):
+        entries = self._entries
+        while entries:
+            digest, entry = next(iter(entries.items()))
+            if entry[0] > now and len(entries) <= self.max_keys:
+                break
+            del entries[digest]
+
+    def lookup(self, digest: bytes) -> Optional[Entry]:
+        """Completed, unexpired entry for ``digest``."""
+        entry = self._entries.get(digest)
+        if entry is None or entry[2] is None or entry[0] <= time.time():
+            return None
+        return entry
+
+    def begin(self, digest: bytes, fingerprint: bytes) -> Tuple[str, Optional[Entry]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[0] > now:
+                if entry[1] != fingerprint:
+                    return MISMATCH, entry
+                return (IN_PROGRESS, entry) if entry[2] is None else (REPLAY, entry)
+            self._entries[digest] = (now + _pending_ttl(), fingerprint, None, None, None)
+            self._entries.move_to_end(digest)
+            self._evict(now)
+            metrics.set_gauge(metrics.PREFIX + "idempotency_keys", len(self._entries))
+        return MISS, None
+
+    def complete(self, digest: bytes, fingerprint: bytes, status: int, mimetype: str, body: bytes):
+        now = time.time()
+        with self._lock:
+            self._entries[digest] = (now + _ttl(), fingerprint, status, mimetype, body)
+            self._entries.move_to_end(digest)
+            self._evict(now)
+
+    def release(self, digest: bytes):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[2] is None:
+                del self._entries[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DatabaseStore:
+    """Keys shared by every worker, with completed responses cached in memory.
+
+    Uses its own short transactions on the engine, independent of the
+    request's session.
+    """
+
+    def __init__(self, memory: MemoryStore):
+        self.memory = memory
+        self._purged_at = 0.0
+
+    def _purge(self, conn, now: datetime):
+        interval = float(os.environ.get("IDEMPOTENCY_PURGE_INTERVAL", "60"))
+        if time.monotonic() - self._purged_at < interval:
+            return
+        self._purged_at = time.monotonic()
+        from app.models.idempotency import IdempotencyKey
+        conn.execute(IdempotencyKey.__table__.delete().where(IdempotencyKey.__table__.c.expires_at < now))
+
+    def begin(self, digest: bytes, fingerprint: bytes) -> Tuple[str, Optional[Entry]]:
+        entry = self.memory.lookup(digest)
+        if entry is not None:
+            return (REPLAY if entry[1] == fingerprint else MISMATCH), entry
+
+        from sqlalchemy.exc import IntegrityError
+        from app import db
+        from app.models.idempotency import IdempotencyKey
+
+        table = IdempotencyKey.__table__
+        key, now = digest.hex(), datetime.utcnow()
+        with db.engine.begin() as conn:
+            self._purge(conn, now)
+            conn.execute(table.delete().where(table.c.key_hash == key, table.c.expires_at < now))
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert().values(
+                    key_hash=key, fingerprint=fingerprint.hex(), created_at=now,
+                    expires_at=now + timedelta(seconds=_pending_ttl()),
+                ))
+            return MISS, None
+        except IntegrityError:
+            pass
+        with db.engine.connect() as conn:
+            row = conn.execute(db.select(table).where(table.c.key_hash == key)).first()
+        if row is None:
+            # Released or expired in between; let this attempt run unrecorded
+            return MISS, None
+        expires_at = time.time() + max((row.expires_at - now).total_seconds(), 0)
+        entry = (expires_at, bytes.fromhex(row.fingerprint), row.status_code, row.mimetype, row.body)
+        if entry[1] != fingerprint:
+            return MISMATCH, entry
+        if row.status_code is None:
+            return IN_PROGRESS, entry
+        self.memory.complete(digest, entry[1], row.status_code, row.mimetype, row.body)
+        return REPLAY, entry
+
+    def complete(self, digest: bytes, fingerprint: bytes, status: int, mimetype: str, body: bytes):
+        from app import db
+        from app.models.idempotency import IdempotencyKey
+
+        table = IdempotencyKey.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.key_hash == digest.hex()).values(
+                status_code=status, mimetype=mimetype, body=body,
+                expires_at=datetime.utcnow() + timedelta(seconds=_ttl()),
+            ))
+        self.memory.complete(digest, fingerprint, status, mimetype, body)
+
+    def release(self, digest: bytes):
+        from app import db
+        from app.models.idempotency import IdempotencyKey
+
+        table = IdempotencyKey.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.key_hash == digest.hex(), table.c.status_code.is_(None)))
+
+    def clear(self):
+        self.memory.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """The configured store for this worker, or None when disabled."""
+    global _store
+    kind = os.environ.get("IDEMPOTENCY_STORE", "memory").lower()
+    if kind == "off":
+        return None
+    if _store is None or (kind == "database") != isinstance(_store, DatabaseStore):
+        with _store_lock:
+            memory = MemoryStore()
+            _store = DatabaseStore(memory) if kind == "database" else memory
+    return _store
+
+
+def _replay(entry: Entry):
+    response = current_app.response_class(entry[4], status=entry[2], mimetype=entry[3])
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(scope: str):
+    """Replay stored responses for repeated ``Idempotency-Key`` requests.
+
+    Apply below ``jwt_required``: keys are scoped to the authenticated user.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            store = get_store() if key else None
+            if store is None:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return error_response(f"{HEADER} must be at most {MAX_KEY_LENGTH} characters", 400)
+
+            digest = hashlib.blake2b(f"{scope}\0{get_jwt_identity()}\0{key}".encode("utf-8"),
+                                     digest_size=16).digest()
+            fingerprint = hashlib.blake2b(request.get_data(), digest_size=16).digest()
+            outcome, entry = store.begin(digest, fingerprint)
+            metrics.inc(metrics.PREFIX + "idempotency_requests_total", result=outcome)
+            if outcome == REPLAY:
+                return _replay(entry)
+            if outcome == MISMATCH:
+                return error_response(f"{HEADER} was already used with a different request", 422)
+            if outcome == IN_PROGRESS:
+                return error_response("A request with this Idempotency-Key is still being processed", 409)
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                store.release(digest)
+                raise
+            if response.status_code >= 500 or response.is_streamed:
+                store.release(digest)
+            else:
+                store.complete(digest, fingerprint, response.status_code, response.mimetype, response.get_data())
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,234 @@
+"""Asynchronous structured logging with per-event sampling.
+
+Request threads never format JSON or write to stderr. The root logger gets a
+``QueueHandler`` that puts records on a bounded queue (LOG_QUEUE_SIZE) without
+blocking. A ``QueueListener`` thread formats them with ``JsonFormatter`` and
+writes them out. When the queue is full the record is dropped and counted in
+``flagrush_log_records_dropped_total``; the listener reports the number of
+drops once the queue drains. The listener is restarted in forked children
+(gunicorn workers with preload) and flushed at exit. LOG_ASYNC=false falls
+back to a plain synchronous handler.
+
+``log_event`` writes a named event and samples it by LOG_SAMPLE_RATES
+(``event=rate`` pairs, e.g. ``submission.incorrect=0.1,access=0.5``). A rate
+for a prefix (``access``) covers ``access.*`` events without their own rate.
+Sampled records carry ``sample_rate`` so counts can be scaled back up.
+
+``init_app`` adds a per-request access log (``flagrush.access``) with latency,
+SQL query count/time and the JWT user id.
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from flask import g, request
+
+from app.utils import metrics
+
+access_logger = logging.getLogger("flagrush.access")
+
+DEFAULT_SAMPLE_RATES = "access.probe=0,submission.incorrect=0.1"
+PROBE_ENDPOINTS = {"livez", "readyz", "health_check", "metrics"}
+
+metrics.registry.describe(metrics.PREFIX + "log_records_dropped_total", "counter",
+                          "Log records dropped because the log queue was full")
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of waiting for space."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self._dropped_lock = threading.Lock()
+        self.dropped = 0
+        self.reported = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            metrics.inc(metrics.PREFIX + "log_records_dropped_total", level=record.levelname)
+
+    def take_unreported(self) -> int:
+        with self._dropped_lock:
+            count = self.dropped - self.reported
+            self.reported = self.dropped
+        return count
+
+
+class _DropReportingHandler(logging.Handler):
+    """Runs on the listener thread after each record; logs accumulated drops."""
+
+    def __init__(self, queue_handler: _NonBlockingQueueHandler, target: logging.Handler):
+        super().__init__()
+        self._queue_handler = queue_handler
+        self._target = target
+
+    def emit(self, record):
+        if self._queue_handler.queue.qsize():
+            return
+        dropped = self._queue_handler.take_unreported()
+        if dropped:
+            notice = logging.LogRecord("flagrush.logging", logging.WARNING, __file__, 0,
+                                       "Dropped log records: queue full", None, None)
+            notice.dropped = dropped
+            self._target.handle(notice)
+
+
+_state_lock = threading.Lock()
+_queue_handler: Optional[_NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_stream_handler: Optional[logging.Handler] = None
+_configured = False
+
+
+def _start_listener():
+    """(Re)create the queue and listener thread for the current process."""
+    global _listener
+    _queue_handler.queue = queue.Queue(maxsize=int(os.environ.get("LOG_QUEUE_SIZE", 10000)))
+    _listener = QueueListener(_queue_handler.queue, _stream_handler,
+                              _DropReportingHandler(_queue_handler, _stream_handler),
+                              respect_handler_level=True)
+    _listener.start()
+
+
+def _after_fork_in_child():
+    # The listener thread does not survive fork and the inherited queue's lock
+    # may have been held by it; give the child a fresh queue and listener.
+    if _queue_handler is not None:
+        _queue_handler._dropped_lock = threading.Lock()
+        _queue_handler.dropped = _queue_handler.reported = 0
+        _start_listener()
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def configure_logging():
+    """Install JSON logging on the root logger (once per process)."""
+    global _configured, _queue_handler, _stream_handler
+    with _state_lock:
+        if _configured:
+            return
+        from pythonjsonlogger import jsonlogger
+        stream = logging.StreamHandler()
+        stream.setFormatter(jsonlogger.JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        root = logging.getLogger()
+        root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+        if os.environ.get("LOG_ASYNC", "true").lower() == "true":
+            _stream_handler = stream
+            _queue_handler = _NonBlockingQueueHandler(None)
+            _start_listener()
+            root.handlers = [_queue_handler]
+            os.register_at_fork(after_in_child=_after_fork_in_child)
+            atexit.register(_stop_listener)
+        else:
+            root.handlers = [stream]
+        _configured = True
+
+
+# Sampling
+
+_rates_cache: Dict[str, Dict[str, float]] = {}
+
+
+def _sample_rates() -> Dict[str, float]:
+    spec = os.environ.get("LOG_SAMPLE_RATES", DEFAULT_SAMPLE_RATES)
+    rates = _rates_cache.get(spec)
+    if rates is None:
+        rates = {}
+        for pair in spec.split(","):
+            name, _, value = pair.partition("=")
+            try:
+                rates[name.strip()] = min(max(float(value), 0.0), 1.0)
+            except ValueError:
+                continue
+        _rates_cache[spec] = rates
+    return rates
+
+
+def sample_rate(event: str) -> float:
+    """Configured rate for an event, falling back to its dotted prefixes, then 1."""
+    rates = _sample_rates()
+    name = event
+    while True:
+        if name in rates:
+            return rates[name]
+        if "." not in name:
+            return 1.0
+        name = name.rsplit(".", 1)[0]
+
+
+def log_event(logger: logging.Logger, event: str, message: str, level: int = logging.INFO, **fields) -> bool:
+    """Log ``message`` with ``event`` and ``fields`` as JSON attributes, subject to sampling.
+
+    Returns True if the record was emitted.
+    """
+    if not logger.isEnabledFor(level):
+        return False
+    rate = sample_rate(event)
+    if rate < 1.0:
+        if rate <= 0.0 or random.random() >= rate:
+            return False
+        fields["sample_rate"] = rate
+    fields["event"] = event
+    logger.log(level, message, extra=fields)
+    return True
+
+
+# Access log
+
+def _current_user_id():
+    try:
+        from flask_jwt_extended import get_jwt
+        return get_jwt().get("sub")
+    except Exception:
+        # No JWT was verified for this request
+        return None
+
+
+def init_app(app):
+    """Emit one structured access log record per request (LOG_ACCESS=false disables)."""
+    if os.environ.get("LOG_ACCESS", "true").lower() != "true":
+        return
+
+    @app.before_request
+    def _access_log_start():
+        g.access_log_start = time.perf_counter()
+
+    @app.after_request
+    def _access_log(response):
+        start = g.get("access_log_start")
+        if start is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        if endpoint in PROBE_ENDPOINTS:
+            event = "access.probe"
+        elif response.status_code >= 500:
+            event = "access.error"
+        else:
+            event = "access"
+        log_event(
+            access_logger, event, "request",
+            method=request.method,
+            path=request.path,
+            endpoint=endpoint,
+            status=response.status_code,
+            duration_ms=round((time.perf_counter() - start) * 1000, 2),
+            db_queries=g.get("db_query_count", 0),
+            db_time_ms=round(g.get("db_query_time", 0.0) * 1000, 2),
+            user_id=_current_user_id(),
+            remote_addr=request.headers.get("X-Forwarded-For", request.remote_addr),
+            response_bytes=response.calculate_content_length(),
+        )
+        return response
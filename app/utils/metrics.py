@@ -0,0 +1,343 @@
+"""Prometheus-style metrics with a multiprocess-safe file store.
+
+Each process keeps its counters, gauges and histograms in memory and, when
+METRICS_MULTIPROC_DIR is set, periodically writes a snapshot to
+``<dir>/metrics_<pid>.json``. The /metrics endpoint merges every snapshot in
+the directory so a scrape of any gunicorn worker reports totals for all of
+them. Use a separate directory per service and empty it before the service
+starts.
+"""
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PREFIX = "flagrush_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    """Thread-safe in-process metric store."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types: Dict[str, str] = {}
+        self._help: Dict[str, str] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        # histogram value: [count per bucket..., +Inf count, sum]
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self._collectors: Dict[str, Callable[[], None]] = {}
+        self._last_flush = 0.0
+
+    def describe(self, name: str, kind: str, help_text: str = "", buckets: Iterable[float] = LATENCY_BUCKETS):
+        self._types[name] = kind
+        self._help[name] = help_text
+        if kind == "histogram":
+            self._buckets[name] = tuple(buckets)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self._buckets.get(name, LATENCY_BUCKETS)
+        key = _label_key(labels)
+        idx = bisect_left(buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = [0] * (len(buckets) + 1) + [0.0]
+            hist[idx] += 1
+            hist[-1] += value
+
+    def register_collector(self, fn: Callable[[], None], name: Optional[str] = None):
+        """Register a callback that refreshes gauges right before a snapshot.
+
+        A collector registered under an existing ``name`` replaces it, so
+        recreating an app does not add another.
+        """
+        with self._lock:
+            self._collectors[name or f"{fn.__module__}.{fn.__qualname__}"] = fn
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            collectors = list(self._collectors.values())
+        for fn in collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "counters": {n: [[list(k), v] for k, v in s.items()] for n, s in self._counters.items()},
+                "gauges": {n: [[list(k), v] for k, v in s.items()] for n, s in self._gauges.items()},
+                "histograms": {n: [[list(k), list(v)] for k, v in s.items()] for n, s in self._histograms.items()},
+            }
+
+    # Multiprocess store
+
+    def flush(self, force: bool = False):
+        """Write this process' snapshot to METRICS_MULTIPROC_DIR (rate limited)."""
+        directory = os.environ.get("METRICS_MULTIPROC_DIR")
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < _flush_interval():
+            return
+        self._last_flush = now
+        path = os.path.join(directory, f"metrics_{os.getpid()}.json")
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w") as fh:
+                json.dump(self.snapshot(), fh, separators=(",", ":"))
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _load_snapshots(self) -> List[dict]:
+        directory = os.environ.get("METRICS_MULTIPROC_DIR")
+        if not directory:
+            return [self.snapshot()]
+        self.flush(force=True)
+        snapshots = []
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return [self.snapshot()]
+        for name in names:
+            if not (name.startswith("metrics_") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """Render merged metrics in the Prometheus text exposition format."""
+        counters: Dict[str, Dict[LabelKey, float]] = {}
+        gauges: Dict[str, Dict[LabelKey, float]] = {}
+        histograms: Dict[str, Dict[LabelKey, List[float]]] = {}
+        for snap in self._load_snapshots():
+            for name, series in snap.get("counters", {}).items():
+                merged = counters.setdefault(name, {})
+                for key, value in series:
+                    key = tuple(tuple(kv) for kv in key)
+                    merged[key] = merged.get(key, 0) + value
+            # Gauges describe live state, so skip workers that have exited
+            if _pid_alive(snap.get("pid")):
+                for name, series in snap.get("gauges", {}).items():
+                    merged = gauges.setdefault(name, {})
+                    for key, value in series:
+                        key = tuple(tuple(kv) for kv in key)
+                        merged[key] = merged.get(key, 0) + value
+            for name, series in snap.get("histograms", {}).items():
+                merged = histograms.setdefault(name, {})
+                for key, values in series:
+                    key = tuple(tuple(kv) for kv in key)
+                    current = merged.get(key)
+                    if current is None or len(current) != len(values):
+                        merged[key] = list(values)
+                    else:
+                        merged[key] = [a + b for a, b in zip(current, values)]
+
+        lines: List[str] = []
+        for kind, store in (("counter", counters), ("gauge", gauges)):
+            for name in sorted(store):
+                self._header(lines, name, kind)
+                for key, value in sorted(store[name].items()):
+                    lines.append(f"{name}{_fmt_labels(key)} {_fmt_value(value)}")
+        for name in sorted(histograms):
+            self._header(lines, name, "histogram")
+            buckets = self._buckets.get(name, LATENCY_BUCKETS)
+            for key, values in sorted(histograms[name].items()):
+                cumulative = 0
+                for bound, count in zip(buckets, values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_fmt_labels(key, ('le', _fmt_value(bound)))} {_fmt_value(cumulative)}")
+                cumulative += values[len(buckets)]
+                lines.append(f"{name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {_fmt_value(cumulative)}")
+                lines.append(f"{name}_sum{_fmt_labels(key)} {_fmt_value(values[-1])}")
+                lines.append(f"{name}_count{_fmt_labels(key)} {_fmt_value(cumulative)}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: List[str], name: str, kind: str):
+        help_text = self._help.get(name)
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {self._types.get(name, kind)}")
+
+
+def _flush_interval() -> float:
+    try:
+        return float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+    except ValueError:
+        return 5.0
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key)
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = Registry()
+
+registry.describe(PREFIX + "http_requests_total", "counter", "HTTP requests by endpoint and status")
+registry.describe(PREFIX + "http_request_duration_seconds", "histogram", "HTTP request latency by endpoint")
+registry.describe(PREFIX + "db_queries_per_request", "histogram", "SQL statements executed per request",
+                  buckets=QUERY_COUNT_BUCKETS)
+registry.describe(PREFIX + "db_time_per_request_seconds", "histogram", "Time spent in SQL per request")
+registry.describe(PREFIX + "sqs_publish_duration_seconds", "histogram", "SQS SendMessage latency")
+registry.describe(PREFIX + "submissions_total", "counter", "Flag submissions by result")
+registry.describe(PREFIX + "db_pool_checked_out", "gauge", "Connections currently checked out of the pool")
+registry.describe(PREFIX + "db_pool_size", "gauge", "Configured connection pool size")
+registry.describe(PREFIX + "db_pool_overflow", "gauge", "Connections opened beyond the pool size")
+
+inc = registry.inc
+observe = registry.observe
+set_gauge = registry.set
+
+
+# SQLAlchemy instrumentation (installed once per process, covers every engine)
+
+_ENGINE_HOOKS_INSTALLED = False
+# Called as fn(statement, parameters, elapsed) after every statement (app.utils.query_audit)
+_query_observers = []
+
+
+def add_query_observer(fn):
+    """Also pass each executed statement to ``fn``; shares this module's timing listeners."""
+    if fn not in _query_observers:
+        _query_observers.append(fn)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("flagrush_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("flagrush_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_request_context():
+        g.db_query_count = g.get("db_query_count", 0) + 1
+        g.db_query_time = g.get("db_query_time", 0.0) + elapsed
+    for observer in _query_observers:
+        observer(statement, parameters, elapsed)
+
+
+def install_engine_hooks():
+    global _ENGINE_HOOKS_INSTALLED
+    if _ENGINE_HOOKS_INSTALLED:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    _ENGINE_HOOKS_INSTALLED = True
+
+
+def _collect_pool_stats(app, service):
+    def collect():
+        from app import db
+        pool = db.get_engine(app).pool
+        for attr, metric in (("checkedout", "db_pool_checked_out"), ("size", "db_pool_size"),
+                             ("overflow", "db_pool_overflow")):
+            fn = getattr(pool, attr, None)
+            if callable(fn):
+                registry.set(PREFIX + metric, fn(), app=service)
+    return collect
+
+
+def init_app(app, service):
+    """Attach request instrumentation and the /metrics endpoint to an app.
+
+    ``service`` (e.g. ``FlagRush-Main``) labels the app's pool gauges.
+    """
+    install_engine_hooks()
+    registry.register_collector(_collect_pool_stats(app, service), name=f"db_pool:{service}")
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_start = time.perf_counter()
+        g.db_query_count = 0
+        g.db_query_time = 0.0
+
+    @app.after_request
+    def _metrics_record(response):
+        start = g.get("metrics_start")
+        if start is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        registry.observe(PREFIX + "http_request_duration_seconds", time.perf_counter() - start,
+                         endpoint=endpoint, method=request.method)
+        registry.inc(PREFIX + "http_requests_total", endpoint=endpoint, method=request.method,
+                     status=response.status_code)
+        registry.observe(PREFIX + "db_queries_per_request", g.get("db_query_count", 0), endpoint=endpoint)
+        registry.observe(PREFIX + "db_time_per_request_seconds", g.get("db_query_time", 0.0), endpoint=endpoint)
+        registry.flush()
+        return response
+
+    def metrics_endpoint():
+        """Prometheus scrape endpoint (optionally protected by METRICS_TOKEN)"""
+        token = os.environ.get("METRICS_TOKEN")
+        supplied = request.headers.get("Authorization", "").encode("utf-8")
+        if token and not hmac.compare_digest(supplied, f"Bearer {token}".encode("utf-8")):
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint)
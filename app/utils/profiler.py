@@ -0,0 +1,357 @@
+"""On-demand request profiling for live workers.
+
+An admin starts a profiling session through ``/api/admin/profiling``. The
+session is a small ``control.json`` in PROFILE_DIR, which must be shared by
+the main and admin apps. Every worker re-reads it at most once per second.
+While a session is active, a ``sample_rate`` fraction of requests to the
+chosen endpoints is profiled. The session switches off on its own after
+``max_samples`` profiles or at ``expires_at``, whichever comes first.
+
+Two collectors are available:
+
+- ``cprofile``: deterministic cProfile, written as ``.pstats`` files. Only
+  one runs per process at a time (Python 3.12+ refuses a second active
+  profiler). A request that cannot get it, or whose ``enable()`` fails
+  because another tool is profiling, falls back to ``sample``.
+- ``sample``: a background thread snapshots the request thread's stack every
+  PROFILE_SAMPLE_INTERVAL seconds. The output is a ``.collapsed`` file that
+  flamegraph tools can read. It has lower overhead and suits hot endpoints.
+  Under gevent the sampler runs on a real OS thread and follows the request's
+  greenlet rather than the hub.
+
+A single request can also be profiled by sending an ``X-Profile-Request``
+header minted by the admin API (HMAC-signed with SECRET_KEY, short-lived).
+Each token profiles one request: its nonce is claimed with an exclusive file
+create in PROFILE_DIR, so replays are ignored by every worker.
+"""
+import cProfile
+import hashlib
+import hmac
+import importlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from flask import current_app, g, request
+
+CONTROL_FILE = "control.json"
+ADHOC_SESSION = "adhoc"
+# Claimed X-Profile-Request nonces (dot-prefixed so result listings skip it)
+TOKENS_DIR = ".tokens"
+MODES = ("cprofile", "sample")
+
+
+def profile_dir() -> str:
+    return os.environ.get("PROFILE_DIR") or os.path.join("/tmp", "flagrush-profiles")
+
+
+def session_dir(session_id: str) -> str:
+    return os.path.join(profile_dir(), session_id)
+
+
+# Control file
+
+_control_cache = {"checked": 0.0, "mtime": None, "data": None}
+
+
+def read_control(max_age: float = 1.0) -> Optional[dict]:
+    """Return the active session, re-reading control.json at most every ``max_age`` seconds."""
+    now = time.monotonic()
+    if now - _control_cache["checked"] < max_age:
+        return _control_cache["data"]
+    _control_cache["checked"] = now
+    path = os.path.join(profile_dir(), CONTROL_FILE)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        _control_cache["mtime"] = None
+        _control_cache["data"] = None
+        return None
+    if mtime != _control_cache["mtime"]:
+        try:
+            with open(path) as fh:
+                _control_cache["data"] = json.load(fh)
+        except (OSError, ValueError):
+            _control_cache["data"] = None
+        _control_cache["mtime"] = mtime
+    return _control_cache["data"]
+
+
+def start_session(endpoints, sample_rate: float, max_samples: int, duration: float, mode: str) -> dict:
+    control = {
+        "id": time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6],
+        "endpoints": list(endpoints or []),
+        "sample_rate": sample_rate,
+        "max_samples": max_samples,
+        "mode": mode,
+        "started_at": time.time(),
+        "expires_at": time.time() + duration,
+    }
+    os.makedirs(session_dir(control["id"]), exist_ok=True)
+    path = os.path.join(profile_dir(), CONTROL_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(control, fh)
+    os.replace(tmp, path)
+    _control_cache["checked"] = 0.0
+    return control
+
+
+def stop_session():
+    try:
+        os.remove(os.path.join(profile_dir(), CONTROL_FILE))
+    except FileNotFoundError:
+        pass
+    _control_cache["checked"] = 0.0
+
+
+def count_samples(session_id: str) -> int:
+    try:
+        return sum(1 for name in os.listdir(session_dir(session_id)) if not name.endswith(".tmp"))
+    except OSError:
+        return 0
+
+
+def session_active(control: Optional[dict]) -> bool:
+    if not control:
+        return False
+    if time.time() >= control.get("expires_at", 0):
+        return False
+    return count_samples(control["id"]) < control.get("max_samples", 0)
+
+
+# Signed per-request header
+
+def sign_request_token(ttl: int = 300) -> str:
+    expires = int(time.time()) + ttl
+    nonce = uuid.uuid4().hex
+    return f"{expires}.{nonce}.{_signature(expires, nonce)}"
+
+
+def _signature(expires: int, nonce: str) -> str:
+    key = current_app.config["SECRET_KEY"].encode("utf-8")
+    return hmac.new(key, f"profile:{expires}:{nonce}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def verify_request_token(token: str) -> bool:
+    try:
+        expires_s, nonce, signature = token.split(".", 2)
+        expires = int(expires_s)
+    except (AttributeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(expires, nonce))
+
+
+def claim_request_token(token: str) -> bool:
+    """Verify a token and mark it used. Only the first request that presents it gets True."""
+    if not verify_request_token(token):
+        return False
+    expires_s, nonce, _ = token.split(".", 2)
+    directory = os.path.join(profile_dir(), TOKENS_DIR)
+    os.makedirs(directory, exist_ok=True)
+    _prune_claims(directory)
+    try:
+        os.close(os.open(os.path.join(directory, f"{expires_s}-{nonce}"), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
+
+
+def _prune_claims(directory: str):
+    """Drop claims of expired tokens; those are rejected by their signature check anyway."""
+    now = time.time()
+    for name in os.listdir(directory):
+        try:
+            if int(name.split("-", 1)[0]) < now:
+                os.remove(os.path.join(directory, name))
+        except (ValueError, OSError):
+            pass
+
+
+# Collectors
+
+def _original(module: str, name: str):
+    """``module.name`` as it was before gevent monkey-patching, if any.
+
+    The sampler needs a real OS thread, lock and sleep: a patched thread is a
+    greenlet and would only run when the profiled request yields.
+    """
+    monkey = sys.modules.get("gevent.monkey")
+    if monkey is not None:
+        return monkey.get_original(module, name)
+    return getattr(importlib.import_module(module), name)
+
+
+def current_target() -> tuple:
+    """What the sampler should follow for the running request: (OS thread id, greenlet or None)."""
+    monkey = sys.modules.get("gevent.monkey")
+    greenlet = None
+    if monkey is not None and monkey.is_module_patched("threading"):
+        import gevent
+        greenlet = gevent.getcurrent()
+    return _original("_thread", "get_ident")(), greenlet
+
+
+def _target_frame(target: tuple, frames: dict):
+    ident, greenlet = target
+    # A suspended greenlet keeps its stack in gr_frame. The running one has
+    # None there and is the top of its OS thread.
+    if greenlet is not None and greenlet.gr_frame is not None:
+        return greenlet.gr_frame
+    return frames.get(ident)
+
+
+class _StackSampler:
+    """Process-wide thread that samples the stacks of requests being profiled.
+
+    Targets come from ``current_target()``: a thread, or a greenlet under gevent.
+    """
+
+    def __init__(self):
+        self._lock = _original("_thread", "allocate_lock")()
+        self._targets = {}
+        self._thread = None
+        self._pid = None
+        # Held while there is nothing to sample; add() releases it to wake the thread
+        self._wake = _original("_thread", "allocate_lock")()
+
+    def add(self, target: tuple) -> Counter:
+        stacks = Counter()
+        with self._lock:
+            self._targets[target] = stacks
+            # Threads do not survive fork, so restart in each worker
+            if self._thread is None or self._pid != os.getpid() or self._thread not in sys._current_frames():
+                self._pid = os.getpid()
+                self._wake = _original("_thread", "allocate_lock")()
+                self._wake.acquire()
+                self._thread = _original("_thread", "start_new_thread")(self._run, ())
+            if self._wake.locked():
+                self._wake.release()
+        return stacks
+
+    def remove(self, target: tuple) -> Counter:
+        with self._lock:
+            return self._targets.pop(target, Counter())
+
+    def parked(self) -> bool:
+        return self._wake.locked()
+
+    def _run(self):
+        interval = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+        sleep = _original("time", "sleep")
+        wake = self._wake
+        while True:
+            with self._lock:
+                idle = not self._targets
+            if idle:
+                # Park until add() has a request to sample
+                wake.acquire()
+                continue
+            sleep(interval)
+            with self._lock:
+                frames = sys._current_frames()
+                for target, stacks in self._targets.items():
+                    frame = _target_frame(target, frames)
+                    if frame is not None:
+                        stacks[_collapse(frame)] += 1
+
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+_sampler = _StackSampler()
+# Held while a request runs under cProfile (one active profiler per process)
+_cprofile_lock = threading.Lock()
+
+
+def _start_cprofile() -> Optional[cProfile.Profile]:
+    """An enabled profiler, or None when another profiler is active in the process."""
+    if not _cprofile_lock.acquire(blocking=False):
+        return None
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError:
+        # "Another profiling tool is already active" (coverage, a debugger...)
+        _cprofile_lock.release()
+        return None
+    return prof
+
+
+def _write_atomic(path: str, writer):
+    tmp = f"{path}.tmp"
+    writer(tmp)
+    os.replace(tmp, path)
+
+
+def _result_path(session_id: str, ext: str) -> str:
+    directory = session_dir(session_id)
+    os.makedirs(directory, exist_ok=True)
+    endpoint = (request.endpoint or "unmatched").replace("/", "_")
+    return os.path.join(directory, f"{endpoint}-{os.getpid()}-{int(time.time() * 1000)}.{ext}")
+
+
+def init_app(app):
+    """Register profiling hooks on an app."""
+
+    @app.before_request
+    def _profile_start():
+        token = request.headers.get("X-Profile-Request")
+        if token and claim_request_token(token):
+            session_id, mode = ADHOC_SESSION, request.headers.get("X-Profile-Mode", "cprofile")
+        else:
+            control = read_control()
+            if not control or random.random() >= control.get("sample_rate", 0):
+                return
+            endpoints = control.get("endpoints")
+            if endpoints and request.endpoint not in endpoints:
+                return
+            if not session_active(control):
+                return
+            session_id, mode = control["id"], control.get("mode", "cprofile")
+
+        g.profile_session = session_id
+        if mode != "sample":
+            g.profile_cprofile = _start_cprofile()
+        if g.get("profile_cprofile") is None:
+            g.profile_sampler = current_target()
+            _sampler.add(g.profile_sampler)
+
+    @app.teardown_request
+    def _profile_finish(exc=None):
+        session_id = g.pop("profile_session", None)
+        if session_id is None:
+            return
+        try:
+            prof = g.pop("profile_cprofile", None)
+            if prof is not None:
+                try:
+                    prof.disable()
+                finally:
+                    _cprofile_lock.release()
+                _write_atomic(_result_path(session_id, "pstats"), prof.dump_stats)
+            target = g.pop("profile_sampler", None)
+            if target is not None:
+                stacks = _sampler.remove(target)
+
+                def write(path):
+                    with open(path, "w") as fh:
+                        for stack, count in stacks.most_common():
+                            fh.write(f"{stack} {count}\n")
+                _write_atomic(_result_path(session_id, "collapsed"), write)
+        except OSError:
+            pass
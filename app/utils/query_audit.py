@@ -0,0 +1,154 @@
+"""Per-request SQL query auditing and N+1 detection.
+
+Controlled by QUERY_AUDIT_MODE:
+
+- ``off``: no instrumentation (default outside debug).
+- ``warn``: add ``X-Query-Count``/``X-Query-Time`` headers and log a warning
+  when a request exceeds QUERY_COUNT_WARN_THRESHOLD statements or runs the
+  same statement N_PLUS_ONE_THRESHOLD times with different parameters.
+- ``strict``: like ``warn`` but the offending request fails with a 500, so
+  test runs catch regressions.
+
+``count_queries`` and ``assert_max_queries`` give tests a query budget per
+block of code, e.g.::
+
+    with assert_max_queries(3):
+        client.get('/api/submissions/leaderboard', headers=auth)
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app, g, has_request_context, make_response, request
+from app.utils import metrics
+from app.utils.helpers import error_response
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class QueryLog:
+    """Statements executed within one request or ``count_queries`` block."""
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+        # statement -> [executions, distinct parameter sets]
+        self.statements: Dict[str, list] = {}
+
+    def record(self, statement: str, parameters, elapsed: float):
+        self.count += 1
+        self.elapsed += elapsed
+        entry = self.statements.get(statement)
+        if entry is None:
+            entry = self.statements[statement] = [0, set()]
+        entry[0] += 1
+        try:
+            entry[1].add(repr(parameters))
+        except Exception:
+            pass
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements run at least ``threshold`` times with varying parameters."""
+        return sorted(
+            ((stmt, n) for stmt, (n, params) in self.statements.items() if n >= threshold and len(params) > 1),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+
+def _active_logs() -> List[QueryLog]:
+    logs = list(getattr(_local, "logs", ()))
+    if has_request_context():
+        log = g.get("query_log")
+        if log is not None:
+            logs.append(log)
+    return logs
+
+
+def _observe(statement, parameters, elapsed):
+    for log in _active_logs():
+        log.record(statement, parameters, elapsed)
+
+
+def install_listener():
+    """Feed statements to query logs from the metrics module's timing listeners."""
+    metrics.install_engine_hooks()
+    metrics.add_query_observer(_observe)
+
+
+def _shorten(statement: str, limit: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+def init_app(app):
+    """Register request hooks when QUERY_AUDIT_MODE is warn or strict."""
+    mode = app.config.get("QUERY_AUDIT_MODE", "off")
+    if mode not in ("warn", "strict"):
+        return
+    install_listener()
+
+    @app.before_request
+    def _query_audit_start():
+        g.query_log = QueryLog()
+
+    @app.after_request
+    def _query_audit_check(response):
+        log = g.pop("query_log", None)
+        if log is None:
+            return response
+        response.headers["X-Query-Count"] = str(log.count)
+        response.headers["X-Query-Time"] = f"{log.elapsed * 1000:.2f}ms"
+
+        threshold = current_app.config.get("QUERY_COUNT_WARN_THRESHOLD", 30)
+        repeated = log.repeated(current_app.config.get("N_PLUS_ONE_THRESHOLD", 5))
+        if log.count <= threshold and not repeated:
+            return response
+
+        details = {
+            "endpoint": request.endpoint,
+            "query_count": log.count,
+            "query_threshold": threshold,
+            "repeated_statements": [{"statement": _shorten(s), "executions": n} for s, n in repeated],
+        }
+        logger.warning("Query budget exceeded on %s", request.endpoint, extra=details)
+        if mode == "strict":
+            return make_response(error_response("Query budget exceeded", 500, details=details))
+        return response
+
+
+@contextmanager
+def count_queries():
+    """Record every statement executed on this thread inside the block."""
+    install_listener()
+    log = QueryLog()
+    stack = getattr(_local, "logs", None)
+    if stack is None:
+        stack = _local.logs = []
+    stack.append(log)
+    try:
+        yield log
+    finally:
+        stack.remove(log)
+
+
+@contextmanager
+def assert_max_queries(max_count: int, n_plus_one_threshold: Optional[int] = None):
+    """Fail with AssertionError if the block exceeds its query budget.
+
+    With ``n_plus_one_threshold`` set, also fail when any statement repeats
+    that many times with different parameters.
+    """
+    with count_queries() as log:
+        yield log
+    problems = []
+    if log.count > max_count:
+        problems.append(f"{log.count} queries executed, budget is {max_count}")
+    if n_plus_one_threshold is not None:
+        for statement, n in log.repeated(n_plus_one_threshold):
+            problems.append(f"N+1: {n}x {_shorten(statement)}")
+    if problems:
+        raise AssertionError("\n".join(problems))
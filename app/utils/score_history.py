@@ -0,0 +1,194 @@
+"""Score-over-time history in precomputed time buckets.
+
+``score_buckets`` holds one row per player and time bucket in which they
+solved something: the points and solves gained in that bucket. A bucket is
+the Unix time floored to SCORE_HISTORY_RESOLUTION seconds (default 300).
+A chart for N players is a range read of at most N x (event length /
+resolution) rows on the primary key.
+
+Buckets follow the leaderboard: the bucket of a solve holds the challenge's
+current value, as CTFd's charts do. When a decaying challenge loses value, the
+change goes to the bucket in which each earlier solver solved it. That is one
+set-based UPDATE, next to the one ``app.utils.scoring`` runs on ``users``. A
+player's buckets always add up to ``users.score``.
+
+``rebuild`` recomputes the whole table from submissions and records the
+resolution it used in ``app_settings``. Writes use that recorded resolution,
+so a value change always finds the bucket of each earlier solve. A new
+SCORE_HISTORY_RESOLUTION takes effect at the next rebuild: ``init_db.py``
+runs one when the setting changed (``sync_resolution``), as do
+``flask scoreboard rebuild-history`` and a full rescore.
+"""
+import calendar
+import os
+from datetime import datetime
+from typing import Iterable, Optional
+
+from app import db
+from app.models.challenge import Challenge
+from app.models.score_bucket import ScoreBucket
+from app.models.setting import AppSetting
+from app.models.submission import Submission
+from app.models.user import User
+
+_NO_SYNC = {"synchronize_session": False}
+
+# Resolution of the stored rows, set by rebuild
+RESOLUTION_KEY = "score_history_resolution"
+
+
+def resolution() -> int:
+    """Configured bucket size (SCORE_HISTORY_RESOLUTION)."""
+    return max(1, int(os.environ.get("SCORE_HISTORY_RESOLUTION", "300")))
+
+
+def table_resolution() -> int:
+    """Bucket size the stored rows were built with (the configured one if never recorded)."""
+    return AppSetting.get_json(RESOLUTION_KEY) or resolution()
+
+
+def to_epoch(value: datetime) -> int:
+    return calendar.timegm(value.utctimetuple())
+
+
+def bucket_of(value: datetime, step: Optional[int] = None) -> int:
+    step = step or resolution()
+    epoch = to_epoch(value)
+    return epoch - epoch % step
+
+
+def bucket_expr(column, step: int):
+    """SQL for ``bucket_of(column)`` (naive UTC timestamps)."""
+    # Inlined so GROUP BY matches the select list on PostgreSQL
+    step = db.literal_column(str(int(step)))
+    if db.engine.dialect.name == "sqlite":
+        return db.cast(db.func.strftime("%s", column), db.BigInteger) / step * step
+    return db.cast(db.func.floor(db.func.extract("epoch", column) / step), db.BigInteger) * step
+
+
+def record(user_id: int, solved_at: datetime, points: int, step: Optional[int] = None):
+    """Add a solve to the solver's bucket (runs in the caller's transaction)."""
+    table = ScoreBucket.__table__
+    key = {"user_id": user_id, "bucket": bucket_of(solved_at, step or table_resolution())}
+    dialect = db.engine.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(points=points, solves=1, **key)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.bucket],
+            set_={"points": table.c.points + stmt.excluded.points, "solves": table.c.solves + 1},
+        ))
+        return
+    # No portable upsert: a concurrent first write to the same bucket fails the transaction
+    result = db.session.execute(
+        db.update(table).where(table.c.user_id == key["user_id"], table.c.bucket == key["bucket"])
+        .values(points=table.c.points + points, solves=table.c.solves + 1)
+    )
+    if not result.rowcount:
+        db.session.execute(db.insert(table).values(points=points, solves=1, **key))
+
+
+def adjust_solvers(challenge_id: int, delta: int, solves: int = 0, exclude_user_id: Optional[int] = None,
+                   step: Optional[int] = None):
+    """Apply a change in a challenge's value to the bucket of each of its solves."""
+    solved = (
+        db.select(Submission.user_id, bucket_expr(Submission.submitted_at, step or table_resolution()))
+        .where(Submission.challenge_id == challenge_id, Submission.is_correct.is_(True))
+    )
+    if exclude_user_id is not None:
+        solved = solved.where(Submission.user_id != exclude_user_id)
+    values = {"points": ScoreBucket.points + delta}
+    if solves:
+        values["solves"] = ScoreBucket.solves + solves
+    db.session.execute(
+        db.update(ScoreBucket).where(db.tuple_(ScoreBucket.user_id, ScoreBucket.bucket).in_(solved))
+        .values(**values),
+        execution_options=_NO_SYNC,
+    )
+
+
+def adjust_many(deltas: dict):
+    """Apply changes in several challenges' values (id -> delta) to their solves' buckets."""
+    if db.engine.dialect.name != "postgresql":
+        # Without UPDATE ... FROM (SQLAlchemy 1.4 on SQLite), one tuple-IN UPDATE
+        # per challenge is faster than one UPDATE per bucket
+        for challenge_id, delta in deltas.items():
+            adjust_solvers(challenge_id, delta)
+        return
+    bucket = bucket_expr(Submission.submitted_at, table_resolution())
+    change = (
+        db.select(Submission.user_id.label("user_id"), bucket.label("bucket"),
+                  db.func.sum(db.case(deltas, value=Submission.challenge_id, else_=0)).label("delta"))
+        .where(Submission.challenge_id.in_(list(deltas)), Submission.is_correct.is_(True))
+        .group_by(Submission.user_id, bucket)
+        .subquery()
+    )
+    db.session.execute(
+        db.update(ScoreBucket)
+        .where(ScoreBucket.user_id == change.c.user_id, ScoreBucket.bucket == change.c.bucket)
+        .values(points=ScoreBucket.points + change.c.delta),
+        execution_options=_NO_SYNC,
+    )
+
+
+def rebuild() -> int:
+    """Recompute every bucket from correct submissions and current challenge values."""
+    step = resolution()
+    bucket = bucket_expr(Submission.submitted_at, step)
+    db.session.execute(db.delete(ScoreBucket), execution_options=_NO_SYNC)
+    db.session.execute(db.insert(ScoreBucket).from_select(
+        ["user_id", "bucket", "points", "solves"],
+        db.select(Submission.user_id, bucket, db.func.sum(Challenge.points), db.func.count(Submission.id))
+        .join(Challenge, Challenge.id == Submission.challenge_id)
+        .where(Submission.is_correct.is_(True), Submission.submitted_at.isnot(None), Challenge.deleted_at.is_(None))
+        .group_by(Submission.user_id, bucket),
+    ))
+    AppSetting.set_json(RESOLUTION_KEY, step)
+    return db.session.execute(db.select(db.func.count()).select_from(ScoreBucket)).scalar()
+
+
+def sync_resolution() -> Optional[int]:
+    """Rebuild if SCORE_HISTORY_RESOLUTION differs from the stored rows'; returns the bucket count."""
+    if AppSetting.get_json(RESOLUTION_KEY) == resolution():
+        return None
+    return rebuild()
+
+
+def timelines(user_ids: Iterable[int]) -> list:
+    """Cumulative score per bucket for the given players, in the given order.
+
+    Each point is the score at the end of a bucket in which the player scored.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return []
+    players = {
+        row.id: {"id": row.id, "username": row.username, "score": row.score, "timeline": []}
+        for row in db.session.execute(
+            db.select(User.id, User.username, User.score).where(User.id.in_(user_ids))
+        )
+    }
+    step = resolution()
+    totals = {}
+    for user_id, bucket, points in db.session.execute(
+        db.select(ScoreBucket.user_id, ScoreBucket.bucket, ScoreBucket.points)
+        .where(ScoreBucket.user_id.in_(user_ids))
+        .order_by(ScoreBucket.user_id, ScoreBucket.bucket)
+    ):
+        # Rows stored at an older resolution are merged into current-size buckets
+        end = bucket - bucket % step + step
+        total = totals[user_id] = totals.get(user_id, 0) + points
+        timeline = players[user_id]["timeline"]
+        if timeline and timeline[-1][0] == end:
+            timeline[-1][1] = total
+        else:
+            timeline.append([end, total])
+    for player in players.values():
+        player["timeline"] = [
+            {"time": datetime.utcfromtimestamp(end).isoformat(), "score": score}
+            for end, score in player["timeline"]
+        ]
+    return [players[user_id] for user_id in user_ids if user_id in players]
@@ -0,0 +1,240 @@
+"""Scoreboard freeze and static snapshots.
+
+Freezing captures a snapshot of the public scoreboard in the ``app_settings``
+table: ranks, scores, per-challenge solve counts and first bloods, plus the
+last submission id it includes. Solves keep being recorded and scored, but
+``/api/submissions/leaderboard`` serves the snapshot.
+
+Each process keeps the frozen leaderboard in memory as pre-encoded JSON, so
+serving it runs no queries. At most every SCOREBOARD_STATE_TTL seconds
+(default 5) a process reads the small ``scoreboard.freeze`` setting to see
+whether the freeze state changed. It loads the snapshot only when the version
+changes. A freeze or unfreeze therefore reaches every gunicorn worker within
+one TTL.
+
+The snapshot also holds the score timelines of the top TIMELINE_PLAYERS
+players, so score charts freeze with the leaderboard.
+
+``export_snapshot`` writes the snapshot as static JSON files that the
+frontend host can serve: ``scoreboard.json``, ``timeline.json``,
+``challenges.json`` and ``challenges/<id>.json``.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from app import db
+from app.models.challenge import Challenge
+from app.models.setting import AppSetting
+from app.models.submission import Submission
+from app.models.user import User
+from app.utils import score_history
+from app.utils.serialization import PreEncoded, dumps
+
+FREEZE_KEY = "scoreboard.freeze"
+SNAPSHOT_KEY = "scoreboard.snapshot"
+# Players whose score timelines a snapshot holds (also the cap on ?top=)
+TIMELINE_PLAYERS = 25
+
+
+def _first_bloods(last_submission_id: int) -> dict:
+    first = (
+        db.select(db.func.min(Submission.id).label("submission_id"))
+        .where(Submission.is_correct.is_(True), Submission.id <= last_submission_id)
+        .group_by(Submission.challenge_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        db.select(Submission.challenge_id, Submission.id, Submission.user_id, User.username, Submission.submitted_at)
+        .join(first, first.c.submission_id == Submission.id)
+        .join(User, User.id == Submission.user_id)
+    )
+    return {
+        row.challenge_id: {
+            "submission_id": row.id,
+            "user_id": row.user_id,
+            "username": row.username,
+            "submitted_at": row.submitted_at.isoformat() if row.submitted_at else None,
+        }
+        for row in rows
+    }
+
+
+def build_snapshot(frozen_at: Optional[datetime] = None) -> dict:
+    """Current public scoreboard: ranked players and per-challenge results."""
+    last_submission_id = db.session.execute(db.select(db.func.max(Submission.id))).scalar() or 0
+    leaderboard = []
+    rank = 0
+    previous_score = None
+    for position, row in enumerate(db.session.execute(
+        db.select(User.id, User.username, User.score, User.solve_count)
+        .where(User.is_admin.is_(False))
+        .order_by(User.score.desc(), User.id)
+    ), start=1):
+        # Standard competition ranking: tied scores share a rank (1, 2, 2, 4)
+        if row.score != previous_score:
+            rank, previous_score = position, row.score
+        leaderboard.append({
+            "rank": rank,
+            "id": row.id,
+            "username": row.username,
+            "score": row.score,
+            "solved_challenges": row.solve_count,
+        })
+
+    first_bloods = _first_bloods(last_submission_id)
+    challenges = [
+        {
+            "id": row.id,
+            "title": row.title,
+            "category": row.category,
+            "points": row.points,
+            "solve_count": row.solve_count,
+            "first_blood": first_bloods.get(row.id),
+        }
+        for row in db.session.execute(
+            db.select(Challenge.id, Challenge.title, Challenge.category, Challenge.points, Challenge.solve_count)
+            .where(Challenge.is_active.is_(True))
+            .order_by(Challenge.id)
+        )
+    ]
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "frozen_at": frozen_at.isoformat() if frozen_at else None,
+        "last_submission_id": last_submission_id,
+        "leaderboard": leaderboard,
+        "timeline": {
+            "resolution": score_history.resolution(),
+            "players": score_history.timelines(entry["id"] for entry in leaderboard[:TIMELINE_PLAYERS]),
+        },
+        "challenges": challenges,
+    }
+
+
+def freeze_state() -> dict:
+    return AppSetting.get_json(FREEZE_KEY, {"frozen": False, "version": 0})
+
+
+def freeze() -> dict:
+    """Snapshot the scoreboard and serve it until ``unfreeze`` (caller commits)."""
+    state = freeze_state()
+    frozen_at = datetime.utcnow()
+    snapshot = build_snapshot(frozen_at)
+    AppSetting.set_json(SNAPSHOT_KEY, snapshot)
+    state = {"frozen": True, "frozen_at": snapshot["frozen_at"], "version": state.get("version", 0) + 1,
+             "last_submission_id": snapshot["last_submission_id"]}
+    AppSetting.set_json(FREEZE_KEY, state)
+    return state
+
+
+def unfreeze() -> dict:
+    """Serve the live scoreboard again (caller commits). The snapshot is kept for export."""
+    state = freeze_state()
+    state = {"frozen": False, "frozen_at": None, "version": state.get("version", 0) + 1}
+    AppSetting.set_json(FREEZE_KEY, state)
+    return state
+
+
+class FrozenScoreboardCache:
+    """Per-process copy of the frozen leaderboard and timelines, refreshed by version."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._version = None
+        self._leaderboard: Optional[PreEncoded] = None
+        self._timeline: Optional[dict] = None
+
+    def _refresh(self):
+        ttl = float(os.environ.get("SCOREBOARD_STATE_TTL", "5"))
+        if time.monotonic() - self._checked_at < ttl:
+            return
+        with self._lock:
+            if time.monotonic() - self._checked_at >= ttl:
+                state = freeze_state()
+                if state.get("version") != self._version:
+                    leaderboard = timeline = None
+                    if state.get("frozen"):
+                        snapshot = AppSetting.get_json(SNAPSHOT_KEY) or {}
+                        leaderboard = PreEncoded(dumps(snapshot.get("leaderboard", [])))
+                        timeline = snapshot.get("timeline") or {"resolution": None, "players": []}
+                    self._leaderboard, self._timeline = leaderboard, timeline
+                    self._version = state.get("version")
+                self._checked_at = time.monotonic()
+
+    def leaderboard(self) -> Optional[PreEncoded]:
+        """Pre-encoded frozen leaderboard, or None when the scoreboard is live."""
+        self._refresh()
+        return self._leaderboard
+
+    def timeline(self) -> Optional[dict]:
+        """Frozen top-player timelines (``resolution``, ``players``), or None when live."""
+        self._refresh()
+        return self._timeline
+
+    def clear(self):
+        with self._lock:
+            self._checked_at, self._version = 0.0, None
+            self._leaderboard = self._timeline = None
+
+
+frozen_cache = FrozenScoreboardCache()
+
+
+def _write_json(path: str, data) -> int:
+    body = dumps(data)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(body)
+    # Readers never see a half-written file
+    os.replace(tmp, path)
+    return len(body)
+
+
+def export_snapshot(directory: str, snapshot: Optional[dict] = None) -> dict:
+    """Write a snapshot as static JSON files under ``directory``.
+
+    Uses the frozen snapshot when the scoreboard is frozen, a fresh one
+    otherwise. Per-challenge solver lists stop at the snapshot's last
+    submission, so every file describes the same moment.
+    """
+    if snapshot is None:
+        state = freeze_state()
+        snapshot = AppSetting.get_json(SNAPSHOT_KEY) if state.get("frozen") else None
+        snapshot = snapshot or build_snapshot()
+    os.makedirs(os.path.join(directory, "challenges"), exist_ok=True)
+    meta = {key: snapshot[key] for key in ("generated_at", "frozen_at", "last_submission_id")}
+    written = _write_json(os.path.join(directory, "scoreboard.json"), dict(meta, leaderboard=snapshot["leaderboard"]))
+    if "timeline" in snapshot:
+        written += _write_json(os.path.join(directory, "timeline.json"), dict(meta, **snapshot["timeline"]))
+    written += _write_json(os.path.join(directory, "challenges.json"), dict(meta, challenges=snapshot["challenges"]))
+
+    solvers = {c["id"]: [] for c in snapshot["challenges"]}
+    result = db.session.execute(
+        db.select(Submission.challenge_id, Submission.user_id, User.username, Submission.submitted_at)
+        .join(User, User.id == Submission.user_id)
+        .where(Submission.is_correct.is_(True), Submission.id <= snapshot["last_submission_id"])
+        .order_by(Submission.challenge_id, Submission.id)
+        .execution_options(yield_per=5000)
+    )
+    for row in result:
+        if row.challenge_id in solvers:
+            solvers[row.challenge_id].append({
+                "user_id": row.user_id,
+                "username": row.username,
+                "submitted_at": row.submitted_at.isoformat() if row.submitted_at else None,
+            })
+    for challenge in snapshot["challenges"]:
+        written += _write_json(os.path.join(directory, "challenges", f"{challenge['id']}.json"),
+                               dict(meta, challenge=challenge, solves=solvers[challenge["id"]]))
+    files = 2 + ("timeline" in snapshot) + len(snapshot["challenges"])
+    return {"directory": directory, "files": files, "bytes": written,
+            "frozen_at": snapshot["frozen_at"], "generated_at": snapshot["generated_at"]}
+
+
+def export_dir() -> str:
+    default = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                           "frontend", "scoreboard")
+    return os.environ.get("SCOREBOARD_EXPORT_DIR") or default
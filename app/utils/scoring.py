@@ -0,0 +1,263 @@
+"""Challenge values and denormalized player scores.
+
+``Challenge.points`` is what a solve of the challenge is currently worth.
+With ``scoring`` = ``linear`` or ``logarithmic`` the value falls from
+``initial_points`` to ``minimum_points`` as solves accumulate. It reaches the
+minimum after ``decay`` further solves. The first solve is worth
+``initial_points``. Values are retroactive, as in CTFd: every solver of a
+challenge holds its current value.
+
+``users.score``, ``users.solve_count`` and ``challenges.solve_count`` are
+updated in the solve's own transaction, so the leaderboard is one indexed
+read. When a solve changes a challenge's value, the difference is applied to
+that challenge's earlier solvers in a single ``UPDATE users ... WHERE id IN
+(solvers)``. The cost grows with that challenge's solve count, not with the
+number of players or challenges. ``recalculate_scores`` rebuilds everything
+from the submissions table. ``app.utils.score_history`` keeps per-bucket
+history in step with these changes.
+"""
+import math
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import distinct, func
+
+from app import db
+from app.models.challenge import Challenge
+from app.models.submission import Submission
+from app.models.user import User
+from app.utils import score_history
+
+SCORING_FUNCTIONS = ("static", "linear", "logarithmic")
+SCORING_FIELDS = ("scoring", "initial_points", "minimum_points", "decay")
+
+_NO_SYNC = {"synchronize_session": False}
+
+
+def challenge_value(scoring: str, initial: int, minimum: int, decay: Optional[int], solves: int) -> int:
+    """Value of a challenge with ``solves`` solves."""
+    if scoring == "static" or not decay:
+        return initial
+    extra = max(solves - 1, 0)
+    if scoring == "linear":
+        value = initial - (initial - minimum) * extra / decay
+    elif scoring == "logarithmic":
+        # Drops quickly over the first solves, then flattens out
+        value = initial - (initial - minimum) * math.log1p(extra) / math.log1p(decay)
+    else:
+        raise ValueError(f"Unknown scoring function: {scoring}")
+    return max(minimum, int(math.ceil(value)))
+
+
+def current_value(challenge: Challenge) -> int:
+    if challenge.scoring == "static":
+        return challenge.points
+    return challenge_value(challenge.scoring, challenge.initial_points, challenge.minimum_points or 0,
+                           challenge.decay, challenge.solve_count or 0)
+
+
+def validate_scoring(challenge: Challenge) -> Optional[str]:
+    """Error message if the challenge's scoring fields are inconsistent."""
+    if challenge.scoring not in SCORING_FUNCTIONS:
+        return f"scoring must be one of: {', '.join(SCORING_FUNCTIONS)}"
+    if challenge.scoring == "static":
+        return None
+    for field in ("initial_points", "minimum_points", "decay"):
+        value = getattr(challenge, field)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            return f"{field} must be a non-negative integer for {challenge.scoring} scoring"
+    if challenge.decay < 1:
+        return "decay must be at least 1"
+    if challenge.minimum_points > challenge.initial_points:
+        return "minimum_points cannot exceed initial_points"
+    return None
+
+
+def _solvers(challenge_id: int, exclude_user_id: Optional[int] = None):
+    query = db.select(Submission.user_id).where(Submission.challenge_id == challenge_id,
+                                                Submission.is_correct.is_(True))
+    if exclude_user_id is not None:
+        query = query.where(Submission.user_id != exclude_user_id)
+    return query
+
+
+def _adjust_solvers(challenge_id: int, delta: int, solves: int = 0, exclude_user_id: Optional[int] = None,
+                    step: Optional[int] = None):
+    values = {"score": User.score + delta}
+    if solves:
+        values["solve_count"] = User.solve_count + solves
+    db.session.execute(
+        db.update(User).where(User.id.in_(_solvers(challenge_id, exclude_user_id))).values(**values),
+        execution_options=_NO_SYNC,
+    )
+    score_history.adjust_solvers(challenge_id, delta, solves, exclude_user_id, step)
+
+
+def _lock_solvers(challenge_id: int, user_id: int):
+    """SELECT ... FOR UPDATE of a challenge's solvers and a new solver, in id order."""
+    return (
+        db.select(User.id)
+        .where(db.or_(User.id.in_(_solvers(challenge_id)), User.id == user_id))
+        .order_by(User.id)
+        .with_for_update()
+    )
+
+
+def record_solve(challenge_id: int, user_id: int, solved_at: Optional[datetime] = None) -> int:
+    """Account for a new correct submission (already added to the session).
+
+    Returns the points the solve is worth. Runs in the caller's transaction.
+    """
+    db.session.execute(
+        db.update(Challenge).where(Challenge.id == challenge_id)
+        .values(solve_count=Challenge.solve_count + 1),
+        execution_options=_NO_SYNC,
+    )
+    # The UPDATE above holds the challenge row lock (PostgreSQL) until commit,
+    # so concurrent solves of one challenge see consecutive solve counts
+    row = db.session.execute(
+        db.select(Challenge.scoring, Challenge.points, Challenge.initial_points, Challenge.minimum_points,
+                  Challenge.decay, Challenge.solve_count)
+        .where(Challenge.id == challenge_id)
+    ).one()
+    value = row.points
+    step = score_history.table_resolution()
+    if row.scoring != "static":
+        value = challenge_value(row.scoring, row.initial_points, row.minimum_points or 0, row.decay,
+                                row.solve_count)
+        if value != row.points:
+            if db.engine.dialect.name == "postgresql":
+                # Lock every player row this solve updates in id order first. Updating
+                # earlier solvers in arbitrary order and then the solver could deadlock
+                # with a concurrent solve of another challenge by one of them.
+                db.session.execute(_lock_solvers(challenge_id, user_id))
+            db.session.execute(db.update(Challenge).where(Challenge.id == challenge_id).values(points=value),
+                               execution_options=_NO_SYNC)
+            _adjust_solvers(challenge_id, value - row.points, exclude_user_id=user_id, step=step)
+    db.session.execute(
+        db.update(User).where(User.id == user_id)
+        .values(score=User.score + value, solve_count=User.solve_count + 1),
+        execution_options=_NO_SYNC,
+    )
+    score_history.record(user_id, solved_at or datetime.utcnow(), value, step)
+    return value
+
+
+def revalue_challenge(challenge: Challenge, previous_points: int):
+    """Recompute a challenge's value after an edit and pass the change on to its solvers."""
+    challenge.points = current_value(challenge)
+    db.session.flush()
+    if challenge.points != previous_points:
+        _adjust_solvers(challenge.id, challenge.points - previous_points)
+
+
+def _apply_deltas(deltas: dict):
+    """Add several challenges' value changes (id -> delta) to their solvers' scores at once."""
+    per_user = (
+        db.select(Submission.user_id.label("user_id"),
+                  func.sum(db.case(deltas, value=Submission.challenge_id, else_=0)).label("delta"))
+        .where(Submission.challenge_id.in_(list(deltas)), Submission.is_correct.is_(True))
+        .group_by(Submission.user_id)
+    )
+    if db.engine.dialect.name == "postgresql":
+        change = per_user.subquery()
+        db.session.execute(
+            db.update(User).where(User.id == change.c.user_id).values(score=User.score + change.c.delta),
+            execution_options=_NO_SYNC,
+        )
+    else:
+        # SQLAlchemy 1.4 has no UPDATE ... FROM for SQLite: one grouped read, then keyed updates
+        rows = [{"_user_id": user_id, "_delta": delta} for user_id, delta in db.session.execute(per_user) if delta]
+        if rows:
+            users = User.__table__
+            db.session.execute(
+                db.update(users).where(users.c.id == db.bindparam("_user_id"))
+                .values(score=users.c.score + db.bindparam("_delta")),
+                rows,
+            )
+    score_history.adjust_many(deltas)
+
+
+def revalue_challenges(previous_points: dict) -> dict:
+    """Recompute several edited challenges' values and pass all changes on at once.
+
+    ``previous_points`` maps challenge ids to their values before the edit.
+    All changes reach solvers' scores in one pass (one UPDATE ... FROM on
+    PostgreSQL), instead of one UPDATE per challenge.
+    """
+    db.session.flush()
+    deltas, values = {}, []
+    for row in db.session.execute(
+        db.select(Challenge.id, Challenge.scoring, Challenge.points, Challenge.initial_points,
+                  Challenge.minimum_points, Challenge.decay, Challenge.solve_count)
+        .where(Challenge.id.in_(list(previous_points)))
+    ):
+        value = row.points
+        if row.scoring != "static":
+            value = challenge_value(row.scoring, row.initial_points, row.minimum_points or 0, row.decay,
+                                    row.solve_count)
+            if value != row.points:
+                values.append({"challenge_id": row.id, "points": value})
+        # Unsolved challenges have no scores to adjust
+        if value != previous_points[row.id] and row.solve_count:
+            deltas[row.id] = value - previous_points[row.id]
+    if values:
+        db.session.execute(
+            db.update(Challenge.__table__)
+            .where(Challenge.__table__.c.id == db.bindparam("challenge_id"))
+            .values(points=db.bindparam("points")),
+            values,
+        )
+    if deltas:
+        _apply_deltas(deltas)
+    return {"challenges_revalued": len(deltas)}
+
+
+def remove_challenge(challenge: Challenge):
+    """Take a challenge's points and solve back from its solvers before it is deleted."""
+    _adjust_solvers(challenge.id, -challenge.points, solves=-1)
+
+
+def recalculate_scores() -> dict:
+    """Rebuild solve counts, dynamic values, player scores and score history from submissions."""
+    solved = Submission.is_correct.is_(True)
+    db.session.execute(db.update(Challenge).values(solve_count=(
+        db.select(func.count(distinct(Submission.user_id)))
+        .where(Submission.challenge_id == Challenge.id, solved)
+        .scalar_subquery()
+    )), execution_options=_NO_SYNC)
+
+    changed = []
+    for row in db.session.execute(
+        db.select(Challenge.id, Challenge.scoring, Challenge.points, Challenge.initial_points,
+                  Challenge.minimum_points, Challenge.decay, Challenge.solve_count)
+        .where(Challenge.scoring != "static")
+    ):
+        value = challenge_value(row.scoring, row.initial_points, row.minimum_points or 0, row.decay,
+                                row.solve_count)
+        if value != row.points:
+            changed.append({"challenge_id": row.id, "points": value})
+    if changed:
+        db.session.execute(
+            db.update(Challenge.__table__)
+            .where(Challenge.__table__.c.id == db.bindparam("challenge_id"))
+            .values(points=db.bindparam("points")),
+            changed,
+        )
+
+    # Solves of deleted challenges still waiting for the purge do not count
+    live = Challenge.deleted_at.is_(None)
+    result = db.session.execute(db.update(User).values(
+        score=db.select(func.coalesce(func.sum(Challenge.points), 0))
+        .select_from(Submission).join(Challenge, Challenge.id == Submission.challenge_id)
+        .where(Submission.user_id == User.id, solved, live)
+        .scalar_subquery(),
+        # Distinct challenges, like challenges.solve_count counts distinct players
+        solve_count=db.select(func.count(distinct(Submission.challenge_id)))
+        .select_from(Submission).join(Challenge, Challenge.id == Submission.challenge_id)
+        .where(Submission.user_id == User.id, solved, live)
+        .scalar_subquery(),
+    ), execution_options=_NO_SYNC)
+    return {"challenges_revalued": len(changed), "users_updated": result.rowcount,
+            "history_buckets": score_history.rebuild()}
+
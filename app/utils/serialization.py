@@ -0,0 +1,109 @@
+"""JSON encoding for API responses.
+
+``FastJSONProvider`` replaces Flask's stdlib-based provider so that
+``jsonify``, ``success_response`` and ``error_response`` go through orjson
+when it is installed. JSON_BACKEND selects the encoder: ``auto`` (default),
+``orjson`` or ``stdlib``. Both backends write datetimes as ISO 8601, the
+format ``to_dict`` already used.
+
+Cached endpoints can wrap already encoded JSON in ``PreEncoded``. The bytes
+are then copied into the response envelope without being parsed or
+re-encoded.
+"""
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime
+from typing import Any, Iterable, List, Sequence
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+_state = {"orjson": orjson is not None}
+
+
+class PreEncoded(bytes):
+    """UTF-8 JSON bytes that are written to responses unchanged."""
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, PreEncoded):
+        return json.loads(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode ``obj`` as compact UTF-8 JSON with the configured backend."""
+    if isinstance(obj, PreEncoded):
+        return bytes(obj)
+    if _state["orjson"]:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data):
+    """Decode JSON (``bytes`` or ``str``) with the configured backend."""
+    if _state["orjson"]:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_envelope(success: bool, message: str, data: PreEncoded = None, details: Any = None) -> bytes:
+    """Build a ``{success, message, data}`` body around pre-encoded data."""
+    parts = [b'{"success":', b"true" if success else b"false", b',"message":', dumps(message)]
+    if data is not None:
+        parts += [b',"data":', bytes(data)]
+    if details:
+        parts += [b',"details":', dumps(details)]
+    parts.append(b"}")
+    return b"".join(parts)
+
+
+def rows_to_dicts(keys: Sequence[str], rows: Iterable[Sequence[Any]]) -> List[dict]:
+    """Map Core result rows to dicts without hydrating ORM objects.
+
+    Datetimes are left as-is for the encoder, so no per-row ``isoformat``
+    calls or ``to_dict`` attribute lookups are needed.
+    """
+    return [dict(zip(keys, row)) for row in rows]
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available."""
+
+    default = staticmethod(_default)
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if _state["orjson"] and not kwargs:
+            return dumps(obj).decode("utf-8")
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(obj)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Install the fast provider and select the backend from JSON_BACKEND."""
+    backend = app.config.get("JSON_BACKEND", "auto")
+    if backend == "orjson" and orjson is None:
+        raise RuntimeError("JSON_BACKEND=orjson but orjson is not installed")
+    _state["orjson"] = orjson is not None and backend in ("auto", "orjson")
+    app.json = FastJSONProvider(app)
@@ -0,0 +1,181 @@
+"""Content-addressed local attachment storage.
+
+Used when ATTACHMENT_BACKEND=local (the default when S3_BUCKET is unset).
+Files live under ATTACHMENT_STORAGE_DIR at ``objects/<aa>/<bb>/<sha256>``.
+Identical uploads are stored once, and an object never changes once written.
+``Challenge.file_url`` refers to them as ``local://<sha256>/<filename>``.
+
+Uploads are streamed to a temporary file in ATTACHMENT_CHUNK_SIZE chunks and
+hashed on the way, then renamed into place. Downloads use short-lived signed
+URLs, like S3 presigned URLs. Expiry is rounded to a window, so everyone asking
+within one window gets the same URL and browser caches can reuse it. Files are
+sent by the front proxy when configured (X-Accel-Redirect for nginx, X-Sendfile
+for Apache/lighttpd). Otherwise ``send_file`` handles Range, If-None-Match and
+If-Range, and gunicorn uses sendfile(2) for full responses.
+"""
+import hashlib
+import hmac
+import mimetypes
+import os
+import re
+import time
+import uuid
+from typing import IO, Optional, Tuple
+from urllib.parse import quote
+
+from flask import current_app, send_file
+
+LOCAL_SCHEME = "local://"
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+_UNSAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+class StorageError(Exception):
+    """Raised when an upload cannot be stored."""
+
+
+def backend() -> str:
+    return os.environ.get("ATTACHMENT_BACKEND") or ("s3" if os.environ.get("S3_BUCKET") else "local")
+
+
+def storage_root() -> str:
+    default = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "attachments")
+    return os.environ.get("ATTACHMENT_STORAGE_DIR") or default
+
+
+def safe_filename(filename: str) -> str:
+    name = _UNSAFE_FILENAME_RE.sub("_", os.path.basename(filename or "")).strip("._")
+    return name[:200] or "attachment"
+
+
+def relative_object_path(digest: str) -> str:
+    if not _DIGEST_RE.match(digest or ""):
+        raise ValueError("invalid digest")
+    return f"{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def object_path(digest: str) -> str:
+    return os.path.join(storage_root(), "objects", relative_object_path(digest))
+
+
+def parse_local_url(url: str) -> Optional[Tuple[str, str]]:
+    """Parse local://<sha256>/<filename> to (digest, filename)."""
+    if not url or not url.startswith(LOCAL_SCHEME):
+        return None
+    digest, _, filename = url[len(LOCAL_SCHEME):].partition("/")
+    if not _DIGEST_RE.match(digest) or not filename:
+        return None
+    return digest, filename
+
+
+def local_url(digest: str, filename: str) -> str:
+    return f"{LOCAL_SCHEME}{digest}/{safe_filename(filename)}"
+
+
+# Uploads
+
+def save_stream(stream: IO[bytes], max_bytes: Optional[int] = None, chunk_size: Optional[int] = None) -> Tuple[str, int]:
+    """Copy ``stream`` into the store in fixed-size chunks. Returns (sha256, size).
+
+    The data is never held in memory as a whole. If the object already
+    exists, the new copy is discarded.
+    """
+    max_bytes = max_bytes if max_bytes is not None else int(os.environ.get("ATTACHMENT_MAX_BYTES", 512 * 1024 * 1024))
+    chunk_size = chunk_size or int(os.environ.get("ATTACHMENT_CHUNK_SIZE", 1024 * 1024))
+    tmp_dir = os.path.join(storage_root(), "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise StorageError(f"Attachment exceeds {max_bytes} bytes")
+                sha.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        if size == 0:
+            raise StorageError("Empty upload")
+        digest = sha.hexdigest()
+        final_path = object_path(digest)
+        if os.path.exists(final_path):
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, final_path)
+        return digest, size
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+# Signed download URLs
+
+def _signature(digest: str, filename: str, expires: int) -> str:
+    key = current_app.config["SECRET_KEY"].encode("utf-8")
+    message = f"attachment:{digest}:{filename}:{expires}".encode("utf-8")
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+def signed_download_path(digest: str, filename: str, ttl: int = 600) -> Tuple[str, int]:
+    """Path of the download endpoint plus the URL's remaining lifetime in seconds.
+
+    Expiry is rounded up to the next multiple of ``ttl`` (and at least ``ttl``
+    from now), so the URL stays the same for a whole window.
+    """
+    now = int(time.time())
+    expires = (now // ttl + 2) * ttl
+    filename = safe_filename(filename)
+    path = (f"/api/challenges/attachments/{digest}/{quote(filename)}"
+            f"?expires={expires}&sig={_signature(digest, filename, expires)}")
+    return path, expires - now
+
+
+def verify_download(digest: str, filename: str, expires: str, signature: str) -> bool:
+    try:
+        expires_at = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires_at < time.time() or not signature:
+        return False
+    return hmac.compare_digest(signature, _signature(digest, filename, expires_at))
+
+
+def send_object(digest: str, filename: str):
+    """Response for a stored object: offloaded to the proxy, or served with Range/ETag support."""
+    path = object_path(digest)
+    if not os.path.isfile(path):
+        return None
+    filename = safe_filename(filename)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    max_age = int(os.environ.get("ATTACHMENT_CACHE_MAX_AGE", 31536000))
+
+    accel_prefix = os.environ.get("ATTACHMENT_ACCEL_REDIRECT")
+    if accel_prefix or os.environ.get("ATTACHMENT_X_SENDFILE", "false").lower() == "true":
+        response = current_app.response_class(b"", mimetype=mimetype)
+        if accel_prefix:
+            # nginx serves the file from an `internal` location mapped to objects/
+            response.headers["X-Accel-Redirect"] = f"{accel_prefix.rstrip('/')}/{relative_object_path(digest)}"
+        else:
+            response.headers["X-Sendfile"] = path
+        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+        response.set_etag(digest)
+    else:
+        response = send_file(path, mimetype=mimetype, as_attachment=True, download_name=filename,
+                             conditional=True, etag=digest, max_age=max_age)
+        response.accept_ranges = "bytes"
+    # Content-addressed: the bytes behind this URL can never change
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = True
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
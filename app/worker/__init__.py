@@ -0,0 +1,91 @@
+"""flagrush-worker: long-running SQS consumer (``python worker.py``).
+
+Processes the events the API publishes (see docs/SQS_EVENTS.md) on an EC2
+host instead of Lambda. Configuration comes from the environment:
+WORKER_QUEUE_URL (falls back to SQS_QUEUE_URL), WORKER_HANDLERS,
+WORKER_CONCURRENCY, WORKER_WAIT_TIME, WORKER_VISIBILITY_TIMEOUT and
+WORKER_RETRY_DELAY. Metrics are served in the Prometheus text format on
+WORKER_METRICS_BIND:WORKER_METRICS_PORT (``/metrics``), and throughput is
+logged every WORKER_STATS_INTERVAL seconds.
+"""
+import hmac
+import logging
+import os
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.utils import metrics
+from app.worker.consumer import Consumer, consumer_from_env
+from app.worker.handlers import HANDLERS, Handler, Message, build_handlers, register_handler
+
+__all__ = ["Consumer", "consumer_from_env", "Handler", "Message", "HANDLERS", "build_handlers",
+           "register_handler", "main"]
+
+logger = logging.getLogger("flagrush.worker")
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        token = os.environ.get("METRICS_TOKEN")
+        supplied = (self.headers.get("Authorization") or "").encode("utf-8")
+        if token and not hmac.compare_digest(supplied, f"Bearer {token}".encode("utf-8")):
+            self.send_error(401)
+            return
+        body = metrics.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(bind: str, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((bind, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="flagrush-worker-metrics", daemon=True).start()
+    return server
+
+
+def _log_throughput(consumer: Consumer, interval: float):
+    last_time, last_processed, last_failed = time.monotonic(), 0, 0
+    while not consumer.wait(interval):
+        now = time.monotonic()
+        processed, failed = consumer.processed, consumer.failed
+        logger.info("Worker throughput", extra={
+            "messages_per_second": round((processed - last_processed) / (now - last_time), 2),
+            "processed": processed - last_processed,
+            "failed": failed - last_failed,
+        })
+        last_time, last_processed, last_failed = now, processed, failed
+
+
+def main():
+    from app.utils.logs import configure_logging
+
+    configure_logging()
+    consumer = consumer_from_env()
+
+    def _shutdown(signum, frame):
+        if not consumer.stopping:
+            logger.info("Shutting down after in-flight messages", extra={"signal": signum})
+        consumer.stop()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    port = int(os.environ.get("WORKER_METRICS_PORT", "9101"))
+    if port:
+        serve_metrics(os.environ.get("WORKER_METRICS_BIND", "127.0.0.1"), port)
+    interval = float(os.environ.get("WORKER_STATS_INTERVAL", "60"))
+    if interval > 0:
+        threading.Thread(target=_log_throughput, args=(consumer, interval),
+                         name="flagrush-worker-stats", daemon=True).start()
+    consumer.run()
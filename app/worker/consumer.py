@@ -0,0 +1,260 @@
+"""Long-polling SQS consumer.
+
+WORKER_RECEIVERS receive loops long-poll (WaitTimeSeconds, up to 10
+messages per call) and hand each batch to a thread pool. At most WORKER_CONCURRENCY batches
+are in flight, so the worker never holds more messages than it can work on.
+Each batch goes through every handler that accepts its events. Messages that
+no handler failed are deleted with one DeleteMessageBatch call. Failed
+messages become visible again after WORKER_RETRY_DELAY seconds and are moved
+to the queue's dead-letter queue by its redrive policy.
+
+A heartbeat thread extends the visibility timeout of messages still being
+handled once half of it has passed, so slow handlers do not cause duplicate
+deliveries. ``stop()`` (SIGTERM/SIGINT when run from ``worker.py``) ends the
+receive loop after the current poll, waits for in-flight batches and their
+deletes, then returns.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from app.utils import metrics
+from app.utils.aws import aws_errors, get_sqs_client
+from app.worker.handlers import Handler, Message, build_handlers
+
+logger = logging.getLogger("flagrush.worker")
+
+BATCH_SIZE_BUCKETS = (0, 1, 2, 5, 10)
+
+metrics.registry.describe(metrics.PREFIX + "worker_messages_total", "counter",
+                          "Messages handled by the SQS worker by event and outcome")
+metrics.registry.describe(metrics.PREFIX + "worker_receive_total", "counter",
+                          "ReceiveMessage calls by outcome (messages, empty, error)")
+metrics.registry.describe(metrics.PREFIX + "worker_batch_size", "histogram",
+                          "Messages per ReceiveMessage call", buckets=BATCH_SIZE_BUCKETS)
+metrics.registry.describe(metrics.PREFIX + "worker_batch_duration_seconds", "histogram",
+                          "Time to run a received batch through all handlers")
+metrics.registry.describe(metrics.PREFIX + "worker_handler_duration_seconds", "histogram",
+                          "Time spent in each handler per batch")
+metrics.registry.describe(metrics.PREFIX + "worker_visibility_extensions_total", "counter",
+                          "Visibility timeouts extended for slow messages")
+metrics.registry.describe(metrics.PREFIX + "worker_delete_failures_total", "counter",
+                          "Messages DeleteMessageBatch could not delete")
+metrics.registry.describe(metrics.PREFIX + "worker_inflight_messages", "gauge",
+                          "Messages received and not yet deleted or released")
+
+
+class Consumer:
+    def __init__(self, queue_url: str, handlers: List[Handler], concurrency: int = 4, wait_time: int = 20,
+                 visibility_timeout: int = 60, retry_delay: int = 30, receivers: int = 1, sqs=None):
+        self.queue_url = queue_url
+        self.handlers = handlers
+        self.concurrency = max(1, concurrency)
+        # Each receive call is a round trip; more loops keep a large pool fed
+        self.receivers = max(1, min(receivers, self.concurrency))
+        self.wait_time = wait_time
+        self.visibility_timeout = visibility_timeout
+        self.retry_delay = retry_delay
+        self.sqs = sqs or get_sqs_client()
+        self._stop = threading.Event()
+        self._drained = threading.Event()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._inflight_lock = threading.Lock()
+        self._inflight: Dict[str, Message] = {}
+        self.processed = 0
+        self.failed = 0
+
+    def stop(self):
+        self._stop.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until ``run()`` has drained in-flight work; False on timeout."""
+        return self._drained.wait(timeout)
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop.is_set()
+
+    def run(self):
+        """Receive and process until ``stop()``; returns once in-flight work is done."""
+        heartbeat = threading.Thread(target=self._heartbeat, name="flagrush-worker-heartbeat", daemon=True)
+        heartbeat.start()
+        logger.info("Worker started", extra={"queue_url": self.queue_url, "concurrency": self.concurrency,
+                                             "receivers": self.receivers,
+                                             "handlers": [h.name for h in self.handlers]})
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="flagrush-worker") as pool:
+            loops = [threading.Thread(target=self._receive_loop, args=(pool,), name=f"flagrush-worker-receive-{i}")
+                     for i in range(self.receivers)]
+            for loop in loops:
+                loop.start()
+            for loop in loops:
+                loop.join()
+        self._drained.set()
+        for handler in self.handlers:
+            handler.close()
+        logger.info("Worker stopped", extra={"processed": self.processed, "failed": self.failed})
+
+    def _receive_loop(self, pool: ThreadPoolExecutor):
+        while not self._stop.is_set():
+            self._slots.acquire()
+            if self._stop.is_set():
+                self._slots.release()
+                break
+            messages = self.receive()
+            if not messages:
+                self._slots.release()
+                continue
+            pool.submit(self._run_batch, messages)
+
+    def receive(self) -> List[Message]:
+        try:
+            response = self.sqs.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=10,
+                WaitTimeSeconds=self.wait_time,
+                VisibilityTimeout=self.visibility_timeout,
+                AttributeNames=["ApproximateReceiveCount"],
+            )
+        except aws_errors() as e:
+            metrics.inc(metrics.PREFIX + "worker_receive_total", outcome="error")
+            logger.warning("ReceiveMessage failed: %s", e)
+            # Back off without delaying shutdown
+            self._stop.wait(min(self.wait_time, 5) or 1)
+            return []
+
+        messages = []
+        poison = []
+        for raw in response.get("Messages", []):
+            try:
+                body = json.loads(raw["Body"])
+                if not isinstance(body, dict):
+                    raise ValueError("body is not an object")
+            except ValueError:
+                # Retrying cannot fix a malformed body
+                logger.warning("Dropping message with invalid body", extra={"message_id": raw["MessageId"]})
+                metrics.inc(metrics.PREFIX + "worker_messages_total", event="invalid", outcome="dropped")
+                poison.append(Message(raw["MessageId"], raw["ReceiptHandle"], {}))
+                continue
+            receive_count = int(raw.get("Attributes", {}).get("ApproximateReceiveCount", 1))
+            messages.append(Message(raw["MessageId"], raw["ReceiptHandle"], body, receive_count))
+
+        received = len(messages) + len(poison)
+        metrics.inc(metrics.PREFIX + "worker_receive_total", outcome="messages" if received else "empty")
+        metrics.observe(metrics.PREFIX + "worker_batch_size", received)
+        if poison:
+            self._delete(poison)
+        with self._inflight_lock:
+            for message in messages:
+                self._inflight[message.message_id] = message
+            metrics.set_gauge(metrics.PREFIX + "worker_inflight_messages", len(self._inflight))
+        return messages
+
+    def _run_batch(self, messages: List[Message]):
+        try:
+            self.process(messages)
+        except Exception:
+            logger.exception("Unexpected error processing batch")
+        finally:
+            self._slots.release()
+
+    def process(self, messages: List[Message]):
+        """Run messages through the handlers, then delete or release them."""
+        start = time.perf_counter()
+        failed = set()
+        for handler in self.handlers:
+            accepted = [m for m in messages if handler.accepts(m)]
+            if not accepted:
+                continue
+            handler_start = time.perf_counter()
+            try:
+                failed |= handler.handle_batch(accepted)
+            except Exception:
+                logger.exception("Handler %s failed on a batch", handler.name)
+                failed |= {m.message_id for m in accepted}
+            metrics.observe(metrics.PREFIX + "worker_handler_duration_seconds",
+                            time.perf_counter() - handler_start, handler=handler.name)
+        metrics.observe(metrics.PREFIX + "worker_batch_duration_seconds", time.perf_counter() - start)
+
+        done = [m for m in messages if m.message_id not in failed]
+        retry = [m for m in messages if m.message_id in failed]
+        for message in done:
+            metrics.inc(metrics.PREFIX + "worker_messages_total", event=message.event, outcome="ok")
+        for message in retry:
+            metrics.inc(metrics.PREFIX + "worker_messages_total", event=message.event, outcome="failed")
+            logger.warning("Message will be retried", extra={"message_id": message.message_id,
+                                                             "event": message.event,
+                                                             "receive_count": message.receive_count})
+        if done:
+            self._delete(done)
+        if retry:
+            self._change_visibility(retry, self.retry_delay)
+        with self._inflight_lock:
+            for message in messages:
+                self._inflight.pop(message.message_id, None)
+            metrics.set_gauge(metrics.PREFIX + "worker_inflight_messages", len(self._inflight))
+            self.processed += len(done)
+            self.failed += len(retry)
+
+    def _entries(self, messages: List[Message], **extra) -> List[dict]:
+        # Batch entry ids only need to be unique within the call
+        return [dict(Id=str(i), ReceiptHandle=m.receipt_handle, **extra) for i, m in enumerate(messages)]
+
+    def _delete(self, messages: List[Message]):
+        for i in range(0, len(messages), 10):
+            chunk = messages[i:i + 10]
+            try:
+                response = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=self._entries(chunk))
+                failures = response.get("Failed", [])
+            except aws_errors() as e:
+                logger.warning("DeleteMessageBatch failed: %s", e)
+                failures = chunk
+            if failures:
+                # Undeleted messages come back after the visibility timeout;
+                # handlers are idempotent, so reprocessing them is harmless
+                metrics.inc(metrics.PREFIX + "worker_delete_failures_total", len(failures))
+
+    def _change_visibility(self, messages: List[Message], timeout: int) -> bool:
+        ok = True
+        for i in range(0, len(messages), 10):
+            chunk = messages[i:i + 10]
+            try:
+                response = self.sqs.change_message_visibility_batch(
+                    QueueUrl=self.queue_url, Entries=self._entries(chunk, VisibilityTimeout=timeout))
+                ok = ok and not response.get("Failed")
+            except aws_errors() as e:
+                logger.warning("ChangeMessageVisibilityBatch failed: %s", e)
+                ok = False
+        return ok
+
+    def _heartbeat(self):
+        """Extend visibility for messages older than half the visibility timeout."""
+        interval = max(1.0, self.visibility_timeout / 4)
+        # Keeps running during shutdown until in-flight batches have finished
+        while not self._drained.wait(interval):
+            now = time.monotonic()
+            with self._inflight_lock:
+                slow = [m for m in self._inflight.values()
+                        if now - m.received_at > self.visibility_timeout / 2]
+            if slow and self._change_visibility(slow, self.visibility_timeout):
+                for message in slow:
+                    message.received_at = now
+                metrics.inc(metrics.PREFIX + "worker_visibility_extensions_total", len(slow))
+
+
+def consumer_from_env(queue_url: Optional[str] = None, handlers: Optional[List[Handler]] = None) -> Consumer:
+    queue_url = queue_url or os.environ.get("WORKER_QUEUE_URL") or os.environ.get("SQS_QUEUE_URL")
+    if not queue_url:
+        raise ValueError("Set WORKER_QUEUE_URL (or SQS_QUEUE_URL)")
+    return Consumer(
+        queue_url,
+        handlers if handlers is not None else build_handlers(),
+        concurrency=int(os.environ.get("WORKER_CONCURRENCY", "4")),
+        wait_time=int(os.environ.get("WORKER_WAIT_TIME", "20")),
+        visibility_timeout=int(os.environ.get("WORKER_VISIBILITY_TIMEOUT", "60")),
+        retry_delay=int(os.environ.get("WORKER_RETRY_DELAY", "30")),
+        receivers=int(os.environ.get("WORKER_RECEIVERS", "1")),
+    )
@@ -0,0 +1,276 @@
+"""Message handlers for the SQS worker.
+
+A handler subscribes to event types (``events``; empty means all) and
+receives the messages of each received batch that match. It returns the ids
+of messages it could not process; those are retried, everything else is
+deleted. Handlers must be idempotent: SQS delivers at least once, and a
+message is redelivered to every handler when any one of them fails it.
+
+Built-in handlers, enabled with WORKER_HANDLERS (comma-separated):
+
+- ``s3_log``: submission events as gzip NDJSON objects under LOG_BUCKET, in
+  the same partitioned layout as ``docs/lambda_s3_logger.py`` so its
+  compaction job and Athena tables work for both;
+- ``first_solver``: the earliest solve per challenge in
+  ``challenges/<id>/first_solver.json``, updated with S3 conditional writes;
+- ``webhook``: POSTs events to WEBHOOK_URL, signed with WEBHOOK_SECRET.
+
+Other handlers can be added with ``register_handler`` or named in
+WORKER_HANDLERS as ``package.module:factory``.
+"""
+import datetime
+import gzip
+import hashlib
+import hmac
+import importlib
+import json
+import logging
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+
+from app.utils.aws import get_s3_client, s3_error_code, s3_put_object_if
+
+logger = logging.getLogger("flagrush.worker")
+
+SUBMISSION_EVENTS = ("flag_submission", "flag_submission_blocked", "challenge_solved")
+
+
+class Message:
+    """One received SQS message with its decoded JSON body."""
+
+    __slots__ = ("message_id", "receipt_handle", "body", "receive_count", "received_at")
+
+    def __init__(self, message_id: str, receipt_handle: str, body: Dict[str, Any], receive_count: int = 1):
+        self.message_id = message_id
+        self.receipt_handle = receipt_handle
+        self.body = body
+        self.receive_count = receive_count
+        self.received_at = time.monotonic()
+
+    @property
+    def event(self) -> str:
+        return self.body.get("event") or "unknown"
+
+
+class Handler:
+    """Base class. Override ``handle`` (one message) or ``handle_batch``."""
+
+    name = "handler"
+    events: Tuple[str, ...] = ()
+
+    def accepts(self, message: Message) -> bool:
+        return not self.events or message.event in self.events
+
+    def handle_batch(self, messages: List[Message]) -> Set[str]:
+        failed = set()
+        for message in messages:
+            try:
+                self.handle(message)
+            except Exception:
+                logger.exception("Handler %s failed on message %s", self.name, message.message_id)
+                failed.add(message.message_id)
+        return failed
+
+    def handle(self, message: Message):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def _log_prefix() -> str:
+    return os.environ.get("LOG_PREFIX", "logs/").strip("/") + "/"
+
+
+class S3LogHandler(Handler):
+    """Batches submission events into one gzip NDJSON object per partition."""
+
+    name = "s3_log"
+    events = SUBMISSION_EVENTS
+
+    def __init__(self, bucket: str, prefix: str, include_flag: bool = False):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.include_flag = include_flag
+
+    @classmethod
+    def from_env(cls):
+        bucket = os.environ.get("LOG_BUCKET")
+        if not bucket:
+            raise ValueError("s3_log handler needs LOG_BUCKET")
+        return cls(bucket, _log_prefix(), os.environ.get("INCLUDE_FLAG", "false").lower() == "true")
+
+    def _partition(self, record: Dict[str, Any]) -> Tuple[str, str, str]:
+        submitted_at = record.get("submitted_at") or ""
+        try:
+            ts = datetime.datetime.fromisoformat(submitted_at[:26])
+        except ValueError:
+            ts = datetime.datetime.utcnow()
+        return ts.strftime("%Y-%m-%d"), ts.strftime("%H"), str(record.get("challenge_id", "unknown"))
+
+    def _batch_key(self, partition: Tuple[str, str, str], message_ids: List[str]) -> str:
+        # Derived from the message ids, so a retried batch overwrites its own object
+        day, hour, challenge_id = partition
+        digest = hashlib.sha256("\n".join(sorted(message_ids)).encode("utf-8")).hexdigest()[:32]
+        return f"{self.prefix}submissions/dt={day}/hour={hour}/challenge_id={challenge_id}/batch-{digest}.ndjson.gz"
+
+    def handle_batch(self, messages: List[Message]) -> Set[str]:
+        groups: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = defaultdict(list)
+        for message in messages:
+            if "submission_id" not in message.body:
+                continue
+            record = dict(message.body)
+            if not self.include_flag:
+                record.pop("flag", None)
+            record["message_id"] = message.message_id
+            groups[self._partition(record)].append(record)
+
+        failed = set()
+        s3 = get_s3_client()
+        for partition, records in groups.items():
+            records.sort(key=lambda r: r["message_id"])
+            key = self._batch_key(partition, [r["message_id"] for r in records])
+            body = "".join(json.dumps(r, separators=(",", ":"), sort_keys=True) + "\n" for r in records)
+            try:
+                # mtime=0 keeps the bytes identical when a retry rewrites the key
+                s3.put_object(Bucket=self.bucket, Key=key, Body=gzip.compress(body.encode("utf-8"), mtime=0),
+                              ContentType="application/x-ndjson", ContentEncoding="gzip")
+            except Exception as e:
+                logger.warning("Failed to write s3://%s/%s: %s", self.bucket, key, e)
+                failed.update(r["message_id"] for r in records)
+        return failed
+
+
+class FirstSolverHandler(Handler):
+    """Keeps the lowest-submission_id solve per challenge in S3 (compare-and-swap)."""
+
+    name = "first_solver"
+    events = ("challenge_solved",)
+
+    def __init__(self, bucket: str, prefix: str):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    @classmethod
+    def from_env(cls):
+        bucket = os.environ.get("LOG_BUCKET")
+        if not bucket:
+            raise ValueError("first_solver handler needs LOG_BUCKET")
+        return cls(bucket, _log_prefix())
+
+    @staticmethod
+    def _order(doc: Dict[str, Any]) -> Tuple[int, str]:
+        submission_id = doc.get("submission_id")
+        return (submission_id if isinstance(submission_id, int) else 2 ** 63, doc.get("submitted_at") or "")
+
+    def handle(self, message: Message):
+        if "challenge_id" not in message.body:
+            return
+        record = message.body
+        key = f"{self.prefix}challenges/{record['challenge_id']}/first_solver.json"
+        doc = {
+            "challenge_id": record["challenge_id"],
+            "user_id": record.get("user_id"),
+            "username": record.get("username"),
+            "submission_id": record.get("submission_id"),
+            "submitted_at": record.get("submitted_at"),
+        }
+        body = (json.dumps(doc, separators=(",", ":")) + "\n").encode("utf-8")
+        s3 = get_s3_client()
+        for attempt in range(8):
+            try:
+                if s3_put_object_if(self.bucket, key, body, {"If-None-Match": "*"}, ContentType="application/json"):
+                    return
+                try:
+                    current = s3.get_object(Bucket=self.bucket, Key=key)
+                except Exception as e:
+                    if s3_error_code(e) in ("NoSuchKey", "404"):
+                        continue
+                    raise
+                if self._order(json.loads(current["Body"].read())) <= self._order(doc):
+                    return
+                if s3_put_object_if(self.bucket, key, body, {"If-Match": current["ETag"]},
+                                    ContentType="application/json"):
+                    return
+            except Exception as e:
+                # 409: another conditional write to the key is in flight
+                if s3_error_code(e) not in ("ConditionalRequestConflict", "409"):
+                    raise
+            time.sleep(min(0.05 * 2 ** attempt, 1.0) * random.random())
+        raise RuntimeError(f"first solver update for challenge {record['challenge_id']} did not settle")
+
+
+class WebhookHandler(Handler):
+    """POSTs each event as JSON; non-2xx responses and timeouts are retried via SQS."""
+
+    name = "webhook"
+
+    def __init__(self, url: str, events: Iterable[str] = ("challenge_solved",), secret: str = None,
+                 timeout: float = 5.0):
+        self.url = url
+        self.events = tuple(events)
+        self.secret = secret
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls):
+        url = os.environ.get("WEBHOOK_URL")
+        if not url:
+            raise ValueError("webhook handler needs WEBHOOK_URL")
+        events = [e.strip() for e in os.environ.get("WEBHOOK_EVENTS", "challenge_solved").split(",") if e.strip()]
+        return cls(url, events, os.environ.get("WEBHOOK_SECRET") or None,
+                   float(os.environ.get("WEBHOOK_TIMEOUT", "5")))
+
+    def handle(self, message: Message):
+        payload = dict(message.body)
+        payload.pop("flag", None)
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        headers = {"Content-Type": "application/json", "X-FlagRush-Event": message.event,
+                   "X-FlagRush-Delivery": message.message_id}
+        if self.secret:
+            headers["X-FlagRush-Signature"] = "sha256=" + hmac.new(
+                self.secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        request = urllib.request.Request(self.url, data=body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            # 4xx other than 429 will not get better on retry
+            if 400 <= e.code < 500 and e.code != 429:
+                logger.warning("Webhook rejected message %s: HTTP %s", message.message_id, e.code)
+                return
+            raise
+
+
+HANDLERS: Dict[str, Callable[[], Handler]] = {
+    "s3_log": S3LogHandler.from_env,
+    "first_solver": FirstSolverHandler.from_env,
+    "webhook": WebhookHandler.from_env,
+}
+
+
+def register_handler(name: str, factory: Callable[[], Handler]):
+    HANDLERS[name] = factory
+
+
+def build_handlers(spec: str = None) -> List[Handler]:
+    """Instantiate handlers from WORKER_HANDLERS (names or ``module:factory`` paths)."""
+    spec = spec if spec is not None else os.environ.get("WORKER_HANDLERS", "s3_log,first_solver")
+    handlers = []
+    for name in (n.strip() for n in spec.split(",")):
+        if not name:
+            continue
+        if ":" in name:
+            module, _, attr = name.partition(":")
+            factory = getattr(importlib.import_module(module), attr)
+        elif name in HANDLERS:
+            factory = HANDLERS[name]
+        else:
+            raise ValueError(f"Unknown worker handler: {name}")
+        handlers.append(factory())
+    return handlers
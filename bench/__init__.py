@@ -0,0 +1 @@
+"""Dataset generation and load/benchmark tooling (not imported by the apps)."""
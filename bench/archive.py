@@ -0,0 +1,97 @@
+"""Benchmark submission archival and archive reads.
+
+    DATABASE_URL=sqlite:///score.db python -m bench.generate_dataset --submissions 1000000
+    DATABASE_URL=sqlite:///score.db python -m bench.archive --keep-hours 24
+
+It times some hot-table aggregates: a full count, the heaviest player's
+``/api/submissions/stats`` query, and wrong attempts per challenge. It then
+archives the incorrect submissions older than ``--keep-hours`` before the
+newest one, into a temporary directory unless ``--directory`` is given. Then
+it times the aggregates again, a full archive scan and a first page of one
+player's archived rows. The rows are really deleted, so re-seed (or work on a
+copy) before comparing runs. If the flag-sharing detector has a checkpoint,
+rows after it are kept.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from itertools import islice
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _median(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return _ms(statistics.median(times))
+
+
+def _aggregates(db, Submission, user_id, repeat):
+    correct = db.func.coalesce(db.func.sum(db.case((Submission.is_correct.is_(True), 1), else_=0)), 0)
+    return {
+        'count_ms': _median(lambda: db.session.execute(
+            db.select(db.func.count(Submission.id))).scalar(), repeat),
+        'player_stats_ms': _median(lambda: db.session.execute(
+            db.select(db.func.count(Submission.id), correct).where(Submission.user_id == user_id)).one(), repeat),
+        'wrong_per_challenge_ms': _median(lambda: db.session.execute(
+            db.select(Submission.challenge_id, db.func.count())
+            .where(Submission.is_correct.is_(False)).group_by(Submission.challenge_id)).all(), repeat),
+    }
+
+
+def run(args):
+    os.environ.pop('ARCHIVE_BUCKET', None)
+    os.environ['ARCHIVE_DIR'] = args.directory or tempfile.mkdtemp(prefix='flagrush-archive-')
+    from app import create_admin_app, db
+    from app.models import Submission
+    from app.utils import archive
+
+    app = create_admin_app()
+    report = {'directory': os.environ['ARCHIVE_DIR']}
+    with app.app_context():
+        user_id = db.session.execute(
+            db.select(Submission.user_id).group_by(Submission.user_id)
+            .order_by(db.func.count().desc()).limit(1)
+        ).scalar()
+        newest = db.session.execute(db.select(db.func.max(Submission.submitted_at))).scalar()
+        before = newest - timedelta(hours=args.keep_hours)
+        report['submissions_before'] = db.session.execute(db.select(db.func.count(Submission.id))).scalar()
+        report['hot_before'] = _aggregates(db, Submission, user_id, args.repeat)
+
+        stats = archive.archive_submissions(before=before)
+        report['archive'] = dict(stats, rows_per_second=round(stats['rows'] / stats['seconds']) if stats['seconds'] else None,
+                                 bytes_per_row=round(stats['bytes'] / stats['rows'], 1) if stats['rows'] else None)
+        report['submissions_after'] = db.session.execute(db.select(db.func.count(Submission.id))).scalar()
+        report['hot_after'] = _aggregates(db, Submission, user_id, args.repeat)
+
+        start = time.perf_counter()
+        scanned = sum(1 for _ in archive.scan_submissions())
+        elapsed = time.perf_counter() - start
+        report['scan'] = {'rows': scanned, 'seconds': round(elapsed, 2),
+                          'rows_per_second': round(scanned / elapsed) if elapsed else None}
+        start = time.perf_counter()
+        page = list(islice(archive.scan_submissions(user_id=user_id), 100))
+        report['scan']['player_first_page'] = {'rows': len(page), 'ms': _ms(time.perf_counter() - start)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keep-hours', type=float, default=24, help='keep submissions this recent (relative to the newest)')
+    parser.add_argument('--directory', help='archive directory (default: a new temporary directory)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
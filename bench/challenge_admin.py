@@ -0,0 +1,122 @@
+"""Benchmark challenge deletion and bulk point changes.
+
+    DATABASE_URL=sqlite:///score.db python -m bench.generate_dataset --submissions 1000000 --dynamic 0.8
+    cp score.db admin.db
+    DATABASE_URL=sqlite:///admin.db python -m bench.challenge_admin --bulk 100
+
+Deletion: it times what the previous ``db.session.delete(challenge)`` did
+first, which is loading the most attempted challenge's ``submissions``
+relationship, and reports its memory peak (tracemalloc). Then it times the
+soft delete and the batched purge of the same challenge.
+
+Bulk: it changes the points of ``--bulk`` challenges twice. First one
+challenge at a time, as repeated ``PUT`` calls do (``revalue_challenge`` per
+challenge, one commit each). Then in one ``revalue_challenges`` call, as
+``POST /api/admin/challenges/bulk`` does. It checks that the scores then match
+a full ``recalculate_scores``. The database is modified, so work on a copy.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def run(args):
+    from app import create_admin_app, db
+    from app.models import Challenge, Submission, User
+    from app.utils import challenge_purge, scoring
+
+    app = create_admin_app()
+    report = {}
+    with app.app_context():
+        challenge_id, attempts = db.session.execute(
+            db.select(Submission.challenge_id, db.func.count()).group_by(Submission.challenge_id)
+            .order_by(db.func.count().desc()).limit(1)
+        ).one()
+        report['delete'] = {'challenge_id': challenge_id, 'submissions': attempts}
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        loaded = len(db.session.get(Challenge, challenge_id).submissions)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        db.session.rollback()
+        db.session.expunge_all()
+        report['delete']['legacy_relationship_load'] = {'rows': loaded, 'ms': _ms(elapsed),
+                                                        'peak_mib': round(peak / 2 ** 20, 1)}
+
+        start = time.perf_counter()
+        challenge = db.session.get(Challenge, challenge_id)
+        scoring.remove_challenge(challenge)
+        challenge.is_active = False
+        challenge.deleted_at = datetime.utcnow()
+        db.session.commit()
+        report['delete']['soft_delete_ms'] = _ms(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        batch_times = []
+        while True:
+            batch_start = time.perf_counter()
+            stats = challenge_purge.purge_batch(args.batch_size)
+            if stats is None:
+                break
+            batch_times.append(time.perf_counter() - batch_start)
+        report['delete']['purge'] = {'batches': len(batch_times), 'seconds': round(time.perf_counter() - start, 2),
+                                     'max_batch_ms': _ms(max(batch_times)) if batch_times else None}
+
+        ids = db.session.execute(
+            db.select(Challenge.id).where(Challenge.deleted_at.is_(None))
+            .order_by(Challenge.solve_count.desc()).limit(args.bulk)
+        ).scalars().all()
+        report['bulk'] = {'challenges': len(ids)}
+
+        def set_points(delta):
+            rows = db.session.execute(
+                db.select(Challenge.id, Challenge.points, Challenge.initial_points).where(Challenge.id.in_(ids))
+            ).all()
+            db.session.execute(
+                db.update(Challenge.__table__).where(Challenge.__table__.c.id == db.bindparam('_id'))
+                .values(initial_points=db.bindparam('_initial'), points=db.case(
+                    (Challenge.__table__.c.scoring == 'static', db.bindparam('_points')),
+                    else_=Challenge.__table__.c.points)),
+                [{'_id': r.id, '_initial': r.initial_points + delta, '_points': r.points + delta} for r in rows],
+            )
+            return {r.id: r.points for r in rows}
+
+        previous = set_points(10)
+        db.session.flush()
+        start = time.perf_counter()
+        for challenge in Challenge.query.filter(Challenge.id.in_(ids)):
+            scoring.revalue_challenge(challenge, previous[challenge.id])
+            db.session.commit()
+        report['bulk']['one_by_one_ms'] = _ms(time.perf_counter() - start)
+
+        previous = set_points(-10)
+        start = time.perf_counter()
+        report['bulk'].update(scoring.revalue_challenges(previous))
+        db.session.commit()
+        report['bulk']['set_based_ms'] = _ms(time.perf_counter() - start)
+
+        scores = dict(db.session.execute(db.select(User.id, User.score)).all())
+        scoring.recalculate_scores()
+        db.session.commit()
+        report['bulk']['matches_full_rescore'] = scores == dict(db.session.execute(db.select(User.id, User.score)).all())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bulk', type=int, default=100, help='challenges in the bulk points change')
+    parser.add_argument('--batch-size', type=int, default=2000, help='submissions per purge transaction')
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark challenge import and export.
+
+    DATABASE_URL=sqlite:///score.db python -m bench.generate_dataset --submissions 1000000 --dynamic 0.8
+    cp score.db import.db
+    DATABASE_URL=sqlite:///import.db python -m bench.challenge_io --challenges 1000
+
+It generates ``--challenges`` rows (static and dynamic, with extra flags and
+hints) and times:
+
+- creating them one at a time, as repeated ``POST /api/admin/challenges``
+  calls do (one ORM insert and commit each); these are deleted again;
+- importing them with ``challenge_io.import_challenges`` (one transaction);
+- importing them again unchanged, then with new titles and points;
+- exporting every challenge as NDJSON.
+
+The existing challenges are then re-imported with higher points, and the
+scores are checked against a full ``recalculate_scores``. The database is
+modified, so work on a copy.
+"""
+import argparse
+import io
+import json
+import random
+import time
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _rows(n, seed):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        row = {
+            'slug': f'import-bench-{i:05d}', 'title': f'Import Bench {i:05d}',
+            'description': 'Imported challenge ' + 'lorem ipsum ' * rng.randint(5, 60),
+            'category': rng.choice(('web', 'crypto', 'pwn', 'reverse', 'misc')),
+            'points': rng.choice((100, 200, 300, 500)), 'flag': f'flag{{import-{i}}}',
+            'flags': [{'type': 'static', 'flag': f'FLAG{{IMPORT-{i}}}', 'case_insensitive': True}],
+            'author': 'bench', 'hint_1': 'Look closer.', 'hint_2': None, 'hint_3': None,
+        }
+        if rng.random() < 0.5:
+            row.update(scoring='linear', minimum_points=50, decay=100)
+        rows.append(row)
+    return rows
+
+
+def _ndjson(rows):
+    return io.BytesIO(b''.join(json.dumps(row).encode() + b'\n' for row in rows))
+
+
+def _import(challenge_io, rows):
+    start = time.perf_counter()
+    report = challenge_io.import_challenges(_ndjson(rows))
+    return {'ms': _ms(time.perf_counter() - start),
+            **{k: report[k] for k in ('created', 'updated', 'unchanged', 'errors')}}
+
+
+def run(args):
+    from app import create_admin_app, db
+    from app.models import Challenge, User
+    from app.utils import challenge_io, scoring
+
+    app = create_admin_app()
+    report = {'challenges': args.challenges}
+    rows = _rows(args.challenges, args.seed)
+    with app.app_context():
+        start = time.perf_counter()
+        for row in rows:
+            challenge = Challenge(**{k: v for k, v in row.items() if k != 'flags'}, initial_points=row['points'],
+                                  solve_count=0, flag_version=1)
+            challenge.set_flags(row['flags'])
+            db.session.add(challenge)
+            db.session.commit()
+        report['one_by_one_create_ms'] = _ms(time.perf_counter() - start)
+        Challenge.query.filter(Challenge.slug.like('import-bench-%')).delete(synchronize_session=False)
+        db.session.commit()
+
+        report['import_create'] = _import(challenge_io, rows)
+        report['import_unchanged'] = _import(challenge_io, rows)
+        for row in rows:
+            row['title'] += ' v2'
+            row['points'] += 50
+        report['import_update'] = _import(challenge_io, rows)
+
+        start = time.perf_counter()
+        size = sum(len(chunk) for chunk in challenge_io.export_ndjson())
+        report['export'] = {'ms': _ms(time.perf_counter() - start), 'bytes': size,
+                            'challenges': db.session.query(Challenge).filter(Challenge.deleted_at.is_(None)).count()}
+
+        # Existing, solved challenges: new values must reach their solvers
+        existing = [row for row in challenge_io.export_rows() if not row['slug'].startswith('import-bench-')]
+        for row in existing:
+            row['points'] += 10
+            if row['initial_points'] is not None:
+                row['initial_points'] += 10
+        report['import_update_solved'] = _import(challenge_io, existing)
+        scores = dict(db.session.execute(db.select(User.id, User.score)).all())
+        scoring.recalculate_scores()
+        db.session.commit()
+        report['matches_full_rescore'] = scores == dict(db.session.execute(db.select(User.id, User.score)).all())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--challenges', type=int, default=1000, help='rows in the generated import')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Compare connection capacity of the threaded and gevent worker modes.
+
+For each WORKER_MODE, starts ``gunicorn -c gunicorn_conf.py wsgi_main:app``
+on a local port. It then opens ``--slow`` connections that trickle request
+headers and never finish them, mimicking slow mobile clients, plus ``--idle``
+keep-alive connections that sit open. Meanwhile ``--concurrency`` client
+threads log in as seeded players and poll ``GET /api/auth/profile``. The JSON
+report gives latency percentiles, throughput and errors per mode. In threaded
+mode every slow client pins a worker thread; in gevent mode it only costs a
+greenlet.
+
+    DATABASE_URL=sqlite:///bench.db python -m bench.concurrency --slow 8 --idle 200 --concurrency 16
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from bench.generate_dataset import PASSWORD, username_for
+from bench.load import HttpTransport, summarize
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def _hold_connections(port, idle, slow, stop):
+    """Open idle keep-alive sockets and slow clients that never finish their headers."""
+    sockets = []
+    for _ in range(idle):
+        try:
+            s = socket.create_connection(('127.0.0.1', port), timeout=5)
+            s.sendall(b'GET / HTTP/1.1\r\nHost: bench\r\n\r\n')
+            sockets.append(s)
+        except OSError:
+            break
+    slow_sockets = []
+    for _ in range(slow):
+        try:
+            s = socket.create_connection(('127.0.0.1', port), timeout=5)
+            s.sendall(b'GET / HTTP/1.1\r\n')
+            slow_sockets.append(s)
+        except OSError:
+            break
+    while not stop.is_set():
+        for s in list(slow_sockets):
+            try:
+                s.sendall(b'X-Slow: 1\r\n')
+            except OSError:
+                slow_sockets.remove(s)
+        stop.wait(1.0)
+    for s in sockets + slow_sockets:
+        s.close()
+    return len(sockets), len(slow_sockets)
+
+
+def run_mode(mode, args):
+    env = dict(os.environ, WORKER_MODE=mode, GUNICORN_BIND=f'127.0.0.1:{args.port}',
+               GUNICORN_WORKERS=str(args.workers), PORT=str(args.port), GUNICORN_TIMEOUT='120')
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_conf.py', 'wsgi_main:app'],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not _wait_for_port(args.port):
+            raise RuntimeError(f'gunicorn ({mode}) did not start')
+        base_url = f'http://127.0.0.1:{args.port}'
+        setup = HttpTransport(base_url)
+        tokens = []
+        for i in range(args.concurrency):
+            status, data = setup.request('POST', '/api/auth/login',
+                                         body={'username': username_for(i), 'password': PASSWORD})
+            if status != 200:
+                raise RuntimeError(f'login failed: {status} {data}')
+            tokens.append(data['data']['access_token'])
+
+        stop = threading.Event()
+        holder = threading.Thread(target=_hold_connections, args=(args.port, args.idle, args.slow, stop), daemon=True)
+        holder.start()
+        time.sleep(1.0)
+
+        samples = defaultdict(list)
+        lock = threading.Lock()
+        deadline = time.monotonic() + args.duration
+
+        def client(token):
+            transport = HttpTransport(base_url)
+            headers = {'Authorization': f'Bearer {token}'}
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    status, _ = transport.request('GET', '/api/auth/profile', headers=headers)
+                    ok = status == 200
+                except Exception:
+                    ok = False
+                with lock:
+                    samples['GET /api/auth/profile'].append((time.perf_counter() - start, ok))
+
+        threads = [threading.Thread(target=client, args=(t,), daemon=True) for t in tokens]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(args.duration + 120)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        holder.join(5)
+        report = summarize(samples, elapsed)
+        report.update({'worker_mode': mode, 'idle_connections': args.idle, 'slow_connections': args.slow})
+        return report
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='threads,gevent')
+    parser.add_argument('--idle', type=int, default=200, help='idle keep-alive connections held open')
+    parser.add_argument('--slow', type=int, default=8, help='clients that never finish sending headers')
+    parser.add_argument('--concurrency', type=int, default=16, help='active polling clients')
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=5050)
+    args = parser.parse_args()
+
+    reports = [run_mode(mode.strip(), args) for mode in args.modes.split(',') if mode.strip()]
+    for r in reports:
+        r.pop('endpoints', None)
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == '__main__':
+    main()
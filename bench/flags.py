@@ -0,0 +1,76 @@
+"""Micro-benchmark flag checking: the old exact comparison vs. cached matchers.
+
+    python -m bench.flags --iterations 200000
+
+Each case checks a wrong submission (the common case) and a correct one
+through ``matchers.get(challenge).matches(...)``, i.e. including the
+per-worker cache lookup. The matcher build time is reported separately; it is
+paid once per challenge and flag_version.
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+
+def _ns(seconds, iterations):
+    return round(seconds / iterations * 1e9)
+
+
+def _time(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return time.perf_counter() - start
+
+
+def _challenge(challenge_id, flags):
+    challenge = SimpleNamespace(id=challenge_id, flag='flag{primary-answer}', flag_version=1,
+                                created_at=datetime(2024, 1, 1))
+    challenge.get_flags = lambda: flags
+    return challenge
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    from app.utils.flags import FlagMatcher, matchers, validate_flags
+
+    cases = {
+        'one_flag': [],
+        '10_static': [f'flag{{alt-{i}}}' for i in range(10)],
+        '10_case_insensitive': [{'type': 'static', 'flag': f'FLAG{{Alt-{i}}}', 'case_insensitive': True}
+                                for i in range(10)],
+        '50_patterns': [{'type': 'regex', 'flag': rf'flag\{{team{i}-[0-9a-f]{{8}}\}}'} for i in range(50)],
+        'mixed_24': ([f'flag{{alt-{i}}}' for i in range(8)]
+                     + [{'type': 'static', 'flag': f'FLAG{{Alt-{i}}}', 'case_insensitive': True} for i in range(8)]
+                     + [{'type': 'regex', 'flag': rf'flag\{{team{i}-[0-9a-f]{{8}}\}}', 'case_insensitive': True}
+                        for i in range(8)]),
+    }
+    wrong, right = 'FLAG{guess-123456}', ' flag{primary-answer} '
+    stored = 'flag{primary-answer}'
+    report = {'legacy_exact': {
+        'wrong_ns': _ns(_time(lambda: stored.strip() == wrong.strip(), n), n),
+        'correct_ns': _ns(_time(lambda: stored.strip() == right.strip(), n), n),
+    }}
+    for challenge_id, (name, flags) in enumerate(cases.items(), start=1):
+        flags, _ = validate_flags(flags)
+        challenge = _challenge(challenge_id, flags)
+        start = time.perf_counter()
+        FlagMatcher(challenge.flag, flags)
+        build = time.perf_counter() - start
+        matchers.get(challenge)
+        report[name] = {
+            'build_us': round(build * 1e6, 1),
+            'wrong_ns': _ns(_time(lambda: matchers.get(challenge).matches(wrong), n), n),
+            'correct_ns': _ns(_time(lambda: matchers.get(challenge).matches(right), n), n),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Seed a database with a realistic, reproducible CTF dataset.
+
+Usage:
+    DATABASE_URL=postgresql+pg8000://... python -m bench.generate_dataset \\
+        --users 10000 --challenges 300 --submissions 2000000 --seed 42
+
+All players share the password ``bench-password`` (hashed once) so the load
+driver can log in as any of them. Flags are derived from the challenge title
+with ``flag_for`` so the driver can submit correct answers. Rows are written
+with batched Core inserts, so the ORM is not involved and memory stays flat.
+``--dynamic`` gives that share of challenges linear or logarithmic decay.
+``--shared-guesses`` makes that share of wrong answers come from a few
+leaked wrong flags per challenge, for the flag-sharing detector.
+Scores, solve counts and score history are then derived with
+``scoring.recalculate_scores``.
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+PASSWORD = "bench-password"
+ADMIN_USERNAME = "bench_admin"
+CATEGORIES = ("web", "crypto", "pwn", "reverse", "forensics", "misc", "osint")
+POINT_TIERS = (50, 100, 200, 300, 400, 500)
+
+
+def username_for(index: int) -> str:
+    return f"player{index:05d}"
+
+
+def challenge_title(index: int) -> str:
+    return f"Bench Challenge {index:04d}"
+
+
+def flag_for(title: str) -> str:
+    return "FLAG{" + title.lower().replace(" ", "-") + "}"
+
+
+def _insert(conn, table, rows):
+    if rows:
+        conn.execute(table.insert(), rows)
+
+
+def generate(users, challenges, submissions, seed, hours, batch_size, wrong_ratio, dynamic=0.0, shared_guesses=0.0):
+    import init_db
+    from app import create_admin_app, db, init_migrations
+    from app.models import User, Challenge, Submission
+    from app.utils import scoring
+
+    rng = random.Random(seed)
+    app = create_admin_app()
+    init_migrations(app)
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=hours)
+    span = hours * 3600.0
+    password_hash = generate_password_hash(PASSWORD)
+
+    with app.app_context():
+        # The migrated schema, with the same indexes as production
+        init_db.migrate_database()
+        engine = db.engine
+        t0 = time.perf_counter()
+
+        with engine.begin() as conn:
+            _insert(conn, User.__table__, [{
+                'username': ADMIN_USERNAME, 'email': f'{ADMIN_USERNAME}@bench.local',
+                'password_hash': password_hash, 'is_admin': True, 'created_at': start,
+            }])
+            for offset in range(0, users, batch_size):
+                _insert(conn, User.__table__, [{
+                    'username': username_for(i), 'email': f'{username_for(i)}@bench.local',
+                    'password_hash': password_hash, 'is_admin': False,
+                    'created_at': start + timedelta(seconds=rng.random() * span * 0.1),
+                } for i in range(offset, min(offset + batch_size, users))])
+
+            # Difficulty in [0, 1): higher tiers are harder and attract fewer solves
+            difficulty = []
+            rows = []
+            for i in range(challenges):
+                tier = min(int(rng.betavariate(1.5, 2.5) * len(POINT_TIERS)), len(POINT_TIERS) - 1)
+                difficulty.append((tier + rng.random()) / len(POINT_TIERS))
+                title = challenge_title(i)
+                points = POINT_TIERS[tier]
+                row = {
+                    'slug': f'bench-challenge-{i:04d}', 'title': title, 'description': f'Synthetic challenge {i} ' + 'lorem ipsum ' * rng.randint(5, 60),
+                    'category': CATEGORIES[i % len(CATEGORIES)], 'points': points,
+                    'flag': flag_for(title), 'author': 'bench', 'is_active': True,
+                    'created_at': start, 'updated_at': start,
+                    'hint_1': 'Look closer.' if rng.random() < 0.5 else None,
+                    'scoring': 'static', 'initial_points': points, 'minimum_points': None, 'decay': None,
+                }
+                if rng.random() < dynamic:
+                    row.update(scoring=rng.choice(('linear', 'logarithmic')), minimum_points=max(points // 5, 10),
+                               decay=rng.choice((25, 50, 100, 200)))
+                rows.append(row)
+            _insert(conn, Challenge.__table__, rows)
+
+        with engine.connect() as conn:
+            user_ids = [r[0] for r in conn.execute(
+                db.select(User.id).where(User.is_admin.is_(False)).order_by(User.id))]
+            challenge_ids = [r[0] for r in conn.execute(db.select(Challenge.id).order_by(Challenge.id))]
+
+        # Heavy-tailed activity: a few players generate most of the traffic
+        activity = [rng.paretovariate(1.3) for _ in user_ids]
+        total_activity = sum(activity)
+        skill = [rng.betavariate(2, 2) for _ in user_ids]
+        # Easy challenges are attempted far more often than hard ones
+        popularity = [math.exp(-3 * d) for d in difficulty]
+
+        written = 0
+        batch = []
+        with engine.begin() as conn:
+            for u, user_id in enumerate(user_ids):
+                attempts = max(1, round(submissions * activity[u] / total_activity))
+                times = sorted(rng.betavariate(1.3, 2.5) * span for _ in range(attempts))
+                picks = rng.choices(range(len(challenge_ids)), weights=popularity, k=attempts)
+                solved = set()
+                for at, c in zip(times, picks):
+                    if written >= submissions:
+                        break
+                    p_correct = (1 - wrong_ratio) * max(0.05, 1.0 - difficulty[c] + skill[u] - 0.5)
+                    is_correct = c not in solved and rng.random() < p_correct
+                    if is_correct:
+                        solved.add(c)
+                        flag = flag_for(challenge_title(c))
+                    elif shared_guesses and rng.random() < shared_guesses:
+                        flag = f'FLAG{{leak-{c}-{rng.randrange(3)}}}'
+                    else:
+                        flag = f'FLAG{{guess-{rng.randrange(10 ** 6)}}}'
+                    batch.append({
+                        'user_id': user_id, 'challenge_id': challenge_ids[c],
+                        'submitted_flag': flag, 'flag_hash': Submission.hash_flag(flag),
+                        'is_correct': is_correct,
+                        'submitted_at': start + timedelta(seconds=at),
+                    })
+                    written += 1
+                    if len(batch) >= batch_size:
+                        _insert(conn, Submission.__table__, batch)
+                        batch = []
+            _insert(conn, Submission.__table__, batch)
+
+        scoring.recalculate_scores()
+        db.session.commit()
+
+        elapsed = time.perf_counter() - t0
+        print(f"Seeded {len(user_ids)} users, {len(challenge_ids)} challenges, {written} submissions in {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--challenges', type=int, default=300)
+    parser.add_argument('--submissions', type=int, default=2000000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--hours', type=float, default=48, help='event length used to spread timestamps')
+    parser.add_argument('--wrong-ratio', type=float, default=0.6,
+                        help='baseline share of attempts that are wrong regardless of skill')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--dynamic', type=float, default=0.0,
+                        help='share of challenges with decaying (linear/logarithmic) scoring')
+    parser.add_argument('--shared-guesses', type=float, default=0.0,
+                        help='share of wrong answers drawn from a few leaked wrong flags per challenge')
+    args = parser.parse_args()
+    generate(args.users, args.challenges, args.submissions, args.seed, args.hours, args.batch_size, args.wrong_ratio,
+             args.dynamic, args.shared_guesses)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Compare the legacy and fast response serialization paths.
+
+Serializes the first ``--rows`` submissions of the database in DATABASE_URL
+(seed it with bench.generate_dataset) the way ``/api/submissions/all``
+used to, with ORM objects, ``to_dict`` and stdlib ``jsonify``, and the way it
+does now, with a column query, ``rows_to_dicts`` and the configured encoder.
+
+    DATABASE_URL=sqlite:///bench.db python -m bench.json_bench --rows 50000
+"""
+import argparse
+import json
+import statistics
+import time
+
+from bench.load import percentile
+
+
+def _time(fn, repeat):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(fn())
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {'median_ms': round(statistics.median(timings), 2), 'p95_ms': round(percentile(timings, 95), 2), 'bytes': size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_admin_app, db
+    from app.models import Submission
+    from app.utils import serialization
+
+    app = create_admin_app()
+    legacy = DefaultJSONProvider(app)
+
+    with app.app_context():
+        def legacy_path():
+            rows = Submission.query.order_by(Submission.id).limit(args.rows).all()
+            return legacy.dumps({'success': True, 'message': 'Success', 'data': [r.to_dict() for r in rows]})
+
+        def column_rows():
+            result = db.session.execute(
+                db.select(*Submission.dict_columns()).order_by(Submission.id).limit(args.rows))
+            return serialization.rows_to_dicts(result.keys(), result)
+
+        def fast_path():
+            return serialization.dumps({'success': True, 'message': 'Success', 'data': column_rows()})
+
+        def stdlib_columns():
+            return json.dumps({'success': True, 'message': 'Success', 'data': column_rows()},
+                              default=serialization._default, separators=(',', ':'))
+
+        cached = serialization.PreEncoded(serialization.dumps(column_rows()))
+
+        def pre_encoded():
+            return serialization.encode_envelope(True, 'Success', cached)
+
+        report = {
+            'rows': args.rows,
+            'orjson_available': serialization.orjson is not None,
+            'legacy_orm_to_dict_stdlib': _time(legacy_path, args.repeat),
+            'columns_stdlib': _time(stdlib_columns, args.repeat),
+            'columns_fast_encoder': _time(fast_path, args.repeat),
+            'pre_encoded_envelope': _time(pre_encoded, args.repeat),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""Scripted load driver for the main and admin APIs.
+
+Runs scenarios either in-process against ``wsgi_main``/``wsgi_admin`` through
+Flask test clients, or over HTTP against running servers, and prints a JSON
+report with throughput and p50/p95/p99 latency per endpoint. Save reports with
+``--output`` and compare them between runs.
+
+Examples:
+    # in-process against the database in DATABASE_URL (seeded by bench.generate_dataset)
+    python -m bench.load --scenario mixed --duration 30 --concurrency 16
+
+    # over localhost against gunicorn
+    python -m bench.load --main-url http://127.0.0.1:5000 --admin-url http://127.0.0.1:5001 \\
+        --scenario leaderboard_poll --duration 60 --concurrency 64 --output run.json
+
+Scenarios: login_storm, submit_spray, leaderboard_poll, admin_dashboard, mixed.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from bench.generate_dataset import ADMIN_USERNAME, PASSWORD, flag_for, username_for
+
+SCENARIOS = {
+    'login_storm': {'login': 1},
+    'submit_spray': {'submit': 1},
+    'leaderboard_poll': {'leaderboard': 1},
+    'admin_dashboard': {'admin_challenges': 3, 'admin_challenge_stats': 5, 'all_submissions': 1},
+    'mixed': {'login': 1, 'submit': 10, 'leaderboard': 6, 'challenges': 6, 'stats': 3,
+              'admin_challenges': 1, 'admin_challenge_stats': 1},
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    # The smallest value with at least pct% of the samples at or below it
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct * len(sorted_values) / 100.0) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples, elapsed):
+    """Build the per-endpoint report from {endpoint: [(latency_s, ok), ...]}."""
+    endpoints = {}
+    all_latencies = []
+    total_errors = 0
+    for name, values in sorted(samples.items()):
+        latencies = sorted(v[0] * 1000 for v in values)
+        errors = sum(1 for v in values if not v[1])
+        total_errors += errors
+        all_latencies.extend(latencies)
+        endpoints[name] = {
+            'requests': len(values),
+            'errors': errors,
+            'throughput_rps': round(len(values) / elapsed, 2) if elapsed else None,
+            'p50_ms': _round(percentile(latencies, 50)),
+            'p95_ms': _round(percentile(latencies, 95)),
+            'p99_ms': _round(percentile(latencies, 99)),
+            'max_ms': _round(latencies[-1] if latencies else None),
+        }
+    all_latencies.sort()
+    return {
+        'requests': len(all_latencies),
+        'errors': total_errors,
+        'throughput_rps': round(len(all_latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': _round(percentile(all_latencies, 50)),
+        'p95_ms': _round(percentile(all_latencies, 95)),
+        'p99_ms': _round(percentile(all_latencies, 99)),
+        'endpoints': endpoints,
+    }
+
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+# Transports: both expose request(method, path, body=None, headers=None) -> (status, json)
+
+class HttpTransport:
+    """Keep-alive HTTP connection (one per worker thread)."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._factory = lambda: cls(parts.hostname, parts.port, timeout=60)
+        self._conn = self._factory()
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self._conn.request(method, path, body=payload, headers=headers)
+            resp = self._conn.getresponse()
+            data = resp.read()
+        except (http.client.HTTPException, OSError):
+            self._conn.close()
+            self._conn = self._factory()
+            raise
+        return resp.status, _decode(data)
+
+
+class InProcessTransport:
+    """Flask test client bound to an app object."""
+
+    def __init__(self, app, base_url):
+        self._client = app.test_client()
+        self._base_url = base_url
+
+    def request(self, method, path, body=None, headers=None):
+        resp = self._client.open(path, method=method, json=body, headers=headers, base_url=self._base_url)
+        return resp.status_code, _decode(resp.get_data())
+
+
+def _decode(data):
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+class LoadRunner:
+    def __init__(self, main_factory, admin_factory, users, concurrency, duration, scenario, seed):
+        self.main_factory = main_factory
+        self.admin_factory = admin_factory
+        self.users = users
+        self.concurrency = concurrency
+        self.duration = duration
+        self.weights = SCENARIOS[scenario]
+        self.scenario = scenario
+        self.rng = random.Random(seed)
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+        self.tokens = []
+        self.admin_token = None
+        self.challenges = []
+
+    def _timed(self, name, transport, method, path, body=None, token=None, ok_statuses=(200,)):
+        headers = {'Authorization': f'Bearer {token}'} if token else None
+        start = time.perf_counter()
+        try:
+            status, data = transport.request(method, path, body=body, headers=headers)
+            ok = status in ok_statuses
+        except Exception:
+            status, data, ok = None, None, False
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples[name].append((elapsed, ok))
+        return status, data
+
+    def _login(self, transport, username):
+        status, data = transport.request('POST', '/api/auth/login', body={'username': username, 'password': PASSWORD})
+        if status != 200:
+            raise RuntimeError(f'login failed for {username}: {status} {data}')
+        return data['data']['access_token']
+
+    def prepare(self):
+        """Log in a pool of players and the admin, and fetch challenge metadata."""
+        main = self.main_factory()
+        pool = min(self.users, max(self.concurrency * 4, 32))
+        for i in self.rng.sample(range(self.users), pool):
+            self.tokens.append(self._login(main, username_for(i)))
+        status, data = main.request('GET', '/api/challenges/', headers={'Authorization': f'Bearer {self.tokens[0]}'})
+        if status != 200:
+            raise RuntimeError(f'could not list challenges: {status}')
+        self.challenges = [(c['id'], c['title']) for c in data['data']]
+        try:
+            self.admin_token = self._login(self.admin_factory(), ADMIN_USERNAME)
+        except Exception:
+            self.admin_token = None
+
+    def _action(self, name, main, admin, rng):
+        token = rng.choice(self.tokens)
+        if name == 'login':
+            self._timed('POST /api/auth/login', main, 'POST', '/api/auth/login',
+                        body={'username': username_for(rng.randrange(self.users)), 'password': PASSWORD})
+        elif name == 'submit':
+            challenge_id, title = rng.choice(self.challenges)
+            flag = flag_for(title) if rng.random() < 0.1 else f'FLAG{{spray-{rng.randrange(10 ** 9)}}}'
+            self._timed('POST /api/submissions/', main, 'POST', '/api/submissions/',
+                        body={'challenge_id': challenge_id, 'flag': flag}, token=token, ok_statuses=(200, 400))
+        elif name == 'leaderboard':
+            self._timed('GET /api/submissions/leaderboard', main, 'GET', '/api/submissions/leaderboard', token=token)
+        elif name == 'challenges':
+            self._timed('GET /api/challenges/', main, 'GET', '/api/challenges/', token=token)
+        elif name == 'stats':
+            self._timed('GET /api/submissions/stats', main, 'GET', '/api/submissions/stats', token=token)
+        elif name == 'all_submissions' and self.admin_token:
+            self._timed('GET /api/submissions/all', main, 'GET', '/api/submissions/all', token=self.admin_token)
+        elif name == 'admin_challenges' and self.admin_token:
+            self._timed('GET /api/admin/challenges', admin, 'GET', '/api/admin/challenges', token=self.admin_token)
+        elif name == 'admin_challenge_stats' and self.admin_token:
+            challenge_id, _ = rng.choice(self.challenges)
+            self._timed('GET /api/admin/challenges/<id>/stats', admin, 'GET',
+                        f'/api/admin/challenges/{challenge_id}/stats', token=self.admin_token)
+
+    def _worker(self, seed, deadline):
+        rng = random.Random(seed)
+        main = self.main_factory()
+        admin = self.admin_factory()
+        names = list(self.weights)
+        weights = [self.weights[n] for n in names]
+        while time.monotonic() < deadline:
+            self._action(rng.choices(names, weights=weights)[0], main, admin, rng)
+
+    def run(self):
+        self.prepare()
+        deadline = time.monotonic() + self.duration
+        threads = [threading.Thread(target=self._worker, args=(self.rng.random(), deadline), daemon=True)
+                   for _ in range(self.concurrency)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        report = summarize(self.samples, elapsed)
+        report.update({
+            'scenario': self.scenario,
+            'concurrency': self.concurrency,
+            'duration_s': round(elapsed, 3),
+            'git_revision': _git_revision(),
+            'started_at': datetime.utcnow().isoformat(),
+        })
+        return report
+
+
+def build_factories(args):
+    if args.main_url:
+        admin_url = args.admin_url or args.main_url
+        return (lambda: HttpTransport(args.main_url)), (lambda: HttpTransport(admin_url))
+    from wsgi_main import app as main_app
+    from wsgi_admin import app as admin_app
+    admin_base = f"http://localhost:{os.environ.get('ADMIN_PORT', '5001')}"
+    main_base = f"http://localhost:{os.environ.get('PORT', '5000')}"
+    return (lambda: InProcessTransport(main_app, main_base)), (lambda: InProcessTransport(admin_app, admin_base))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--users', type=int, default=10000, help='number of seeded players to draw from')
+    parser.add_argument('--main-url', help='base URL of the main API; in-process when omitted')
+    parser.add_argument('--admin-url', help='base URL of the admin API')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report to this file as well')
+    args = parser.parse_args()
+
+    if not args.main_url:
+        os.environ.setdefault('PORT', '5000')
+        os.environ.setdefault('ADMIN_PORT', '5001')
+    main_factory, admin_factory = build_factories(args)
+    runner = LoadRunner(main_factory, admin_factory, args.users, args.concurrency, args.duration, args.scenario, args.seed)
+    report = runner.run()
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Upload a large attachment through the admin multipart API and report throughput.
+
+Splits ``--file``, or ``--size`` bytes of random data, into the part size the
+server picks (or ``--part-size``). It asks the admin API for presigned part
+URLs and PUTs the parts to S3 from ``--concurrency`` threads, retrying each
+part up to ``--retries`` times, then completes the upload. ``--resume KEY
+UPLOAD_ID`` lists the parts S3 already has and sends only the missing ones.
+Run it against S3 or a local stand-in (S3_ENDPOINT_URL on the admin API, e.g.
+``moto_server`` or MinIO) to compare part sizes and concurrency levels.
+
+    python -m bench.multipart_upload --base-url http://localhost:5001 \\
+        --token "$ADMIN_TOKEN" --size 1073741824 --concurrency 8
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from bench.load import HttpTransport
+
+
+def _api(transport, method, path, token, body=None):
+    status, data = transport.request(method, path, body=body, headers={'Authorization': f'Bearer {token}'})
+    if status >= 300:
+        raise RuntimeError(f'{method} {path}: {status} {data}')
+    return data.get('data')
+
+
+def _put_part(url, path, offset, length, retries):
+    parts = urlsplit(url)
+    cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    target = parts.path + ('?' + parts.query if parts.query else '')
+    for attempt in range(retries + 1):
+        conn = cls(parts.hostname, parts.port, timeout=300)
+        try:
+            with open(path, 'rb') as fh:
+                fh.seek(offset)
+                body = fh.read(length)
+            conn.request('PUT', target, body=body, headers={'Content-Length': str(length)})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status == 200:
+                return resp.getheader('ETag')
+            error = f'HTTP {resp.status}'
+        except (http.client.HTTPException, OSError) as e:
+            error = str(e)
+        finally:
+            conn.close()
+        time.sleep(min(2 ** attempt, 10))
+    raise RuntimeError(f'part upload failed after {retries + 1} attempts: {error}')
+
+
+def upload(args, path):
+    size = os.path.getsize(path)
+    transport = HttpTransport(args.base_url)
+    if args.resume:
+        key, upload_id = args.resume
+        done = {p['part_number']: p for p in _api(
+            transport, 'GET', f'/api/admin/storage/multipart/parts?key={key}&upload_id={upload_id}', args.token)['parts']}
+        part_size = args.part_size or max((p['size'] for p in done.values()), default=0)
+        if not part_size:
+            raise SystemExit('--part-size is required to resume an upload with no parts yet')
+    else:
+        started = _api(transport, 'POST', '/api/admin/storage/multipart', args.token,
+                       {'filename': os.path.basename(args.file or 'bench.bin'), 'size': size})
+        key, upload_id = started['key'], started['upload_id']
+        part_size = args.part_size or started['part_size']
+        done = {}
+        print(json.dumps({'key': key, 'upload_id': upload_id, 'part_size': part_size}))
+
+    part_count = -(-size // part_size)
+    missing = [n for n in range(1, part_count + 1) if n not in done]
+    etags = {n: p['etag'] for n, p in done.items()}
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def send(batch_urls):
+        for n, url in batch_urls:
+            offset = (n - 1) * part_size
+            etag = _put_part(url, path, offset, min(part_size, size - offset), args.retries)
+            with lock:
+                etags[n] = etag
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        futures = []
+        for i in range(0, len(missing), args.batch):
+            batch = missing[i:i + args.batch]
+            urls = _api(transport, 'POST', '/api/admin/storage/multipart/parts', args.token,
+                        {'key': key, 'upload_id': upload_id, 'part_numbers': batch})['parts']
+            futures.extend(pool.submit(send, [(u['part_number'], u['upload_url'])]) for u in urls)
+        for f in futures:
+            f.result()
+    upload_seconds = time.perf_counter() - start
+
+    completed = _api(transport, 'POST', '/api/admin/storage/multipart/complete', args.token, {
+        'key': key, 'upload_id': upload_id,
+        'parts': [{'part_number': n, 'etag': e} for n, e in sorted(etags.items())],
+    })
+    sent = sum(min(part_size, size - (n - 1) * part_size) for n in missing)
+    return {
+        's3_url': completed['s3_url'],
+        'size_bytes': size,
+        'part_size': part_size,
+        'parts': part_count,
+        'parts_sent': len(missing),
+        'concurrency': args.concurrency,
+        'seconds': round(upload_seconds, 2),
+        'mb_per_second': round(sent / (1024 * 1024) / upload_seconds, 1) if upload_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5001')
+    parser.add_argument('--token', required=True, help='admin JWT')
+    parser.add_argument('--file', help='file to upload (default: random data of --size bytes)')
+    parser.add_argument('--size', type=int, default=256 * 1024 * 1024)
+    parser.add_argument('--part-size', type=int, help='override the server-chosen part size')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=100, help='part URLs requested per API call')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--resume', nargs=2, metavar=('KEY', 'UPLOAD_ID'))
+    args = parser.parse_args()
+
+    if args.file:
+        print(json.dumps(upload(args, args.file), indent=2))
+        return
+    with tempfile.NamedTemporaryFile(suffix='.bin') as tmp:
+        remaining = args.size
+        while remaining:
+            chunk = os.urandom(min(remaining, 8 * 1024 * 1024))
+            tmp.write(chunk)
+            remaining -= len(chunk)
+        tmp.flush()
+        print(json.dumps(upload(args, tmp.name), indent=2))
+
+
+if __name__ == '__main__':
+    main()
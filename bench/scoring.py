@@ -0,0 +1,181 @@
+"""Benchmark score maintenance under dynamic scoring.
+
+Seed first (10k players, 300 challenges, most of them decaying):
+
+    DATABASE_URL=postgresql+pg8000://... python -m bench.generate_dataset \\
+        --users 10000 --challenges 300 --submissions 2000000 --dynamic 0.8
+    DATABASE_URL=postgresql+pg8000://... python -m bench.scoring --solves 500
+
+It reports:
+
+- ``leaderboard``: the indexed read of ``users.score``, and the old per-player
+  loop (one query per player and per solve) unless ``--skip-legacy``;
+- ``solve``: latency of ``--solves`` new correct submissions on random dynamic
+  challenges, committed one at a time, with the number of earlier solvers
+  whose score each UPDATE adjusted;
+- ``timeline``: score-over-time for the top 10 players from the precomputed
+  buckets, and from a replay of every correct submission in time order;
+- ``full_rescore``: ``recalculate_scores`` (including the history rebuild),
+  i.e. what rescanning every score on each solve would cost.
+
+With ``--verify`` (on by default) the scores left by the incremental updates
+and history buckets are compared against a full rebuild afterwards. The solves are committed, so
+re-seed to get back to the original dataset.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'p50_ms': _ms(samples[len(samples) // 2]),
+        'p95_ms': _ms(samples[int(len(samples) * 0.95)]),
+        'max_ms': _ms(samples[-1]),
+        'mean_ms': _ms(statistics.fmean(samples)),
+    }
+
+
+def legacy_leaderboard(db, User, Submission, Challenge):
+    """The previous get_leaderboard: a query per player plus one per solve."""
+    leaderboard = []
+    for user in User.query.filter_by(is_admin=False).all():
+        solves = Submission.query.filter_by(user_id=user.id, is_correct=True).all()
+        score = 0
+        for submission in solves:
+            challenge = Challenge.query.get(submission.challenge_id)
+            if challenge:
+                score += challenge.points
+        leaderboard.append({'id': user.id, 'username': user.username, 'score': score,
+                            'solved_challenges': len(solves)})
+    leaderboard.sort(key=lambda x: x['score'], reverse=True)
+    return leaderboard
+
+
+def replay_timelines(db, User, Submission, Challenge, user_ids):
+    """Score-over-time without buckets: scan solves in time order and replay them."""
+    wanted = set(user_ids)
+    totals, timelines = {}, {u: [] for u in user_ids}
+    for user_id, submitted_at, points in db.session.execute(
+        db.select(Submission.user_id, Submission.submitted_at, Challenge.points)
+        .join(Challenge, Challenge.id == Submission.challenge_id)
+        .where(Submission.is_correct.is_(True)).order_by(Submission.submitted_at)
+    ):
+        if user_id in wanted:
+            totals[user_id] = totals.get(user_id, 0) + points
+            timelines[user_id].append((submitted_at, totals[user_id]))
+    return timelines
+
+
+def run(args):
+    from app import create_admin_app, db
+    from app.models import User, Challenge, Submission, ScoreBucket
+    from app.utils import scoring, score_history
+
+    rng = random.Random(args.seed)
+    app = create_admin_app()
+    report = {}
+    with app.app_context():
+        report['users'] = db.session.execute(db.select(db.func.count(User.id))).scalar()
+        report['challenges'] = db.session.execute(db.select(db.func.count(Challenge.id))).scalar()
+        report['submissions'] = db.session.execute(db.select(db.func.count(Submission.id))).scalar()
+
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            rows = db.session.execute(
+                db.select(User.id, User.username, User.score, User.solve_count)
+                .where(User.is_admin.is_(False)).order_by(User.score.desc(), User.id)
+            ).all()
+            timings.append(time.perf_counter() - start)
+        report['leaderboard'] = {'rows': len(rows), 'denormalized': _summary(timings)}
+        if not args.skip_legacy:
+            start = time.perf_counter()
+            legacy_leaderboard(db, User, Submission, Challenge)
+            report['leaderboard']['legacy_ms'] = _ms(time.perf_counter() - start)
+            db.session.remove()
+
+        top = db.session.execute(
+            db.select(User.id).where(User.is_admin.is_(False)).order_by(User.score.desc(), User.id).limit(10)
+        ).scalars().all()
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            charts = score_history.timelines(top)
+            timings.append(time.perf_counter() - start)
+        report['timeline'] = {'players': len(charts), 'points': sum(len(p['timeline']) for p in charts),
+                              'buckets': _summary(timings)}
+        start = time.perf_counter()
+        replay_timelines(db, User, Submission, Challenge, top)
+        report['timeline']['replay_ms'] = _ms(time.perf_counter() - start)
+
+        dynamic = [c for (c,) in db.session.execute(
+            db.select(Challenge.id).where(Challenge.scoring != 'static'))]
+        if not dynamic:
+            raise SystemExit('No dynamic challenges; seed with bench.generate_dataset --dynamic 0.8')
+        players = [u for (u,) in db.session.execute(db.select(User.id).where(User.is_admin.is_(False)))]
+
+        timings, adjusted = [], []
+        done = 0
+        while done < args.solves:
+            user_id, challenge_id = rng.choice(players), rng.choice(dynamic)
+            already = db.session.execute(
+                db.select(Submission.id).where(Submission.user_id == user_id, Submission.challenge_id == challenge_id,
+                                               Submission.is_correct.is_(True)).limit(1)
+            ).first()
+            if already:
+                continue
+            solvers = db.session.execute(db.select(Challenge.solve_count).where(Challenge.id == challenge_id)).scalar()
+            start = time.perf_counter()
+            db.session.add(Submission(user_id=user_id, challenge_id=challenge_id, submitted_flag='bench',
+                                      is_correct=True))
+            db.session.flush()
+            scoring.record_solve(challenge_id, user_id)
+            db.session.commit()
+            timings.append(time.perf_counter() - start)
+            adjusted.append(solvers)
+            done += 1
+        report['solve'] = _summary(timings)
+        report['solve']['earlier_solvers_mean'] = round(statistics.fmean(adjusted), 1)
+        report['solve']['earlier_solvers_max'] = max(adjusted)
+
+        before = None
+        if args.verify:
+            before = (dict(db.session.execute(db.select(User.id, User.score)).all()),
+                      set(db.session.execute(db.select(ScoreBucket.user_id, ScoreBucket.bucket, ScoreBucket.points,
+                                                       ScoreBucket.solves)).all()))
+        start = time.perf_counter()
+        scoring.recalculate_scores()
+        db.session.commit()
+        report['full_rescore_ms'] = _ms(time.perf_counter() - start)
+        if args.verify:
+            after = (dict(db.session.execute(db.select(User.id, User.score)).all()),
+                     set(db.session.execute(db.select(ScoreBucket.user_id, ScoreBucket.bucket, ScoreBucket.points,
+                                                      ScoreBucket.solves)).all()))
+            mismatched = [u for u in after[0] if after[0][u] != before[0].get(u)]
+            report['verify'] = {'mismatched_users': len(mismatched),
+                                'mismatched_buckets': len(after[1] ^ before[1])}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--solves', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20, help='leaderboard reads to time')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--skip-legacy', action='store_true', help='do not time the old per-player leaderboard')
+    parser.add_argument('--no-verify', dest='verify', action='store_false')
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
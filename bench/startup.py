@@ -0,0 +1,125 @@
+"""Measure cold-start time and per-worker memory of the WSGI entrypoints.
+
+Two measurements:
+
+- ``import``: import ``wsgi_main`` in a fresh interpreter ``--runs`` times and
+  report the median import time and peak RSS.
+- ``gunicorn``: boot ``gunicorn -c gunicorn_conf.py wsgi_main:app`` with
+  ``--workers`` workers, with and without ``GUNICORN_PRELOAD``. Report the time
+  until ``/health`` answers and the RSS/PSS/private memory of each worker,
+  read from /proc/<pid>/smaps_rollup (Linux only).
+
+``--project`` points at another checkout, e.g. a ``git worktree`` of an older
+commit, so before/after numbers come from the same script.
+
+    DATABASE_URL=sqlite:///bench.db python -m bench.startup --workers 4
+"""
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+IMPORT_PROBE = (
+    "import time, resource, json; t = time.perf_counter(); import wsgi_main; "
+    "print(json.dumps({'seconds': time.perf_counter() - t, "
+    "'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))"
+)
+
+
+def measure_import(project, runs):
+    seconds, rss = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=project, capture_output=True, text=True, check=True)
+        data = json.loads(out.stdout.strip().splitlines()[-1])
+        seconds.append(data['seconds'])
+        rss.append(data['maxrss_kb'])
+    return {
+        'median_import_ms': round(statistics.median(seconds) * 1000, 1),
+        'median_maxrss_mb': round(statistics.median(rss) / 1024, 1),
+    }
+
+
+def _smaps(pid):
+    values = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as fh:
+            for line in fh:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].rstrip(':') in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    values[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+    return values
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as fh:
+            return [int(p) for p in fh.read().split()]
+    except OSError:
+        return []
+
+
+def measure_gunicorn(project, workers, port, preload):
+    env = dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKERS=str(workers),
+               GUNICORN_PRELOAD='true' if preload else 'false')
+    cmd = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'wsgi_main:app']
+    if os.path.exists(os.path.join(project, 'gunicorn_conf.py')):
+        cmd[3:3] = ['-c', 'gunicorn_conf.py']
+    if preload:
+        cmd.insert(3, '--preload')
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=project, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = None
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=2).read()
+                ready = time.perf_counter() - start
+                break
+            except Exception:
+                time.sleep(0.05)
+        # Let every worker finish booting before sampling memory
+        time.sleep(2)
+        samples = [s for s in (_smaps(pid) for pid in _children(proc.pid)) if s]
+        result = {'preload': preload, 'workers': len(samples),
+                  'ready_ms': round(ready * 1000, 1) if ready is not None else None}
+        if samples:
+            for field, key in (('Rss', 'avg_worker_rss_mb'), ('Pss', 'avg_worker_pss_mb')):
+                result[key] = round(statistics.mean(s.get(field, 0) for s in samples) / 1024, 1)
+            result['avg_worker_private_mb'] = round(statistics.mean(
+                s.get('Private_Clean', 0) + s.get('Private_Dirty', 0) for s in samples) / 1024, 1)
+        return result
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--project', default=os.getcwd(), help='checkout to measure')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5060)
+    args = parser.parse_args()
+
+    report = {
+        'project': os.path.abspath(args.project),
+        'import': measure_import(args.project, args.runs),
+        'gunicorn': [measure_gunicorn(args.project, args.workers, args.port, preload)
+                     for preload in (False, True)],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
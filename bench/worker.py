@@ -0,0 +1,108 @@
+"""Measure SQS worker throughput against a real queue or a local stand-in.
+
+Creates a scratch queue, publishes ``--messages`` synthetic submission
+events with SendMessageBatch, then runs the worker in-process until all of
+them are processed, and deletes the queue. With the default ``--handlers
+sleep`` each message takes ``--handler-delay`` seconds, which shows how
+concurrency hides handler latency. Make a batch (10 x ``--handler-delay``) take longer than half of
+``--visibility-timeout`` to exercise the visibility heartbeat. Any
+WORKER_HANDLERS spec works as well (e.g. ``s3_log,first_solver`` with
+LOG_BUCKET set).
+
+    moto_server -p 5055 &
+    SQS_ENDPOINT_URL=http://127.0.0.1:5055 AWS_DEFAULT_REGION=us-east-1 \\
+    AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=y \\
+        python -m bench.worker --messages 2000 --concurrency 8
+"""
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+
+from app.utils.aws import get_sqs_client
+from app.worker import Consumer, Handler, build_handlers
+
+
+class SleepHandler(Handler):
+    name = 'sleep'
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def handle_batch(self, messages):
+        time.sleep(self.delay * len(messages))
+        return set()
+
+
+def _publish(sqs, queue_url, count):
+    now = datetime.datetime.utcnow()
+    for start in range(0, count, 10):
+        entries = []
+        for i in range(start, min(start + 10, count)):
+            correct = random.random() < 0.2
+            entries.append({'Id': str(i), 'MessageBody': json.dumps({
+                'event': 'challenge_solved' if correct else 'flag_submission',
+                'submission_id': i + 1,
+                'user_id': random.randint(1, 500),
+                'username': f'user{i % 500}',
+                'challenge_id': random.randint(1, 40),
+                'is_correct': correct,
+                'submitted_at': (now + datetime.timedelta(milliseconds=i)).isoformat(),
+            })})
+        sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+
+
+def _remaining(sqs, queue_url):
+    attrs = sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=[
+        'ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible'])['Attributes']
+    return int(attrs['ApproximateNumberOfMessages']) + int(attrs['ApproximateNumberOfMessagesNotVisible'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--receivers', type=int, default=1)
+    parser.add_argument('--handlers', default='sleep', help='"sleep" or a WORKER_HANDLERS spec')
+    parser.add_argument('--handler-delay', type=float, default=0.005, help='seconds per message for "sleep"')
+    parser.add_argument('--visibility-timeout', type=int, default=30)
+    parser.add_argument('--wait-time', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    sqs = get_sqs_client()
+    queue_url = sqs.create_queue(QueueName=f'flagrush-bench-worker-{int(time.time())}')['QueueUrl']
+    _publish(sqs, queue_url, args.messages)
+
+    handlers = [SleepHandler(args.handler_delay)] if args.handlers == 'sleep' else build_handlers(args.handlers)
+    consumer = Consumer(queue_url, handlers, concurrency=args.concurrency, wait_time=args.wait_time,
+                        visibility_timeout=args.visibility_timeout, retry_delay=1, receivers=args.receivers,
+                        sqs=sqs)
+    thread = threading.Thread(target=consumer.run)
+    start = time.perf_counter()
+    thread.start()
+    deadline = start + args.timeout
+    while consumer.processed < args.messages and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    consumer.stop()
+    thread.join()
+
+    remaining = _remaining(sqs, queue_url)
+    sqs.delete_queue(QueueUrl=queue_url)
+    print(json.dumps({
+        'messages': args.messages,
+        'processed': consumer.processed,
+        'failed': consumer.failed,
+        'left_in_queue': remaining,
+        'concurrency': args.concurrency,
+        'receivers': args.receivers,
+        'seconds': round(elapsed, 2),
+        'messages_per_second': round(consumer.processed / elapsed, 1) if elapsed else None,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -34,3 +34,42 @@ class Config:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Gunicorn worker model: threads | gevent (see gunicorn_conf.py)
+    WORKER_MODE = os.environ.get('WORKER_MODE', 'threads').lower()
+
+    if WORKER_MODE == 'gevent' and SQLALCHEMY_DATABASE_URI.startswith(('postgresql://', 'postgresql+psycopg')):
+        # libpq-based drivers wait in C and would stall every greenlet in the worker;
+        # pg8000 is pure Python and goes through the monkey-patched socket module.
+        SQLALCHEMY_DATABASE_URI = 'postgresql+pg8000://' + SQLALCHEMY_DATABASE_URI.split('://', 1)[1]
+
+    if SQLALCHEMY_DATABASE_URI.startswith('postgresql'):
+        # Greenlets share the pool, so gevent workers need more connections per process
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 20 if WORKER_MODE == 'gevent' else 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            'pool_pre_ping': True,
+        }
+
+    # Response JSON encoder: auto (orjson when installed) | orjson | stdlib
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto').lower()
+
+    # Response compression (gzip, plus brotli when installed) for large JSON/NDJSON bodies
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BR_QUALITY = int(os.environ.get('COMPRESS_BR_QUALITY', 5))
+    COMPRESS_CACHE_MIN_SIZE = int(os.environ.get('COMPRESS_CACHE_MIN_SIZE', 16384))
+    COMPRESS_CACHE_BYTES = int(os.environ.get('COMPRESS_CACHE_BYTES', 32 * 1024 * 1024))
+    COMPRESS_STREAM_FLUSH_BYTES = int(os.environ.get('COMPRESS_STREAM_FLUSH_BYTES', 16384))
+
+    # Per-request SQL auditing: off | warn | strict (see app/utils/query_audit.py).
+    # Defaults to warn when DEBUG is on so N+1 patterns show up during development.
+    QUERY_AUDIT_MODE = (
+        os.environ.get('QUERY_AUDIT_MODE')
+        or ('warn' if os.environ.get('DEBUG', 'False').lower() == 'true' else 'off')
+    ).lower()
+    QUERY_COUNT_WARN_THRESHOLD = int(os.environ.get('QUERY_COUNT_WARN_THRESHOLD', 30))
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+
@@ -1,8 +1,16 @@
 import json
 import os
 import datetime
+import gzip
+import hashlib
 import logging
-from typing import Any, Dict
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
 
 import boto3
 from botocore.exceptions import ClientError
@@ -10,12 +18,39 @@ from botocore.exceptions import ClientError
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-s3 = boto3.client("s3")
+# S3_ENDPOINT_URL points the function at a local S3 stand-in (moto_server, MinIO) for testing
+s3 = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None)
+
+# Conditional PutObject headers for the calling thread. Added by a signing hook
+# because older boto3 releases (including some Lambda runtimes) have no
+# IfNoneMatch/IfMatch parameters.
+_conditional = threading.local()
+
+
+def _add_conditional_headers(request, **kwargs):
+    for name, value in getattr(_conditional, "headers", {}).items():
+        request.headers[name] = value
+
+
+s3.meta.events.register("before-sign.s3.PutObject", _add_conditional_headers)
 
 LOG_BUCKET = os.environ.get("LOG_BUCKET")
 LOG_PREFIX = os.environ.get("LOG_PREFIX", "logs/").strip("/") + "/"
 # When True, include plaintext flag if present in the SQS message (use with care)
 INCLUDE_FLAG = os.environ.get("INCLUDE_FLAG", "false").lower() == "true"
+# Parallel PutObject calls per invocation
+WRITE_CONCURRENCY = int(os.environ.get("WRITE_CONCURRENCY", "8"))
+# Compaction merges an hour's batch objects once the hour is this many minutes old
+COMPACT_AFTER_MINUTES = int(os.environ.get("COMPACT_AFTER_MINUTES", "90"))
+
+SUBMISSION_EVENTS = ("flag_submission", "flag_submission_blocked", "challenge_solved")
+COMPACTED_NAME = "compacted.ndjson.gz"
+
+# Object layout (Hive-style partitions, queryable with Athena/Glue):
+#   <prefix>submissions/dt=YYYY-MM-DD/hour=HH/challenge_id=N/batch-<digest>.ndjson.gz
+#   <prefix>submissions/dt=YYYY-MM-DD/hour=HH/challenge_id=N/compacted.ndjson.gz
+# Every line is one event plus the SQS "message_id", which readers and the
+# compactor use to drop duplicates from SQS at-least-once redelivery.
 
 
 def _put_json(bucket: str, key: str, data: Dict[str, Any]):
@@ -27,87 +62,371 @@ def _put_json(bucket: str, key: str, data: Dict[str, Any]):
     )
 
 
-def _object_exists(bucket: str, key: str) -> bool:
+def _put_ndjson_gz(bucket: str, key: str, records: Iterable[Dict[str, Any]]):
+    body = "".join(json.dumps(r, separators=(",", ":"), sort_keys=True) + "\n" for r in records)
+    # mtime=0 keeps the bytes identical when a retried batch rewrites the same key
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=gzip.compress(body.encode("utf-8"), mtime=0),
+        ContentType="application/x-ndjson",
+        ContentEncoding="gzip",
+    )
+
+
+def _read_ndjson_gz(bucket: str, key: str) -> List[Dict[str, Any]]:
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    try:
+        body = gzip.decompress(body)
+    except OSError:
+        # Some S3 stand-ins decode Content-Encoding: gzip on the way out
+        pass
+    return [json.loads(line) for line in body.decode("utf-8").splitlines() if line]
+
+
+def _error_code(e: ClientError) -> str:
+    return str(e.response.get("Error", {}).get("Code") or e.response.get("ResponseMetadata", {}).get("HTTPStatusCode"))
+
+
+def _put_json_conditional(bucket: str, key: str, data: Dict[str, Any], headers: Dict[str, str]) -> bool:
+    """PutObject with conditional headers. False if the precondition failed (412)."""
+    _conditional.headers = headers
     try:
-        s3.head_object(Bucket=bucket, Key=key)
+        _put_json(bucket, key, data)
         return True
     except ClientError as e:
-        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+        if _error_code(e) in ("PreconditionFailed", "412"):
             return False
         raise
+    finally:
+        _conditional.headers = {}
 
 
-def _ensure_first_solver(bucket: str, challenge_id: Any, record: Dict[str, Any]):
-    """Create a first_solver.json if it does not exist for this challenge.
-    Not atomic across multiple consumers; set Lambda reserved concurrency to 1 for this function.
+def _ensure_first_solver(bucket: str, challenge_id: Any, record: Dict[str, Any]) -> bool:
+    """Record the earliest solve of a challenge in first_solver.json, atomically.
+
+    Compare-and-swap on S3 conditional writes, safe under any number of
+    concurrent consumers and any delivery order:
+
+    - create the object only if it does not exist (If-None-Match: *);
+    - if it exists but names a later submission (higher submission_id), replace
+      it only if it has not changed since it was read (If-Match: <ETag>);
+    - retry when another writer got in between, or on 409 while a concurrent
+      conditional write is in flight.
+
+    Returns True if this record is now the stored first solver.
     """
     key = f"{LOG_PREFIX}challenges/{challenge_id}/first_solver.json"
-    if not _object_exists(bucket, key):
-        doc = {
-            "challenge_id": challenge_id,
-            "user_id": record.get("user_id"),
-            "username": record.get("username"),
-            "submission_id": record.get("submission_id"),
-            "submitted_at": record.get("submitted_at"),
-        }
-        _put_json(bucket, key, doc)
-        logger.info("First solver recorded at s3://%s/%s", bucket, key)
+    doc = {
+        "challenge_id": challenge_id,
+        "user_id": record.get("user_id"),
+        "username": record.get("username"),
+        "submission_id": record.get("submission_id"),
+        "submitted_at": record.get("submitted_at"),
+    }
+    for attempt in range(8):
+        try:
+            if _put_json_conditional(bucket, key, doc, {"If-None-Match": "*"}):
+                logger.info("First solver recorded at s3://%s/%s", bucket, key)
+                return True
+            try:
+                current = s3.get_object(Bucket=bucket, Key=key)
+            except ClientError as e:
+                if _error_code(e) in ("NoSuchKey", "404"):
+                    continue
+                raise
+            existing = json.loads(current["Body"].read())
+            if _solve_order(existing) <= _solve_order(doc):
+                return False
+            if _put_json_conditional(bucket, key, doc, {"If-Match": current["ETag"]}):
+                logger.info("Earlier first solver recorded at s3://%s/%s", bucket, key)
+                return True
+        except ClientError as e:
+            if _error_code(e) not in ("ConditionalRequestConflict", "409"):
+                raise
+        time.sleep(min(0.05 * 2 ** attempt, 1.0) * random.random())
+    raise RuntimeError(f"first solver update for challenge {challenge_id} did not settle")
 
 
-def _store_submission(bucket: str, record: Dict[str, Any]):
-    """Write a per-submission JSON line file under S3 for audit and retrieval."""
-    challenge_id = record.get("challenge_id", "unknown")
-    submission_id = record.get("submission_id", "unknown")
+def _solve_order(doc: Dict[str, Any]) -> Tuple[int, str]:
+    submission_id = doc.get("submission_id")
+    return (submission_id if isinstance(submission_id, int) else 2 ** 63, doc.get("submitted_at") or "")
 
-    submitted_at = record.get("submitted_at")
-    if not submitted_at:
-        submitted_at = datetime.datetime.utcnow().isoformat()
 
-    # Partition by date for manageability
+def _partition(record: Dict[str, Any]) -> Tuple[str, str, str]:
+    """(date, hour, challenge_id) for a submission record."""
+    submitted_at = record.get("submitted_at") or ""
     try:
-        day = submitted_at[:10]  # YYYY-MM-DD
-    except Exception:
-        day = datetime.datetime.utcnow().strftime("%Y-%m-%d")
+        ts = datetime.datetime.fromisoformat(submitted_at[:26])
+    except ValueError:
+        ts = datetime.datetime.utcnow()
+    return ts.strftime("%Y-%m-%d"), ts.strftime("%H"), str(record.get("challenge_id", "unknown"))
+
+
+def _partition_prefix(day: str, hour: str, challenge_id: str) -> str:
+    return f"{LOG_PREFIX}submissions/dt={day}/hour={hour}/challenge_id={challenge_id}/"
 
-    key = (
-        f"{LOG_PREFIX}challenges/{challenge_id}/submissions/{day}/submission-{submission_id}.json"
-    )
 
-    # Optionally drop plaintext flag for safety
-    payload = dict(record)
-    if not INCLUDE_FLAG and "flag" in payload:
-        payload.pop("flag", None)
+def _batch_key(day: str, hour: str, challenge_id: str, message_ids: List[str]) -> str:
+    """Key derived from the SQS message ids, so a retried batch overwrites its own objects."""
+    digest = hashlib.sha256("\n".join(sorted(message_ids)).encode("utf-8")).hexdigest()[:32]
+    return f"{_partition_prefix(day, hour, challenge_id)}batch-{digest}.ndjson.gz"
 
-    _put_json(bucket, key, payload)
-    logger.info("Wrote submission record to s3://%s/%s", bucket, key)
+
+def _store_submissions(bucket: str, records: List[Tuple[str, Dict[str, Any]]]) -> Tuple[int, List[str]]:
+    """Write (message_id, record) pairs as one gzip NDJSON object per partition.
+
+    Returns the number of objects written and the message ids of groups that
+    could not be written.
+    """
+    groups: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = defaultdict(list)
+    for message_id, record in records:
+        payload = dict(record)
+        # Optionally drop plaintext flag for safety
+        if not INCLUDE_FLAG and "flag" in payload:
+            payload.pop("flag", None)
+        payload["message_id"] = message_id
+        groups[_partition(payload)].append(payload)
+
+    def write(item):
+        (day, hour, challenge_id), group = item
+        group.sort(key=lambda r: r["message_id"])
+        key = _batch_key(day, hour, challenge_id, [r["message_id"] for r in group])
+        try:
+            _put_ndjson_gz(bucket, key, group)
+            return key, []
+        except Exception as e:
+            logger.warning("Failed to write s3://%s/%s: %s", bucket, key, e)
+            return None, [r["message_id"] for r in group]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(WRITE_CONCURRENCY, len(groups)))) as pool:
+        results = list(pool.map(write, groups.items()))
+    written = sum(1 for key, _ in results if key)
+    failed = [message_id for _, ids in results for message_id in ids]
+    logger.info("Wrote %d submission records to %d objects", len(records) - len(failed), written)
+    return written, failed
 
 
 def lambda_handler(event, context):
+    """SQS consumer. Enable ReportBatchItemFailures on the event source mapping:
+    only messages listed in batchItemFailures are retried.
+    """
     if not LOG_BUCKET:
         logger.error("LOG_BUCKET not set")
         return {"status": "error", "reason": "missing LOG_BUCKET"}
 
+    submissions: List[Tuple[str, Dict[str, Any]]] = []
+    solves: List[Tuple[str, Dict[str, Any]]] = []
     for rec in event.get("Records", []):
+        message_id = rec.get("messageId") or str(uuid.uuid4())
         body = rec.get("body")
         try:
             msg = json.loads(body)
         except Exception:
+            # Retrying cannot fix a malformed body; drop it rather than block the batch
             logger.warning("Invalid JSON body: %s", body)
             continue
 
         evt = msg.get("event")
-        if evt in ("flag_submission", "flag_submission_blocked", "challenge_solved"):
-            # Always write per-submission logs when we have IDs
+        if evt in SUBMISSION_EVENTS:
+            # Always write submission logs when we have IDs
             if "submission_id" in msg:
-                _store_submission(LOG_BUCKET, msg)
+                submissions.append((message_id, msg))
 
             # Keep a first solver marker for solved events
             if evt == "challenge_solved" and "challenge_id" in msg:
-                try:
-                    _ensure_first_solver(LOG_BUCKET, msg.get("challenge_id"), msg)
-                except Exception as e:
-                    logger.warning("first solver check failed: %s", e)
+                solves.append((message_id, msg))
         else:
             logger.info("Ignoring event type: %s", evt)
 
-    return {"status": "ok"}
+    failed = set()
+    objects = 0
+    if submissions:
+        objects, failed_ids = _store_submissions(LOG_BUCKET, submissions)
+        failed.update(failed_ids)
+
+    def record_solve(item):
+        message_id, msg = item
+        try:
+            _ensure_first_solver(LOG_BUCKET, msg.get("challenge_id"), msg)
+            return None
+        except Exception as e:
+            logger.warning("first solver update failed: %s", e)
+            return message_id
+
+    if solves:
+        with ThreadPoolExecutor(max_workers=max(1, min(WRITE_CONCURRENCY, len(solves)))) as pool:
+            failed.update(m for m in pool.map(record_solve, solves) if m)
+
+    return {
+        "status": "ok" if not failed else "partial",
+        "records": len(submissions),
+        "objects": objects,
+        "batchItemFailures": [{"itemIdentifier": m} for m in sorted(failed)],
+    }
+
+
+# Compaction: merge an hour's batch objects into one file per partition
+
+def _list_keys(bucket: str, prefix: str) -> List[Dict[str, Any]]:
+    paginator = s3.get_paginator("list_objects_v2")
+    return [obj for page in paginator.paginate(Bucket=bucket, Prefix=prefix) for obj in page.get("Contents", [])]
+
+
+def compact_hour(bucket: str, day: str, hour: str) -> Dict[str, int]:
+    """Merge batch objects of one hour into compacted.ndjson.gz per challenge partition.
+
+    Duplicate message ids are dropped. The compacted file is written before the
+    batch objects are deleted, so a crash can only leave duplicates, which the
+    next run removes; records are never lost.
+    """
+    partitions: Dict[str, List[str]] = defaultdict(list)
+    for obj in _list_keys(bucket, f"{LOG_PREFIX}submissions/dt={day}/hour={hour}/"):
+        prefix, _, name = obj["Key"].rpartition("/")
+        partitions[prefix + "/"].append(name)
+
+    stats = {"partitions": 0, "objects_merged": 0, "records": 0}
+    for prefix, names in sorted(partitions.items()):
+        batches = [n for n in names if n.startswith("batch-")]
+        if not batches:
+            continue
+        sources = batches + ([COMPACTED_NAME] if COMPACTED_NAME in names else [])
+        with ThreadPoolExecutor(max_workers=WRITE_CONCURRENCY) as pool:
+            loaded = list(pool.map(lambda n: _read_ndjson_gz(bucket, prefix + n), sources))
+        merged: Dict[str, Dict[str, Any]] = {}
+        for records in loaded:
+            for record in records:
+                merged.setdefault(record.get("message_id") or json.dumps(record, sort_keys=True), record)
+        ordered = sorted(merged.values(), key=lambda r: (r.get("submitted_at") or "", r.get("message_id") or ""))
+        _put_ndjson_gz(bucket, prefix + COMPACTED_NAME, ordered)
+        for i in range(0, len(batches), 1000):
+            s3.delete_objects(Bucket=bucket, Delete={
+                "Objects": [{"Key": prefix + n} for n in batches[i:i + 1000]], "Quiet": True,
+            })
+        stats["partitions"] += 1
+        stats["objects_merged"] += len(batches)
+        stats["records"] += len(ordered)
+    logger.info("Compacted dt=%s hour=%s: %s", day, hour, stats)
+    return stats
+
+
+def compaction_handler(event, context):
+    """Scheduled entry point (e.g. EventBridge, hourly).
+
+    Compacts the hour that ended COMPACT_AFTER_MINUTES ago, or the hour given
+    as {"date": "YYYY-MM-DD", "hour": "HH"} in the event.
+    """
+    if not LOG_BUCKET:
+        logger.error("LOG_BUCKET not set")
+        return {"status": "error", "reason": "missing LOG_BUCKET"}
+    event = event or {}
+    if event.get("date") and event.get("hour") is not None:
+        day, hour = event["date"], f"{int(event['hour']):02d}"
+    else:
+        ts = datetime.datetime.utcnow() - datetime.timedelta(minutes=COMPACT_AFTER_MINUTES)
+        day, hour = ts.strftime("%Y-%m-%d"), ts.strftime("%H")
+    return {"status": "ok", "date": day, "hour": hour, **compact_hour(LOG_BUCKET, day, hour)}
+
+
+# Local testing: synthetic SQS events against a stand-in S3
+
+def synthetic_event(batch_size: int, challenges: int = 5, users: int = 50, when: datetime.datetime = None) -> Dict[str, Any]:
+    """An SQS event with ``batch_size`` flag_submission messages, shaped like the API's."""
+    when = when or datetime.datetime.utcnow()
+    records = []
+    for _ in range(batch_size):
+        user_id = random.randint(1, users)
+        correct = random.random() < 0.2
+        body = {
+            "event": "flag_submission",
+            "submission_id": random.randint(1, 10 ** 9),
+            "user_id": user_id,
+            "username": f"player{user_id:05d}",
+            "challenge_id": random.randint(1, challenges),
+            "is_correct": correct,
+            "points_awarded": 100 if correct else 0,
+            "flag_sha256": hashlib.sha256(os.urandom(8)).hexdigest(),
+            "submitted_at": (when - datetime.timedelta(seconds=random.randint(0, 59))).isoformat(),
+        }
+        records.append({"messageId": str(uuid.uuid4()), "body": json.dumps(body), "eventSource": "aws:sqs"})
+    return {"Records": records}
+
+
+def simulate_first_solver_race(consumers: int, solves: int, challenge_id: int = 1) -> Dict[str, Any]:
+    """Deliver ``solves`` challenge_solved events for one challenge in random order
+    to ``consumers`` concurrent handler invocations, and check that
+    first_solver.json ends up naming the lowest submission id.
+    """
+    submission_ids = random.sample(range(1, 10 ** 6), solves)
+    messages = []
+    for submission_id in submission_ids:
+        body = {
+            "event": "challenge_solved",
+            "submission_id": submission_id,
+            "user_id": submission_id % 997,
+            "username": f"player{submission_id % 997:05d}",
+            "challenge_id": challenge_id,
+            "points": 100,
+            "submitted_at": datetime.datetime.utcnow().isoformat(),
+        }
+        messages.append({"messageId": str(uuid.uuid4()), "body": json.dumps(body), "eventSource": "aws:sqs"})
+    random.shuffle(messages)
+    batches = [{"Records": messages[i::consumers]} for i in range(consumers)]
+    barrier = threading.Barrier(consumers)
+
+    def consume(batch):
+        barrier.wait()
+        return lambda_handler(batch, None)
+
+    with ThreadPoolExecutor(max_workers=consumers) as pool:
+        results = list(pool.map(consume, batches))
+    key = f"{LOG_PREFIX}challenges/{challenge_id}/first_solver.json"
+    stored = json.loads(s3.get_object(Bucket=LOG_BUCKET, Key=key)["Body"].read())
+    return {
+        "consumers": consumers,
+        "solves": solves,
+        "expected_submission_id": min(submission_ids),
+        "stored_submission_id": stored["submission_id"],
+        "ok": stored["submission_id"] == min(submission_ids),
+        "failed_items": sum(len(r["batchItemFailures"]) for r in results),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the handlers locally (set S3_ENDPOINT_URL for a stand-in S3)")
+    parser.add_argument("command", choices=("simulate", "compact", "race"))
+    parser.add_argument("--bucket", default=LOG_BUCKET or "flagrush-logs")
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--date")
+    parser.add_argument("--hour")
+    parser.add_argument("--consumers", type=int, default=16)
+    parser.add_argument("--solves", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    LOG_BUCKET = args.bucket
+    if args.command in ("simulate", "race"):
+        try:
+            s3.create_bucket(Bucket=LOG_BUCKET)
+        except ClientError:
+            pass
+    if args.command == "race":
+        results = [simulate_first_solver_race(args.consumers, args.solves, challenge_id=random.randint(1, 10 ** 9))
+                   for _ in range(args.rounds)]
+        print(json.dumps(results, indent=2))
+        raise SystemExit(0 if all(r["ok"] for r in results) else 1)
+    if args.command == "simulate":
+        start = time.perf_counter()
+        totals = {"records": 0, "objects": 0}
+        for _ in range(args.batches):
+            result = lambda_handler(synthetic_event(args.batch_size), None)
+            totals["records"] += result["records"]
+            totals["objects"] += result["objects"]
+        totals["seconds"] = round(time.perf_counter() - start, 2)
+        print(json.dumps(totals))
+    else:
+        print(json.dumps(compaction_handler({"date": args.date, "hour": args.hour}, None)))
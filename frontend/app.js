@@ -151,7 +151,13 @@
     ev.preventDefault(); setSubmitResult('');
     if (!selectedChallenge) return;
     const body = { challenge_id: selectedChallenge.id, flag: els.flagInput.value.trim() };
-    const res = await fetch(`${api}/api/submissions/`, { method: 'POST', headers: headers(true), body: JSON.stringify(body) });
+    // Same key for the retry, so the server replays the first result instead of recording twice
+    const key = (crypto.randomUUID && crypto.randomUUID()) || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    const send = () => fetch(`${api}/api/submissions/`, {
+      method: 'POST', headers: { ...headers(true), 'Idempotency-Key': key }, body: JSON.stringify(body)
+    });
+    let res;
+    try { res = await send(); } catch (e) { res = await send(); }
     const j = await res.json();
     if (!res.ok) { setSubmitResult(`<span style="color:#fca5a5">${j.message || 'Error'}</span>`); return; }
     const color = j.data.is_correct ? '#86efac' : '#fca5a5';
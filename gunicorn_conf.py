@@ -0,0 +1,62 @@
+"""Gunicorn configuration shared by the main and admin APIs.
+
+    gunicorn -c gunicorn_conf.py wsgi_main:app
+    GUNICORN_BIND=127.0.0.1:5001 gunicorn -c gunicorn_conf.py wsgi_admin:app
+
+WORKER_MODE selects the concurrency model:
+
+- ``threads`` (default): gthread workers with GUNICORN_THREADS threads each,
+  the same as the previous ``--workers 2 --threads 2`` command lines.
+- ``gevent``: cooperative workers that multiplex GUNICORN_WORKER_CONNECTIONS
+  connections per process. The gevent worker monkey-patches the standard
+  library before the app is imported. Database (pg8000, see config.py), SQS
+  and S3 calls then yield on socket I/O instead of holding a thread. Idle
+  keep-alive and slow clients cost a greenlet, not a thread.
+  Install requirements-gevent.txt first.
+
+The app is preloaded in the master (GUNICORN_PRELOAD, default true) and
+workers fork from it.
+"""
+import gc
+import os
+
+worker_mode = os.environ.get('WORKER_MODE', 'threads').lower()
+
+# Preload the app in the master and fork workers from it. Imports and app
+# setup then happen once, and workers share those pages copy-on-write.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+if worker_mode == 'gevent' and preload_app:
+    # The app (and boto3/ssl through it) is imported in the master, before the
+    # gevent worker would patch; patch first so those modules see gevent sockets.
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.environ.get('GUNICORN_BIND') or f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+if worker_mode == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+else:
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 2))
+
+
+def when_ready(server):
+    # Move the preloaded app's objects out of GC tracking so collections in
+    # the workers do not touch, and thereby copy, the shared pages.
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections must never be shared across processes; drop any the master
+    # may have opened while preloading.
+    if preload_app:
+        from app import db
+        flask_app = server.app.wsgi()
+        with flask_app.app_context():
+            db.engine.dispose()
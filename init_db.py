@@ -1,13 +1,32 @@
-from app import create_app, db
+from app import create_app, db, init_migrations
 from app.models import User, Challenge, Submission
+from app.utils import score_history
 from werkzeug.security import generate_password_hash
+from flask_migrate import upgrade, stamp
 import os
 
+# Revision matching the tables that older releases created with db.create_all()
+INITIAL_REVISION = 'cdffc49f2404'
+
+def migrate_database():
+    """Apply schema migrations (the apps no longer create tables at startup)"""
+    inspector = db.inspect(db.engine)
+    if inspector.has_table('users') and not inspector.has_table('alembic_version'):
+        # Database created by db.create_all(): adopt it at the initial revision
+        stamp(revision=INITIAL_REVISION)
+    upgrade()
+    # Re-bucket the score history if SCORE_HISTORY_RESOLUTION changed
+    if score_history.sync_resolution() is not None:
+        db.session.commit()
+
 def create_admin_user():
     """Create an admin user"""
     app = create_app()
+    init_migrations(app)
     
     with app.app_context():
+        migrate_database()
+        
         admin = User.query.filter_by(username='admin').first()
         
         admin_username = os.environ.get('ADMIN_USERNAME', 'admin')
@@ -0,0 +1,138 @@
+"""Shared fixtures: both apps on a migrated SQLite database, clients, players and query budgets.
+
+The schema is built once per run by the Alembic migrations
+(``init_db.migrate_database``), as in production. Every table is emptied and
+the per-process caches are cleared after each test.
+"""
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="flagrush-tests-")
+# Config reads the environment at import time, so this runs before any app import
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_TMP}/test.db",
+    "PORT": "5000",
+    "ADMIN_PORT": "5001",
+    "ATTACHMENT_STORAGE_DIR": os.path.join(_TMP, "attachments"),
+    "ARCHIVE_DIR": os.path.join(_TMP, "archive"),
+    "AWS_DEFAULT_REGION": "us-east-1",
+})
+for name in ("S3_BUCKET", "SQS_QUEUE_URL", "SQS_AUDIT_QUEUE_URL", "WORKER_QUEUE_URL", "ARCHIVE_BUCKET",
+             "IDEMPOTENCY_STORE", "QUERY_AUDIT_MODE", "FLASK_RUN_FROM_CLI", "METRICS_TOKEN"):
+    os.environ.pop(name, None)
+
+import pytest  # noqa: E402
+
+from app import create_admin_app, create_main_app, db, init_migrations  # noqa: E402
+from app.models import User  # noqa: E402
+from app.utils.query_audit import assert_max_queries  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def admin_app():
+    app = create_admin_app()
+    # The test client derives SERVER_PORT from SERVER_NAME; route_middleware checks it
+    app.config.update(SERVER_NAME="localhost:5001", SESSION_COOKIE_DOMAIN=False)
+    init_migrations(app)
+    with app.app_context():
+        import init_db
+        init_db.migrate_database()
+    return app
+
+
+@pytest.fixture(scope="session")
+def app(admin_app):
+    app = create_main_app()
+    app.config.update(SERVER_NAME="localhost:5000", SESSION_COOKIE_DOMAIN=False)
+    return app
+
+
+@pytest.fixture(autouse=True)
+def _clean_state(request):
+    yield
+    if "admin_app" not in request.fixturenames:
+        return
+    from app.utils import idempotency, scoreboard
+    from app.utils.flags import matchers
+
+    admin = request.getfixturevalue("admin_app")
+    with admin.app_context():
+        db.session.remove()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+    matchers.clear()
+    scoreboard.frozen_cache.clear()
+    idempotency.get_store().clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(admin_app):
+    return admin_app.test_client()
+
+
+def _login(client, username, password):
+    response = client.post("/api/auth/login", json={"username": username, "password": password})
+    assert response.status_code == 200, response.get_json()
+    return {"Authorization": f"Bearer {response.get_json()['data']['access_token']}"}
+
+
+@pytest.fixture
+def admin_headers(admin_app, admin_client):
+    with admin_app.app_context():
+        admin = User(username="admin", email="admin@example.com", is_admin=True)
+        admin.set_password("admin-pw")
+        db.session.add(admin)
+        db.session.commit()
+    return _login(admin_client, "admin", "admin-pw")
+
+
+@pytest.fixture
+def player(client):
+    """``player("alice")`` registers a player and returns their auth headers."""
+    def register(username):
+        response = client.post("/api/auth/register",
+                               json={"username": username, "email": f"{username}@example.com", "password": "pw"})
+        assert response.status_code == 201, response.get_json()
+        return _login(client, username, "pw")
+    return register
+
+
+@pytest.fixture
+def challenge(admin_client, admin_headers):
+    """``challenge(title="Web 1", flag="flag{x}", points=100, ...)`` creates a challenge and returns its id."""
+    def create(**fields):
+        body = {"description": "Test challenge", "category": "web", "points": 100, "flag": "flag{test}", **fields}
+        response = admin_client.post("/api/admin/challenges", headers=admin_headers, json=body)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()["data"]["id"]
+    return create
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    """moto in place of S3 and SQS, with fresh cached clients."""
+    from moto import mock_aws
+    from app.utils import aws as aws_utils
+
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    for name in ("AWS_SESSION_TOKEN", "AWS_PROFILE", "S3_ENDPOINT_URL", "SQS_ENDPOINT_URL", "S3_ADDRESSING_STYLE"):
+        monkeypatch.delenv(name, raising=False)
+    with mock_aws():
+        aws_utils.reset_clients()
+        yield
+    aws_utils.reset_clients()
+
+
+@pytest.fixture
+def query_budget():
+    """``with query_budget(3): client.get(...)`` fails above 3 statements or on an N+1 (3 repeats)."""
+    def budget(max_count, n_plus_one_threshold=3):
+        return assert_max_queries(max_count, n_plus_one_threshold=n_plus_one_threshold)
+    return budget
@@ -0,0 +1,185 @@
+"""Per-process boto3 clients and the presigned GET URL cache."""
+import os
+import threading
+import time
+
+import pytest
+
+from app.utils import aws as aws_utils
+
+
+class _Signer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(0.01)
+        return f"https://bucket.example/object?sig={self.calls}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(aws_utils.time, "time", lambda: now[0])
+    return now
+
+
+def test_presign_reused_until_margin(clock):
+    cache = aws_utils.PresignedUrlCache(max_entries=10, margin=120)
+    sign = _Signer()
+    assert cache.get("b", "k", 600, sign) == ("https://bucket.example/object?sig=1", 600)
+    clock[0] += 100
+    # Same URL, with its real remaining lifetime
+    assert cache.get("b", "k", 600, sign) == ("https://bucket.example/object?sig=1", 500)
+    clock[0] += 379
+    assert cache.get("b", "k", 600, sign)[1] == 121
+    # Less than the margin left: signed again
+    clock[0] += 1
+    assert cache.get("b", "k", 600, sign) == ("https://bucket.example/object?sig=2", 600)
+    assert sign.calls == 2
+
+
+def test_presign_keys_and_limits(clock):
+    cache = aws_utils.PresignedUrlCache(max_entries=2, margin=120)
+    sign = _Signer()
+    cache.get("b", "k", 600, sign)
+    cache.get("b", "k", 300, sign)  # another lifetime is another URL
+    assert sign.calls == 2
+    cache.get("b", "other", 600, sign)  # evicts ("b", "k", 600), the least recently used
+    cache.get("b", "k", 600, sign)
+    assert sign.calls == 4
+    # Lifetimes within the margin are never cached
+    cache.get("b", "short", 60, sign)
+    cache.get("b", "short", 60, sign)
+    assert sign.calls == 6
+    # Failed signing is not cached either
+    assert cache.get("b", "fail", 600, lambda: None) is None
+
+
+def test_presign_burst_signs_once():
+    cache = aws_utils.PresignedUrlCache(max_entries=10, margin=120)
+    sign = _Signer()
+    urls = []
+    threads = [threading.Thread(target=lambda: urls.append(cache.get("b", "k", 600, sign)[0])) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sign.calls == 1
+    assert len(set(urls)) == 1
+
+
+def test_cached_presigned_get_url(aws):
+    url, lifetime = aws_utils.cached_presigned_get_url("attachments", "files/a.zip", expires_in=600)
+    assert "attachments" in url and "files/a.zip" in url and "Expires" in url
+    assert lifetime == 600
+    assert aws_utils.cached_presigned_get_url("attachments", "files/a.zip", expires_in=600)[0] == url
+
+
+def test_client_reused_within_process(aws):
+    assert aws_utils.get_s3_client() is aws_utils.get_s3_client()
+    assert aws_utils.get_sqs_client() is not aws_utils.get_s3_client()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_client_rebuilt_after_fork(aws):
+    parent = aws_utils.get_s3_client()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            child = aws_utils.get_s3_client()
+            ok = child is not parent and child is aws_utils.get_s3_client()
+            os.write(write_fd, b"1" if ok else b"0")
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    result = os.read(read_fd, 1)
+    os.waitpid(pid, 0)
+    assert result == b"1"
+    # The parent keeps its own client
+    assert aws_utils.get_s3_client() is parent
+
+
+def test_part_size_default_and_bounds(monkeypatch):
+    monkeypatch.delenv("S3_MULTIPART_PART_SIZE", raising=False)
+    assert aws_utils.choose_part_size(None) == 64 * aws_utils.MIB
+    assert aws_utils.choose_part_size(0) == 64 * aws_utils.MIB
+    assert aws_utils.choose_part_size(10 * aws_utils.MIB) == 64 * aws_utils.MIB
+    monkeypatch.setenv("S3_MULTIPART_PART_SIZE", str(aws_utils.MIB))
+    assert aws_utils.choose_part_size(100 * aws_utils.MIB) == aws_utils.MULTIPART_MIN_PART_SIZE
+    monkeypatch.setenv("S3_MULTIPART_PART_SIZE", str(10 * aws_utils.MULTIPART_MAX_PART_SIZE))
+    assert aws_utils.choose_part_size(100 * aws_utils.MIB) == aws_utils.MULTIPART_MAX_PART_SIZE
+
+
+@pytest.mark.parametrize("total", [
+    64 * aws_utils.MIB * aws_utils.MULTIPART_MAX_PARTS,
+    64 * aws_utils.MIB * aws_utils.MULTIPART_MAX_PARTS + 1,
+    1_000_000_000_000,
+    aws_utils.MULTIPART_MAX_OBJECT_SIZE,
+])
+def test_part_size_fits_part_limit(monkeypatch, total):
+    monkeypatch.delenv("S3_MULTIPART_PART_SIZE", raising=False)
+    part_size = aws_utils.choose_part_size(total)
+    assert part_size % aws_utils.MIB == 0
+    assert aws_utils.MULTIPART_MIN_PART_SIZE <= part_size <= aws_utils.MULTIPART_MAX_PART_SIZE
+    assert -(-total // part_size) <= aws_utils.MULTIPART_MAX_PARTS
+    # No bigger than needed: one MiB less would not fit (or the default already does)
+    smaller = part_size - aws_utils.MIB
+    assert part_size == 64 * aws_utils.MIB or -(-total // smaller) > aws_utils.MULTIPART_MAX_PARTS
+
+
+def test_multipart_round_trip(aws):
+    import requests
+
+    s3 = aws_utils.get_s3_client()
+    s3.create_bucket(Bucket="uploads")
+    data = b"a" * aws_utils.MULTIPART_MIN_PART_SIZE + b"tail"
+    upload_id = aws_utils.s3_create_multipart_upload("uploads", "big.bin")
+    urls = aws_utils.s3_presigned_part_urls("uploads", "big.bin", upload_id, [1, 2])
+    assert aws_utils.s3_list_parts("uploads", "big.bin", upload_id) == []
+
+    # Part 2 first: a resumed upload lists what is there and sends the rest
+    assert requests.put(urls[2], data=data[aws_utils.MULTIPART_MIN_PART_SIZE:]).status_code == 200
+    parts = aws_utils.s3_list_parts("uploads", "big.bin", upload_id)
+    assert [(p["part_number"], p["size"]) for p in parts] == [(2, 4)]
+    assert requests.put(urls[1], data=data[:aws_utils.MULTIPART_MIN_PART_SIZE]).status_code == 200
+
+    parts = aws_utils.s3_list_parts("uploads", "big.bin", upload_id)
+    aws_utils.s3_complete_multipart_upload("uploads", "big.bin", upload_id, list(reversed(parts)))
+    assert s3.get_object(Bucket="uploads", Key="big.bin")["Body"].read() == data
+
+
+def test_multipart_abort(aws):
+    s3 = aws_utils.get_s3_client()
+    s3.create_bucket(Bucket="uploads")
+    upload_id = aws_utils.s3_create_multipart_upload("uploads", "gone.bin")
+    aws_utils.s3_abort_multipart_upload("uploads", "gone.bin", upload_id)
+    assert s3.list_multipart_uploads(Bucket="uploads").get("Uploads", []) == []
+
+
+def test_conditional_put_has_one_winner(aws):
+    s3 = aws_utils.get_s3_client()
+    s3.create_bucket(Bucket="flagrush-logs")
+    barrier = threading.Barrier(16)
+    results = {}
+
+    def put(i):
+        barrier.wait()
+        results[i] = aws_utils.s3_put_object_if("flagrush-logs", "first.json", str(i).encode(), {"If-None-Match": "*"})
+
+    threads = [threading.Thread(target=put, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    winners = [i for i, won in results.items() if won]
+    assert len(winners) == 1
+    assert s3.get_object(Bucket="flagrush-logs", Key="first.json")["Body"].read() == str(winners[0]).encode()
+
+    # If-Match only replaces the version that was read
+    etag = s3.head_object(Bucket="flagrush-logs", Key="first.json")["ETag"]
+    assert aws_utils.s3_put_object_if("flagrush-logs", "first.json", b"next", {"If-Match": etag})
+    assert not aws_utils.s3_put_object_if("flagrush-logs", "first.json", b"stale", {"If-Match": etag})
+    assert s3.get_object(Bucket="flagrush-logs", Key="first.json")["Body"].read() == b"next"
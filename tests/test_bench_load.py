@@ -0,0 +1,24 @@
+"""bench.load report helpers."""
+import pytest
+
+from bench.load import percentile
+
+
+@pytest.mark.parametrize("values, pct, expected", [
+    (list(range(1, 101)), 50, 50),
+    (list(range(1, 101)), 95, 95),
+    (list(range(1, 101)), 99, 99),
+    (list(range(1, 101)), 100, 100),
+    (list(range(1, 11)), 50, 5),
+    (list(range(1, 11)), 95, 10),
+    (list(range(1, 11)), 1, 1),
+    (list(range(1, 11)), 0, 1),
+    ([7], 99, 7),
+    ([1, 2, 3], 50, 2),
+])
+def test_nearest_rank_percentile(values, pct, expected):
+    assert percentile(values, pct) == expected
+
+
+def test_percentile_of_nothing():
+    assert percentile([], 95) is None
@@ -0,0 +1,129 @@
+"""docs/lambda_s3_logger.py against moto: partitioned gzip NDJSON batches and compaction."""
+import datetime
+import gzip
+import importlib.util
+import json
+import os
+
+import pytest
+
+BUCKET = "flagrush-logs"
+WHEN = datetime.datetime(2026, 3, 1, 14, 30, 0)
+
+
+@pytest.fixture
+def logger_module(aws, monkeypatch):
+    """The Lambda module, imported under moto (it builds its client at import)."""
+    path = os.path.join(os.path.dirname(__file__), os.pardir, "docs", "lambda_s3_logger.py")
+    spec = importlib.util.spec_from_file_location("lambda_s3_logger", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module, "LOG_BUCKET", BUCKET)
+    monkeypatch.setattr(module, "LOG_PREFIX", "logs/")
+    module.s3.create_bucket(Bucket=BUCKET)
+    return module
+
+
+def _record(message_id, **body):
+    body = {"event": "flag_submission", "user_id": 1, "username": "alice", "is_correct": False,
+            "submitted_at": WHEN.isoformat(), **body}
+    return {"messageId": message_id, "body": json.dumps(body), "eventSource": "aws:sqs"}
+
+
+def _objects(module, prefix="logs/submissions/"):
+    contents = module.s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix).get("Contents", [])
+    return {obj["Key"]: module._read_ndjson_gz(BUCKET, obj["Key"]) for obj in contents}
+
+
+def test_batch_written_per_partition(logger_module):
+    event = {"Records": [
+        _record("m1", submission_id=1, challenge_id=7, flag="flag{secret}"),
+        _record("m2", submission_id=2, challenge_id=7),
+        _record("m3", submission_id=3, challenge_id=9),
+        _record("m4", submission_id=4, challenge_id=7, submitted_at=(WHEN + datetime.timedelta(hours=1)).isoformat()),
+        {"messageId": "bad", "body": "not json"},
+        _record("m5", event="user_login"),
+    ]}
+    result = logger_module.lambda_handler(event, None)
+    assert result == {"status": "ok", "records": 4, "objects": 3, "batchItemFailures": []}
+
+    objects = _objects(logger_module)
+    by_partition = {key.rsplit("/", 1)[0]: records for key, records in objects.items()}
+    assert sorted(by_partition) == [
+        "logs/submissions/dt=2026-03-01/hour=14/challenge_id=7",
+        "logs/submissions/dt=2026-03-01/hour=14/challenge_id=9",
+        "logs/submissions/dt=2026-03-01/hour=15/challenge_id=7",
+    ]
+    hour14 = by_partition["logs/submissions/dt=2026-03-01/hour=14/challenge_id=7"]
+    assert [(r["message_id"], r["submission_id"]) for r in hour14] == [("m1", 1), ("m2", 2)]
+    assert "flag" not in hour14[0]
+    for key in objects:
+        assert key.rsplit("/", 1)[1].startswith("batch-") and key.endswith(".ndjson.gz")
+        head = logger_module.s3.head_object(Bucket=BUCKET, Key=key)
+        assert head["ContentEncoding"] == "gzip" and head["ContentType"] == "application/x-ndjson"
+
+
+def test_redelivered_batch_rewrites_same_objects(logger_module):
+    event = {"Records": [_record(f"m{i}", submission_id=i, challenge_id=1) for i in range(5)]}
+    logger_module.lambda_handler(event, None)
+    first = {key: logger_module.s3.get_object(Bucket=BUCKET, Key=key)["Body"].read() for key in _objects(logger_module)}
+    # SQS at-least-once: the same messages, in another order
+    event["Records"].reverse()
+    logger_module.lambda_handler(event, None)
+    second = {key: logger_module.s3.get_object(Bucket=BUCKET, Key=key)["Body"].read() for key in _objects(logger_module)}
+    assert first == second and len(first) == 1
+    assert len(gzip.decompress(next(iter(first.values()))).splitlines()) == 5
+
+
+def test_failed_partition_reported(logger_module, monkeypatch):
+    put = logger_module._put_ndjson_gz
+
+    def flaky(bucket, key, records):
+        if "challenge_id=2/" in key:
+            raise RuntimeError("S3 unavailable")
+        return put(bucket, key, records)
+
+    monkeypatch.setattr(logger_module, "_put_ndjson_gz", flaky)
+    event = {"Records": [_record("a", submission_id=1, challenge_id=1), _record("b", submission_id=2, challenge_id=2),
+                         _record("c", submission_id=3, challenge_id=2)]}
+    result = logger_module.lambda_handler(event, None)
+    assert result["status"] == "partial" and result["objects"] == 1
+    assert result["batchItemFailures"] == [{"itemIdentifier": "b"}, {"itemIdentifier": "c"}]
+
+
+def test_compaction_merges_and_dedupes(logger_module):
+    logger_module.lambda_handler({"Records": [_record("m1", submission_id=1, challenge_id=1),
+                                              _record("m2", submission_id=2, challenge_id=1)]}, None)
+    # A later batch that repeats m2
+    logger_module.lambda_handler({"Records": [_record("m2", submission_id=2, challenge_id=1),
+                                              _record("m3", submission_id=3, challenge_id=1)]}, None)
+    assert len(_objects(logger_module)) == 2
+
+    stats = logger_module.compaction_handler({"date": "2026-03-01", "hour": "14"}, None)
+    assert stats == {"status": "ok", "date": "2026-03-01", "hour": "14",
+                     "partitions": 1, "objects_merged": 2, "records": 3}
+    objects = _objects(logger_module)
+    assert list(objects) == ["logs/submissions/dt=2026-03-01/hour=14/challenge_id=1/compacted.ndjson.gz"]
+    assert [r["message_id"] for r in next(iter(objects.values()))] == ["m1", "m2", "m3"]
+
+    # New batches are folded into the existing compacted file
+    logger_module.lambda_handler({"Records": [_record("m4", submission_id=4, challenge_id=1)]}, None)
+    assert logger_module.compaction_handler({"date": "2026-03-01", "hour": "14"}, None)["records"] == 4
+
+
+def test_first_solver_lowest_submission_wins(logger_module):
+    key = "logs/challenges/5/first_solver.json"
+    solve = {"event": "challenge_solved", "challenge_id": 5, "submitted_at": WHEN.isoformat()}
+    logger_module.lambda_handler({"Records": [_record("s1", **solve, submission_id=40, user_id=4)]}, None)
+    # An earlier solve delivered late replaces it; a later one does not
+    logger_module.lambda_handler({"Records": [_record("s2", **solve, submission_id=12, user_id=2)]}, None)
+    logger_module.lambda_handler({"Records": [_record("s3", **solve, submission_id=30, user_id=3)]}, None)
+    stored = json.loads(logger_module.s3.get_object(Bucket=BUCKET, Key=key)["Body"].read())
+    assert (stored["submission_id"], stored["user_id"]) == (12, 2)
+
+
+def test_first_solver_race(logger_module):
+    for challenge_id in range(3):
+        result = logger_module.simulate_first_solver_race(consumers=8, solves=40, challenge_id=challenge_id)
+        assert result["ok"], result
+        assert result["failed_items"] == 0
@@ -0,0 +1,23 @@
+"""In-process metrics registry."""
+from app import create_admin_app, create_main_app
+from app.utils import metrics
+
+
+def test_collector_replaced_by_name():
+    registry = metrics.Registry()
+    calls = []
+    registry.register_collector(lambda: calls.append("old"), name="pool:main")
+    registry.register_collector(lambda: calls.append("new"), name="pool:main")
+    registry.register_collector(lambda: calls.append("admin"), name="pool:admin")
+    registry.snapshot()
+    assert calls == ["new", "admin"]
+
+
+def test_recreated_apps_keep_one_pool_collector_each():
+    create_main_app()
+    create_admin_app()
+    collectors = dict(metrics.registry._collectors)
+    create_main_app()
+    create_admin_app()
+    assert metrics.registry._collectors.keys() == collectors.keys()
+    assert {"db_pool:FlagRush-Main", "db_pool:FlagRush-Admin"} <= set(collectors)
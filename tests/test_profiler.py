@@ -0,0 +1,113 @@
+"""Profiling must never fail the profiled request."""
+import cProfile
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app.utils import profiler
+
+
+@pytest.fixture
+def profiled(app, player, monkeypatch, tmp_path):
+    """Headers for a request profiled with the signed X-Profile-Request header."""
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    headers = player("alice")
+    with app.app_context():
+        headers["X-Profile-Request"] = profiler.sign_request_token()
+    return headers
+
+
+def _written(tmp_path):
+    directory = tmp_path / profiler.ADHOC_SESSION
+    return sorted(name.rsplit(".", 1)[1] for name in os.listdir(directory))
+
+
+def test_cprofile(client, profiled, tmp_path):
+    assert client.get("/api/challenges/", headers=profiled).status_code == 200
+    assert _written(tmp_path) == ["pstats"]
+    assert not profiler._cprofile_lock.locked()
+
+
+def test_cprofile_busy_falls_back_to_sampler(client, profiled, tmp_path):
+    # Another request in this process is already under cProfile
+    with profiler._cprofile_lock:
+        assert client.get("/api/challenges/", headers=profiled).status_code == 200
+    assert _written(tmp_path) == ["collapsed"]
+
+
+def test_cprofile_refused_falls_back_to_sampler(client, profiled, tmp_path, monkeypatch):
+    def refuse(self):
+        raise ValueError("Another profiling tool is already active")
+    monkeypatch.setattr(cProfile.Profile, "enable", refuse)
+    assert client.get("/api/challenges/", headers=profiled).status_code == 200
+    assert _written(tmp_path) == ["collapsed"]
+    assert not profiler._cprofile_lock.locked()
+
+
+def test_token_is_single_use(client, profiled, tmp_path):
+    assert client.get("/api/challenges/", headers=profiled).status_code == 200
+    assert client.get("/api/challenges/", headers=profiled).status_code == 200
+    assert _written(tmp_path) == ["pstats"]
+
+
+def test_forged_token_is_ignored(client, profiled, tmp_path):
+    expires, nonce, signature = profiled["X-Profile-Request"].split(".")
+    profiled["X-Profile-Request"] = f"{int(expires) + 3600}.{nonce}.{signature}"
+    assert client.get("/api/challenges/", headers=profiled).status_code == 200
+    assert not (tmp_path / profiler.ADHOC_SESSION).exists()
+
+
+def test_sampler_parks_without_targets():
+    sampler = profiler._StackSampler()
+    target = profiler.current_target()
+    sampler.add(target)
+    time.sleep(0.05)
+    assert sum(sampler.remove(target).values()) > 0
+    deadline = time.monotonic() + 1
+    while not sampler.parked() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sampler.parked()
+    assert sampler._thread in sys._current_frames()
+
+
+GEVENT_SAMPLER = """
+from gevent import monkey
+monkey.patch_all()
+import time
+import gevent
+from app.utils import profiler
+
+sampler = profiler._StackSampler()
+
+def busy_request():
+    deadline = time.monotonic() + 0.3
+    while time.monotonic() < deadline:
+        sum(range(2000))
+        gevent.sleep(0)
+
+def profiled_request():
+    target = profiler.current_target()
+    sampler.add(target)
+    busy_request()
+    return sampler.remove(target)
+
+def other_request():
+    while True:
+        gevent.sleep(0.001)
+
+gevent.spawn(other_request)
+stacks = gevent.spawn(profiled_request).get()
+assert stacks, "no samples"
+assert all("busy_request" in stack for stack in stacks), list(stacks)[:3]
+print("ok")
+"""
+
+
+def test_sampler_follows_greenlet_under_gevent():
+    pytest.importorskip("gevent")
+    result = subprocess.run([sys.executable, "-c", GEVENT_SAMPLER], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(__file__)), timeout=60)
+    assert result.stdout.strip() == "ok", result.stderr
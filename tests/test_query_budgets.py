@@ -0,0 +1,116 @@
+"""Query budgets of the hot player endpoints.
+
+Each budget is checked with several players and challenges, so a query per
+row (N+1) fails the test rather than raising the count slowly.
+"""
+import pytest
+
+PLAYERS = 6
+CHALLENGES = 8
+
+
+@pytest.fixture
+def event(client, player, challenge):
+    """Players who have each made a few wrong guesses and solved a few challenges."""
+    ids = [challenge(title=f"Challenge {i}", flag=f"flag{{{i}}}", points=100 + i) for i in range(CHALLENGES)]
+    players = [player(f"player{n}") for n in range(PLAYERS)]
+    for n, headers in enumerate(players):
+        for i in range(n % 4 + 1):
+            response = client.post("/api/submissions/", headers=headers,
+                                   json={"challenge_id": ids[i], "flag": f"flag{{wrong-{n}}}"})
+            assert not response.get_json()["data"]["is_correct"]
+            response = client.post("/api/submissions/", headers=headers,
+                                   json={"challenge_id": ids[i], "flag": f"flag{{{i}}}"})
+            assert response.get_json()["data"]["is_correct"]
+    return ids, players
+
+
+def test_leaderboard(client, event, query_budget):
+    _, players = event
+    with query_budget(2):
+        response = client.get("/api/submissions/leaderboard", headers=players[0])
+    assert response.status_code == 200
+    assert len(response.get_json()["data"]) == PLAYERS
+
+
+def test_challenge_list(client, event, query_budget):
+    _, players = event
+    with query_budget(1):
+        response = client.get("/api/challenges/", headers=players[0])
+    assert response.status_code == 200
+    assert len(response.get_json()["data"]) == CHALLENGES
+
+
+def test_submit_wrong_flag(client, event, query_budget):
+    ids, players = event
+    with query_budget(7):
+        response = client.post("/api/submissions/", headers=players[0], json={"challenge_id": ids[-1], "flag": "nope"})
+    assert response.status_code == 200
+    assert response.get_json()["data"]["is_correct"] is False
+
+
+def test_submit_already_solved(client, event, query_budget):
+    ids, players = event
+    with query_budget(3):
+        response = client.post("/api/submissions/", headers=players[0], json={"challenge_id": ids[0], "flag": "flag{0}"})
+    assert response.status_code == 400
+
+
+def test_submit_correct_flag(client, event, query_budget):
+    ids, players = event
+    with query_budget(12):
+        response = client.post("/api/submissions/", headers=players[0], json={"challenge_id": ids[1], "flag": "flag{1}"})
+    assert response.status_code == 200
+    assert response.get_json()["data"]["is_correct"] is True
+
+
+def test_submit_correct_flag_decaying(client, event, challenge, query_budget):
+    _, players = event
+    challenge_id = challenge(title="Decaying", flag="flag{decay}", points=500, scoring="linear",
+                             minimum_points=100, decay=10)
+    for headers in players[1:]:
+        client.post("/api/submissions/", headers=headers, json={"challenge_id": challenge_id, "flag": "flag{decay}"})
+    # Earlier solvers lose points in set-based updates, not one query each
+    with query_budget(15):
+        response = client.post("/api/submissions/", headers=players[0],
+                               json={"challenge_id": challenge_id, "flag": "flag{decay}"})
+    assert response.status_code == 200
+    assert response.get_json()["data"]["points_earned"] == 300
+
+
+def test_own_submissions(client, event, query_budget):
+    _, players = event
+    with query_budget(2):
+        response = client.get("/api/submissions/user", headers=players[3])
+    assert response.status_code == 200
+    assert len(response.get_json()["data"]) == 8
+    assert all(row["challenge_title"] for row in response.get_json()["data"])
+
+
+def test_own_stats(client, event, query_budget):
+    _, players = event
+    with query_budget(2):
+        response = client.get("/api/submissions/stats", headers=players[3])
+    assert response.status_code == 200
+    assert response.get_json()["data"]["correct_submissions"] == 4
+
+
+def test_all_submissions(client, event, admin_headers, query_budget):
+    with query_budget(2):
+        response = client.get("/api/submissions/all", headers=admin_headers)
+    assert response.status_code == 200
+    rows = response.get_json()["data"]
+    assert len(rows) == 2 * sum(n % 4 + 1 for n in range(PLAYERS))
+    assert all(row["username"] and row["challenge_title"] for row in rows)
+
+
+def test_budget_catches_n_plus_one(app, challenge, query_budget):
+    from app import db
+    from app.models import Challenge
+
+    ids = [challenge(title=f"Challenge {i}") for i in range(4)]
+    with app.app_context():
+        with pytest.raises(AssertionError, match="N\\+1"):
+            with query_budget(10):
+                for challenge_id in ids:
+                    db.session.get(Challenge, challenge_id)
@@ -0,0 +1,50 @@
+"""Score history buckets stay in step with users.score."""
+from datetime import datetime
+
+from app import db
+from app.models import ScoreBucket, Submission, User
+from app.utils import score_history, scoring
+
+
+def _solve(user_id, challenge_id, solved_at):
+    db.session.add(Submission(user_id=user_id, challenge_id=challenge_id, submitted_flag="flag{decay}",
+                              is_correct=True, submitted_at=solved_at))
+    db.session.flush()
+    scoring.record_solve(challenge_id, user_id, solved_at)
+    db.session.commit()
+
+
+def _bucket_totals():
+    return dict(db.session.execute(
+        db.select(ScoreBucket.user_id, db.func.sum(ScoreBucket.points)).group_by(ScoreBucket.user_id)).all())
+
+
+def test_buckets_match_scores_across_resolution_change(admin_app, player, challenge, monkeypatch):
+    player("alice")
+    player("bob")
+    player("carol")
+    challenge_id = challenge(title="Decay", flag="flag{decay}", points=500, scoring="linear", minimum_points=100,
+                             decay=4)
+    with admin_app.app_context():
+        users = {u.username: u.id for u in User.query}
+        monkeypatch.setenv("SCORE_HISTORY_RESOLUTION", "3600")
+        score_history.rebuild()
+        db.session.commit()
+        _solve(users["alice"], challenge_id, datetime(2026, 3, 1, 12, 7))
+
+        # The next solves decay alice's solve, stored in the 12:00 hourly bucket
+        monkeypatch.setenv("SCORE_HISTORY_RESOLUTION", "300")
+        _solve(users["bob"], challenge_id, datetime(2026, 3, 1, 12, 31))
+        _solve(users["carol"], challenge_id, datetime(2026, 3, 1, 13, 2))
+        scores = dict(db.session.execute(db.select(User.id, User.score)).all())
+        assert scores[users["alice"]] < 500
+        assert _bucket_totals() == {uid: score for uid, score in scores.items() if score}
+        assert score_history.table_resolution() == 3600
+
+        # A sync re-buckets at the new resolution and keeps the totals
+        assert score_history.sync_resolution()
+        db.session.commit()
+        assert score_history.table_resolution() == 300
+        assert score_history.sync_resolution() is None
+        assert _bucket_totals() == {uid: score for uid, score in scores.items() if score}
+        assert ScoreBucket.query.filter_by(user_id=users["alice"]).one().bucket == 1772366700  # 12:05
@@ -0,0 +1,51 @@
+"""Scoreboard freeze: the frozen leaderboard and score timelines."""
+import pytest
+
+from app.utils import scoreboard
+
+
+@pytest.fixture
+def frozen(monkeypatch, admin_client, admin_headers):
+    """``frozen()`` freezes the scoreboard, with a two-player timeline snapshot."""
+    monkeypatch.setenv("SCOREBOARD_STATE_TTL", "0")
+    monkeypatch.setattr(scoreboard, "TIMELINE_PLAYERS", 2)
+
+    def freeze():
+        response = admin_client.post("/api/admin/scoreboard/freeze", headers=admin_headers)
+        assert response.status_code == 200, response.get_json()
+    return freeze
+
+
+def _solve(client, headers, challenge_id, flag):
+    response = client.post("/api/submissions/", headers=headers, json={"challenge_id": challenge_id, "flag": flag})
+    assert response.get_json()["data"]["is_correct"]
+
+
+def _user_id(client, headers):
+    return client.get("/api/auth/profile", headers=headers).get_json()["data"]["id"]
+
+
+def test_frozen_timeline_per_player(client, player, challenge, frozen):
+    first, second, third = player("first"), player("second"), player("third")
+    a = challenge(title="A", flag="flag{a}", points=300)
+    b = challenge(title="B", flag="flag{b}", points=200)
+    _solve(client, first, a, "flag{a}")
+    _solve(client, first, b, "flag{b}")
+    _solve(client, second, a, "flag{a}")
+    frozen()
+    _solve(client, third, a, "flag{a}")
+    _solve(client, third, b, "flag{b}")
+
+    response = client.get(f"/api/submissions/timeline?user_id={_user_id(client, first)}", headers=third)
+    assert response.status_code == 200
+    assert response.get_json()["message"] == "Scoreboard frozen"
+    [chart] = response.get_json()["data"]["players"]
+    assert chart["username"] == "first" and chart["timeline"][-1]["score"] == 500
+
+    # Outside the frozen top 2: an explicit answer, not an empty history
+    response = client.get(f"/api/submissions/timeline?user_id={_user_id(client, third)}", headers=third)
+    assert response.status_code == 409
+    assert response.get_json()["message"].startswith("Scoreboard frozen")
+
+    response = client.get("/api/submissions/timeline", headers=third)
+    assert [p["username"] for p in response.get_json()["data"]["players"]] == ["first", "second"]
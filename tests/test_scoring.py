@@ -0,0 +1,178 @@
+"""Solve bookkeeping: one solve per player and challenge, and rescoring that agrees with it."""
+import threading
+
+from flask_migrate import downgrade, upgrade
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models import Challenge, ScoreBucket, Submission, User
+from app.utils import scoring
+
+
+def _counters(app, challenge_id, username):
+    with app.app_context():
+        user = User.query.filter_by(username=username).one()
+        challenge = db.session.get(Challenge, challenge_id)
+        solves = Submission.query.filter_by(user_id=user.id, challenge_id=challenge_id, is_correct=True).count()
+        return user.score, user.solve_count, challenge.solve_count, solves
+
+
+def test_concurrent_correct_submissions_solve_once(app, admin_app, player, challenge, monkeypatch):
+    headers = player("alice")
+    challenge_id = challenge(title="Race", flag="flag{race}", points=150)
+    # Both requests pass the "already solved" check before either inserts
+    barrier = threading.Barrier(2)
+    check_flag = Challenge.check_flag
+
+    def check_together(self, flag):
+        barrier.wait(5)
+        return check_flag(self, flag)
+
+    monkeypatch.setattr(Challenge, "check_flag", check_together)
+    responses = []
+
+    def submit():
+        response = app.test_client().post("/api/submissions/", headers=headers,
+                                          json={"challenge_id": challenge_id, "flag": "flag{race}"})
+        responses.append((response.status_code, response.get_json()["message"]))
+
+    threads = [threading.Thread(target=submit) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(responses) == [(200, "Correct flag! Well done!"), (400, "Challenge already solved")]
+    assert _counters(app, challenge_id, "alice") == (150, 1, 1, 1)
+    with admin_app.app_context():
+        scoring.recalculate_scores()
+        db.session.commit()
+    assert _counters(app, challenge_id, "alice") == (150, 1, 1, 1)
+
+
+def test_repeat_solve_rejected(client, player, challenge):
+    headers = player("bob")
+    challenge_id = challenge(title="Once", flag="flag{once}")
+    body = {"challenge_id": challenge_id, "flag": "flag{once}"}
+    assert client.post("/api/submissions/", headers=headers, json=body).status_code == 200
+    response = client.post("/api/submissions/", headers=headers, json=body)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Challenge already solved"
+
+
+def test_migration_keeps_first_of_duplicate_solves(admin_app, player, challenge):
+    player("carol")
+    challenge_id = challenge(title="Duplicate", flag="flag{dup}")
+    with admin_app.app_context():
+        downgrade(revision="0d9e7ea257bb")
+        user_id = User.query.filter_by(username="carol").one().id
+        for is_correct in (False, True, True, True):
+            db.session.add(Submission(user_id=user_id, challenge_id=challenge_id, submitted_flag="flag{dup}",
+                                      is_correct=is_correct))
+        db.session.commit()
+        first = Submission.query.filter_by(is_correct=True).order_by(Submission.id).first().id
+        db.session.remove()
+        upgrade()
+        solves = [s.id for s in Submission.query.filter_by(user_id=user_id, is_correct=True)]
+        assert solves == [first]
+        assert Submission.query.filter_by(user_id=user_id).count() == 4
+
+
+def _submit_together(app, monkeypatch, submissions):
+    """Post (headers, body) pairs at once, each past the "already solved" check before any inserts."""
+    barrier = threading.Barrier(len(submissions))
+    check_flag = Challenge.check_flag
+
+    def check_together(self, flag):
+        barrier.wait(5)
+        return check_flag(self, flag)
+
+    monkeypatch.setattr(Challenge, "check_flag", check_together)
+    responses = [None] * len(submissions)
+
+    def submit(i, headers, body):
+        responses[i] = app.test_client().post("/api/submissions/", headers=headers, json=body).status_code
+
+    threads = [threading.Thread(target=submit, args=(i, *s)) for i, s in enumerate(submissions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def test_interleaved_solves_of_two_decaying_challenges(app, admin_app, client, player, challenge, monkeypatch):
+    x, y = player("xavier"), player("yara")
+    decaying = {"points": 500, "scoring": "linear", "minimum_points": 100, "decay": 4}
+    a = challenge(title="A", flag="flag{a}", **decaying)
+    b = challenge(title="B", flag="flag{b}", **decaying)
+    # Each has already solved the challenge the other is about to solve
+    assert client.post("/api/submissions/", headers=x, json={"challenge_id": b, "flag": "flag{b}"}).status_code == 200
+    assert client.post("/api/submissions/", headers=y, json={"challenge_id": a, "flag": "flag{a}"}).status_code == 200
+
+    # Each solve decays its challenge, so it updates the other player's row too
+    assert _submit_together(app, monkeypatch, [
+        (x, {"challenge_id": a, "flag": "flag{a}"}),
+        (y, {"challenge_id": b, "flag": "flag{b}"}),
+    ]) == [200, 200]
+
+    with admin_app.app_context():
+        players = db.select(User.username, User.score).where(User.is_admin.is_(False))
+        scores = dict(db.session.execute(players).all())
+        assert scores == {"xavier": 800, "yara": 800}
+        totals = dict(db.session.execute(
+            db.select(User.username, db.func.sum(ScoreBucket.points)).join(ScoreBucket, ScoreBucket.user_id == User.id)
+            .group_by(User.username)).all())
+        assert totals == scores
+        scoring.recalculate_scores()
+        db.session.commit()
+        assert dict(db.session.execute(players).all()) == scores
+
+
+def test_submit_retried_after_deadlock(client, admin_app, player, challenge, monkeypatch):
+    headers = player("dana")
+    challenge_id = challenge(title="Retry", flag="flag{retry}", points=200)
+
+    class Deadlock(Exception):
+        pgcode = "40P01"
+
+    record_solve = scoring.record_solve
+    calls = []
+
+    def deadlock_once(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OperationalError("UPDATE users ...", {}, Deadlock("deadlock detected"))
+        return record_solve(*args, **kwargs)
+
+    monkeypatch.setattr(scoring, "record_solve", deadlock_once)
+    response = client.post("/api/submissions/", headers=headers, json={"challenge_id": challenge_id,
+                                                                       "flag": "flag{retry}"})
+    assert response.status_code == 200
+    assert response.get_json()["data"]["points_earned"] == 200
+    assert len(calls) == 2
+    with admin_app.app_context():
+        assert Submission.query.filter_by(challenge_id=challenge_id).count() == 1
+        assert User.query.filter_by(username="dana").one().score == 200
+
+
+def test_other_operational_errors_not_retried(client, player, challenge, monkeypatch):
+    headers = player("erin")
+    challenge_id = challenge(title="Broken", flag="flag{broken}")
+    calls = []
+
+    def broken(*args, **kwargs):
+        calls.append(args)
+        raise OperationalError("UPDATE users ...", {}, Exception("no such column"))
+
+    monkeypatch.setattr(scoring, "record_solve", broken)
+    response = client.post("/api/submissions/", headers=headers, json={"challenge_id": challenge_id,
+                                                                       "flag": "flag{broken}"})
+    assert response.status_code == 500
+    assert len(calls) == 1
+
+
+def test_solvers_locked_in_id_order():
+    sql = str(scoring._lock_solvers(7, 3).compile(dialect=postgresql.dialect()))
+    assert sql.rstrip().endswith("ORDER BY users.id FOR UPDATE")
@@ -0,0 +1,22 @@
+"""Flag submission side effects."""
+import json
+
+from app.models import Submission
+from app.utils.aws import get_sqs_client
+
+
+def test_audit_event_carries_stored_flag_hash(client, admin_app, player, challenge, aws, monkeypatch):
+    queue = get_sqs_client().create_queue(QueueName="flagrush-audit")["QueueUrl"]
+    monkeypatch.setenv("SQS_AUDIT_QUEUE_URL", queue)
+    headers = player("frank")
+    challenge_id = challenge(title="Audit", flag="flag{audit}")
+    response = client.post("/api/submissions/", headers=headers,
+                           json={"challenge_id": challenge_id, "flag": "  flag{guess}\n"})
+    assert response.status_code == 200
+
+    [message] = get_sqs_client().receive_message(QueueUrl=queue, MaxNumberOfMessages=10)["Messages"]
+    event = json.loads(message["Body"])
+    assert event["event"] == "flag_submission"
+    with admin_app.app_context():
+        stored = Submission.query.get(event["submission_id"]).flag_hash
+    assert event["flag_sha256"] == stored == Submission.hash_flag("flag{guess}")
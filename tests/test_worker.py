@@ -0,0 +1,224 @@
+"""flagrush-worker against moto: the SQS consumer and its handlers."""
+import json
+import os
+import random
+import signal
+import threading
+import time
+
+import pytest
+
+from app.utils.aws import get_sqs_client
+from app.worker import main
+from app.worker.consumer import Consumer
+from app.worker.handlers import HANDLERS, FirstSolverHandler, Handler, Message
+
+BUCKET = "flagrush-logs"
+
+
+@pytest.fixture
+def bucket(aws):
+    from app.utils.aws import get_s3_client
+    get_s3_client().create_bucket(Bucket=BUCKET)
+    return get_s3_client()
+
+
+def _solve(submission_id, challenge_id=1):
+    body = {"event": "challenge_solved", "challenge_id": challenge_id, "submission_id": submission_id,
+            "user_id": submission_id % 97, "username": f"player{submission_id}", "submitted_at": "2026-03-01T14:00:00"}
+    return Message(f"m{submission_id}", f"r{submission_id}", body)
+
+
+def test_first_solver_settles_on_lowest_submission(bucket):
+    handler = FirstSolverHandler(BUCKET, "logs/")
+    submission_ids = random.sample(range(1, 10 ** 6), 48)
+    messages = [_solve(s) for s in submission_ids]
+    consumers = 8
+    barrier = threading.Barrier(consumers)
+    errors = []
+
+    def consume(batch):
+        barrier.wait()
+        for message in batch:
+            try:
+                handler.handle(message)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=consume, args=(messages[i::consumers],)) for i in range(consumers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    stored = json.loads(bucket.get_object(Bucket=BUCKET, Key="logs/challenges/1/first_solver.json")["Body"].read())
+    assert stored["submission_id"] == min(submission_ids)
+    assert stored["username"] == f"player{min(submission_ids)}"
+
+
+def test_first_solver_ignores_later_solves(bucket):
+    handler = FirstSolverHandler(BUCKET, "logs/")
+    handler.handle(_solve(10, challenge_id=2))
+    etag = bucket.head_object(Bucket=BUCKET, Key="logs/challenges/2/first_solver.json")["ETag"]
+    handler.handle(_solve(11, challenge_id=2))
+    handler.handle(_solve(10, challenge_id=2))  # redelivery
+    assert bucket.head_object(Bucket=BUCKET, Key="logs/challenges/2/first_solver.json")["ETag"] == etag
+
+
+def test_first_solver_needs_bucket(monkeypatch):
+    monkeypatch.delenv("LOG_BUCKET", raising=False)
+    with pytest.raises(ValueError):
+        FirstSolverHandler.from_env()
+
+
+class Recorder(Handler):
+    """Records the ``n`` of each message; raises for those in ``fail``."""
+
+    def __init__(self, name, events=(), fail=(), delay=0.0):
+        self.name = name
+        self.events = tuple(events)
+        self.fail = set(fail)
+        self.delay = delay
+        self.seen = []
+
+    def handle(self, message):
+        self.seen.append(message.body["n"])
+        time.sleep(self.delay)
+        if message.body["n"] in self.fail:
+            raise RuntimeError("handler failed")
+
+
+class Spy:
+    """Wraps a client method and records the calls."""
+
+    def __init__(self, method):
+        self.method = method
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.method(**kwargs)
+
+
+@pytest.fixture
+def queue(aws, monkeypatch):
+    sqs = get_sqs_client()
+    url = sqs.create_queue(QueueName="flagrush-events")["QueueUrl"]
+    for name in ("delete_message_batch", "delete_message", "change_message_visibility_batch"):
+        monkeypatch.setattr(sqs, name, Spy(getattr(sqs, name)))
+    return url
+
+
+def _send(url, *events):
+    entries = [{"Id": str(n), "MessageBody": json.dumps({"event": event, "n": n})} for n, event in enumerate(events)]
+    for i in range(0, len(entries), 10):
+        get_sqs_client().send_message_batch(QueueUrl=url, Entries=entries[i:i + 10])
+
+
+def _queued(url):
+    attributes = get_sqs_client().get_queue_attributes(
+        QueueUrl=url, AttributeNames=["ApproximateNumberOfMessages", "ApproximateNumberOfMessagesNotVisible"])
+    return sum(int(v) for v in attributes["Attributes"].values())
+
+
+def _drain(consumer):
+    while True:
+        messages = consumer.receive()
+        if not messages:
+            return
+        consumer.process(messages)
+
+
+def test_handler_fan_out(queue):
+    solves = Recorder("solves", events=("challenge_solved",))
+    submissions = Recorder("submissions", events=("flag_submission", "challenge_solved"))
+    everything = Recorder("everything")
+    _send(queue, "challenge_solved", "flag_submission", "user_login", "challenge_solved")
+    _drain(Consumer(queue, [solves, submissions, everything], wait_time=0))
+    assert sorted(solves.seen) == [0, 3]
+    assert sorted(submissions.seen) == [0, 1, 3]
+    assert sorted(everything.seen) == [0, 1, 2, 3]
+
+
+def test_processed_messages_deleted_in_batches(queue):
+    _send(queue, *["flag_submission"] * 25)
+    consumer = Consumer(queue, [Recorder("all")], wait_time=0)
+    _drain(consumer)
+    sqs = get_sqs_client()
+    assert consumer.processed == 25 and _queued(queue) == 0
+    assert sqs.delete_message.calls == []
+    assert sum(len(call["Entries"]) for call in sqs.delete_message_batch.calls) == 25
+    assert all(len(call["Entries"]) <= 10 for call in sqs.delete_message_batch.calls)
+
+
+def test_failed_message_redelivered(queue):
+    flaky = Recorder("flaky", fail={1})
+    _send(queue, "flag_submission", "flag_submission", "flag_submission")
+    consumer = Consumer(queue, [flaky, Recorder("other")], wait_time=0, retry_delay=0)
+    messages = consumer.receive()
+    consumer.process(messages)
+    assert consumer.processed == 2 and consumer.failed == 1
+    # Released with retry_delay (0), not deleted
+    retry_calls = get_sqs_client().change_message_visibility_batch.calls
+    assert [entry["VisibilityTimeout"] for call in retry_calls for entry in call["Entries"]] == [0]
+
+    flaky.fail.clear()
+    redelivered = consumer.receive()
+    assert [(m.body["n"], m.receive_count) for m in redelivered] == [(1, 2)]
+    consumer.process(redelivered)
+    assert _queued(queue) == 0
+
+
+def test_heartbeat_extends_slow_messages(queue):
+    slow = Recorder("slow", delay=3.5)
+    _send(queue, "challenge_solved")
+    consumer = Consumer(queue, [slow], wait_time=1, visibility_timeout=2)
+    thread = threading.Thread(target=consumer.run)
+    thread.start()
+    try:
+        time.sleep(2.5)
+        # Past the original 2 s visibility timeout, but still hidden
+        assert get_sqs_client().receive_message(QueueUrl=queue, WaitTimeSeconds=0).get("Messages", []) == []
+    finally:
+        consumer.stop()
+        assert consumer.wait(10)
+        thread.join()
+    assert slow.seen == [0]
+    assert get_sqs_client().change_message_visibility_batch.calls
+    assert _queued(queue) == 0
+
+
+def test_sigterm_drains_in_flight(queue, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    class Blocking(Recorder):
+        def handle(self, message):
+            started.set()
+            release.wait(10)
+            super().handle(message)
+
+    blocking = Blocking("blocking")
+    _send(queue, "challenge_solved", "challenge_solved", "challenge_solved")
+    monkeypatch.setenv("WORKER_QUEUE_URL", queue)
+    monkeypatch.setenv("WORKER_HANDLERS", "blocking")
+    monkeypatch.setenv("WORKER_WAIT_TIME", "1")
+    monkeypatch.setenv("WORKER_METRICS_PORT", "0")
+    monkeypatch.setenv("WORKER_STATS_INTERVAL", "0")
+    monkeypatch.setitem(HANDLERS, "blocking", lambda: blocking)
+
+    def terminate():
+        started.wait(10)
+        os.kill(os.getpid(), signal.SIGTERM)
+        time.sleep(0.5)
+        release.set()
+
+    previous = {s: signal.getsignal(s) for s in (signal.SIGTERM, signal.SIGINT)}
+    threading.Thread(target=terminate).start()
+    try:
+        main()  # returns once in-flight messages are done
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    assert release.is_set()
+    assert sorted(blocking.seen) == [0, 1, 2]
+    assert _queued(queue) == 0
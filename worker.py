@@ -0,0 +1,5 @@
+from app.worker import main
+
+# Entrypoint for flagrush-worker, the SQS consumer (see docs/SQS_EVENTS.md)
+if __name__ == '__main__':
+    main()